@@ -1,13 +1,39 @@
+import logging
+import os
 from flask import Flask, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
-from database import get_db
 
 load_dotenv()
 
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+logger = logging.getLogger('linkfluence')
+
+from database import get_db, UniqueIndexError
+import instrumentation
+import profiling
+import ratelimit
+import resilience
+from models import loader
+
 app = Flask(__name__)
 app.url_map.strict_slashes = False  # Prevent trailing slash redirects
-CORS(app, resources={r"/*": {"origins": "*"}})
+# Conversation paging headers must be readable by the browser
+CORS(app, resources={r"/*": {"origins": "*"}}, expose_headers=['X-Has-More', 'X-Next-Before'])
+
+# Request timing, Mongo command accounting, slow logs and /metrics
+instrumentation.init_app(app)
+# Per-client token buckets and per-route-class concurrency limits
+ratelimit.init_app(app)
+# Per-route-class Mongo deadlines and the database circuit breaker
+resilience.init_app(app)
+# Request-scoped identity map for model lookups by id
+loader.init_app(app)
+# Opt-in flame-graph capture (X-Profile header or PROFILE_SAMPLE_RATE)
+profiling.init_app(app)
 
 # Database connection is handled lazily in routes/models to ensure fork-safety with Gunicorn
 # Do not initialize get_db() here at module level
@@ -21,6 +47,7 @@ from routes.messages import messages_bp
 from routes.notifications import notifications_bp
 from routes.reviews import reviews_bp
 from routes.applications import applications_bp
+from routes.search import search_bp
 
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(creators_bp, url_prefix='/api/creators')
@@ -30,18 +57,29 @@ app.register_blueprint(messages_bp, url_prefix='/api/messages')
 app.register_blueprint(notifications_bp, url_prefix='/api/notifications')
 app.register_blueprint(reviews_bp, url_prefix='/api/reviews')
 app.register_blueprint(applications_bp, url_prefix='/api/applications')
+app.register_blueprint(search_bp, url_prefix='/api/search')
 
 @app.route('/')
 def hello():
     return jsonify({"message": "Linkfluence Backend Running", "status": "success"})
 
-# Auto-seed database if empty (for automated deployments)
-try:
-    from seed_db import seed_data
-    print("🌱 Checking database state...")
-    seed_data()
-except Exception as e:
-    print(f"⚠️ Auto-seeding skipped: {e}")
+# Password hashing processes re-import `python app.py` as __mp_main__;
+# they must not start jobs or seed
+if __name__ != '__mp_main__':
+    # Periodic maintenance (campaign expiry/archival), off unless configured
+    from jobs import start_background_jobs
+    start_background_jobs()
+
+    # Auto-seed database if empty (for automated deployments)
+    try:
+        from seed_db import seed_data
+        logger.info("Checking database state...")
+        seed_data()
+    except UniqueIndexError:
+        # Refuse to start rather than run without duplicate protection
+        raise
+    except Exception as e:
+        logger.warning("Auto-seeding skipped: %s", e)
 
 if __name__ == '__main__':
     print("Starting Linkfluence Backend on http://0.0.0.0:5000")
@@ -0,0 +1,84 @@
+"""
+Linkfluence Abuse Burst Test
+Run from backend/ against gunicorn: python -m bench.abuse --url http://localhost:5000
+
+Measures cheap-route latency alone, then again while other clients hammer
+regex search and login. With admission control the expensive routes are
+shed (429/503) and the cheap-route p50/p99 should stay roughly flat.
+"""
+
+import argparse
+import json
+import sys
+import threading
+
+from bench.loadtest import MIX, HttpClient, print_report, run
+
+CHEAP_ROUTES = ['GET /api/campaigns/<id>', 'GET /api/creators/<id>', 'GET /api/notifications']
+ABUSE_ROUTES = ['GET /api/creators/search?q', 'POST /api/auth/login']
+
+
+def _status_counts(client, counts, concurrency, duration, mix):
+    """Like loadtest.run, but also counts response statuses"""
+    statuses = {}
+    lock = threading.Lock()
+
+    def counting_client(method, path, body):
+        status = client(method, path, body)
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+        return status
+
+    report = run(counting_client, counts, concurrency, duration, mix=mix, warmup=0)
+    report['statuses'] = {str(k): v for k, v in statuses.items()}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cheap-route latency with and without an abuse burst")
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--manifest', default='bench_dataset.json')
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--cheap-concurrency', type=int, default=4)
+    parser.add_argument('--abuse-concurrency', type=int, default=64)
+    parser.add_argument('--output', default='abuse_results.json')
+    args = parser.parse_args(argv)
+
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    counts = dict(manifest['counts'], password=manifest.get('password'))
+    client = HttpClient(args.url, timeout=30)
+    cheap_mix = {name: MIX[name] for name in CHEAP_ROUTES}
+    abuse_mix = {name: MIX[name] for name in ABUSE_ROUTES}
+
+    print("📏 Baseline: cheap routes only")
+    baseline = run(client, counts, args.cheap_concurrency, args.duration, mix=cheap_mix)
+    print_report(baseline)
+
+    print("\n🔥 Cheap routes during abuse burst")
+    abuse_result = {}
+    abuser = threading.Thread(target=lambda: abuse_result.update(
+        _status_counts(client, counts, args.abuse_concurrency, args.duration, abuse_mix)))
+    abuser.start()
+    under_abuse = run(client, counts, args.cheap_concurrency, args.duration, mix=cheap_mix)
+    abuser.join()
+    print_report(under_abuse)
+    print(f"\nAbuse traffic statuses: {abuse_result.get('statuses')}")
+
+    comparison = {}
+    for route, before in baseline['routes'].items():
+        after = under_abuse['routes'].get(route)
+        if after:
+            comparison[route] = {
+                'p50_ratio': round(after['p50_ms'] / before['p50_ms'], 2) if before['p50_ms'] else None,
+                'p99_ratio': round(after['p99_ms'] / before['p99_ms'], 2) if before['p99_ms'] else None,
+            }
+    print(f"Latency ratio under abuse (1.0 = flat): {json.dumps(comparison, indent=2)}")
+
+    with open(args.output, 'w') as f:
+        json.dump({'baseline': baseline, 'under_abuse': under_abuse,
+                   'abuse': abuse_result, 'comparison': comparison}, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
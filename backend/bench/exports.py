@@ -0,0 +1,148 @@
+"""
+Linkfluence Export Benchmark
+Run from backend/: python -m bench.exports --rows 2000000
+                   python -m bench.exports --rows 2000000 --url http://localhost:5000
+
+Seeds one campaign's applications, one conversation and one creator's
+analytics with --rows documents each (under fresh ids, removed afterwards
+unless --keep), then downloads every export and reports rows, bytes,
+throughput and peak Python heap while streaming. With --in-process the
+heap is the app's own, so a flat peak across --rows shows the exports
+stream rather than materialise.
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+import urllib.request
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+from database import get_db
+
+SEED_BATCH = 10000
+
+
+def _seed(db, rows, seed):
+    rng = random.Random(seed)
+    campaign_id, creator_id, business_id = (str(ObjectId()) for _ in range(3))
+    start = datetime(2025, 1, 1)
+
+    def batches(make):
+        for offset in range(0, rows, SEED_BATCH):
+            yield [make(i) for i in range(offset, min(rows, offset + SEED_BATCH))]
+
+    for batch in batches(lambda i: {
+        'campaign_id': campaign_id, 'creator_id': str(ObjectId()), 'creator_name': f'Creator {i}',
+        'cover_letter': 'x' * rng.randint(20, 200), 'bid_amount': rng.randint(50, 5000),
+        'status': 'pending', 'created_at': start + timedelta(seconds=i)
+    }):
+        db.applications.insert_many(batch, ordered=False)
+    for batch in batches(lambda i: {
+        'campaign_id': campaign_id,
+        'sender_id': creator_id if i % 2 else business_id,
+        'receiver_id': business_id if i % 2 else creator_id,
+        'content': 'x' * rng.randint(10, 200), 'timestamp': start + timedelta(seconds=i)
+    }):
+        db.messages.insert_many(batch, ordered=False)
+    for batch in batches(lambda i: {
+        'user_id': creator_id, 'date': (start + timedelta(days=i)).strftime('%Y-%m-%d'),
+        'stats': {'instagram': rng.randint(0, 50000), 'youtube': rng.randint(0, 50000)},
+        'timestamp': start + timedelta(days=i)
+    }):
+        db.analytics.insert_many(batch, ordered=False)
+    return campaign_id, creator_id, business_id
+
+
+def _cleanup(db, campaign_id, creator_id):
+    db.applications.delete_many({'campaign_id': campaign_id})
+    db.messages.delete_many({'campaign_id': campaign_id})
+    db.analytics.delete_many({'user_id': creator_id})
+
+
+def _download_http(url):
+    with urllib.request.urlopen(url) as resp:
+        while True:
+            chunk = resp.read(65536)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _download_in_process(client, path):
+    resp = client.get(path, buffered=False)
+    try:
+        yield from resp.response
+    finally:
+        resp.close()
+
+
+def _measure(chunks, fmt):
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = 0
+    lines = 0
+    for chunk in chunks:
+        chunk = chunk if isinstance(chunk, bytes) else chunk.encode()
+        size += len(chunk)
+        lines += chunk.count(b'\n')
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rows = lines - 1 if fmt == 'csv' else lines
+    return {
+        'rows': rows,
+        'bytes': size,
+        'seconds': round(seconds, 2),
+        'rows_per_second': round(rows / seconds) if seconds else None,
+        'peak_heap_mb': round(peak / 1e6, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure streaming exports on large result sets")
+    parser.add_argument('--rows', type=int, default=1000000, help="Documents seeded per export")
+    parser.add_argument('--url', help="Export from a running server instead of in-process")
+    parser.add_argument('--formats', default='csv,ndjson')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--keep', action='store_true', help="Leave the seeded documents in place")
+    args = parser.parse_args(argv)
+
+    db = get_db()
+    print(f"🌱 Seeding {args.rows} applications, messages and analytics points...")
+    campaign_id, creator_id, business_id = _seed(db, args.rows, args.seed)
+
+    exports = {
+        'applications': f'/api/applications/campaign/{campaign_id}/export',
+        'conversation': (f'/api/messages/conversation/export?campaign_id={campaign_id}'
+                         f'&creator_id={creator_id}&business_id={business_id}'),
+        'analytics': f'/api/creators/{creator_id}/analytics/export',
+    }
+
+    client = None
+    if not args.url:
+        from app import app
+        client = app.test_client()
+
+    results = {}
+    try:
+        for name, path in exports.items():
+            for fmt in args.formats.split(','):
+                full = f"{path}{'&' if '?' in path else '?'}format={fmt}"
+                print(f"📦 {name} ({fmt})...")
+                chunks = (_download_http(args.url.rstrip('/') + full) if args.url
+                          else _download_in_process(client, full))
+                results[f'{name}.{fmt}'] = _measure(chunks, fmt)
+    finally:
+        if not args.keep:
+            _cleanup(db, campaign_id, creator_id)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
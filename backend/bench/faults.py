@@ -0,0 +1,168 @@
+"""
+Linkfluence Database Fault Injection
+Run from backend/: python -m bench.faults --delay 1.0 --deadline 0.2
+
+Serves a request mix in-process from the in-memory engine, wrapped so
+every database call can be slowed down on demand. The stand-in honours
+the request deadline the way mongod honours maxTimeMS: a call that would
+run past it stalls until the deadline and then fails with ExecutionTimeout.
+
+Three phases run back to back:
+
+1. healthy: no delay, warms the search cache
+2. slow: every call takes --delay seconds. Requests must give up at their
+   deadline, the circuit breaker must open and then fail fast, and cached
+   searches must still be answered (stale) while it is open
+3. recovered: no delay again, after the breaker's open period. One probe
+   request must close the breaker, and requests must succeed after it
+
+Exits non-zero if any of those expectations is not met.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo.errors import ExecutionTimeout
+
+COUNTS = dict(creators=300, businesses=30, campaigns=100, applications=500,
+              reviews=0, messages=0, notifications=0, analytics=0)
+SEARCHES = [f"/api/creators/search?category={c}" for c in ('tech', 'fashion', 'food', 'travel')]
+
+
+class SlowCollection:
+    """A collection whose every method first waits for the injected delay"""
+
+    def __init__(self, faults, collection):
+        self._faults = faults
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            self._faults.stall()
+            return attr(*args, **kwargs)
+        return call
+
+    def __getitem__(self, name):
+        return SlowCollection(self._faults, self._collection[name])
+
+
+class SlowDatabase:
+    """Database stand-in with adjustable latency"""
+
+    def __init__(self, db):
+        self._db = db
+        self.delay = 0.0
+
+    def stall(self):
+        from resilience import remaining
+        if not self.delay:
+            return
+        left = remaining()
+        if left is not None and left < self.delay:
+            time.sleep(max(left, 0))
+            raise ExecutionTimeout("operation exceeded time limit", 50)
+        time.sleep(self.delay)
+
+    def __getitem__(self, name):
+        return SlowCollection(self, self._db[name])
+
+    def __getattr__(self, name):
+        return SlowCollection(self, getattr(self._db, name))
+
+
+def _phase(app, paths, concurrency):
+    """(status counts, latencies in ms) for one pass over paths"""
+    def hit(path):
+        client = app.test_client()
+        started = time.perf_counter()
+        status = client.get(path).status_code
+        return status, (time.perf_counter() - started) * 1000
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(hit, paths))
+    statuses = Counter(status for status, _ in results)
+    return statuses, sorted(ms for _, ms in results)
+
+
+def _summary(name, statuses, latencies):
+    p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+    print(f"   {name:<10} statuses={dict(statuses)} p50={statistics.median(latencies):.1f}ms "
+          f"p95={p95:.1f}ms max={latencies[-1]:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Slow the database down and check requests degrade gracefully")
+    parser.add_argument('--delay', type=float, default=1.0, help="Seconds every database call takes when slow")
+    parser.add_argument('--deadline', type=float, default=0.2, help="Deadline for every route class")
+    parser.add_argument('--open-seconds', type=float, default=2.0)
+    parser.add_argument('--requests', type=int, default=60, help="Requests per phase")
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    os.environ['DB_BACKEND'] = 'memory'
+    os.environ['RATE_LIMIT_ENABLED'] = 'false'
+    os.environ['SEARCH_CACHE_SECONDS'] = '0.5'
+    os.environ['BREAKER_OPEN_SECONDS'] = str(args.open_seconds)
+    for cls in ('AUTH', 'SEARCH', 'WRITE', 'DEFAULT'):
+        os.environ[f'DEADLINE_{cls}'] = str(args.deadline)
+
+    from bench.generate_data import campaign_id, creator_id, generate
+    from database import get_db, set_db
+    from app import app
+    from resilience import CLOSED, OPEN, breaker
+    from routes.creators import search_cache
+
+    generate(COUNTS, workers=1, batch_size=1000, chunk_size=50000, seed='faults')
+    faults = SlowDatabase(get_db())
+    set_db(faults)
+
+    paths = []
+    for i in range(args.requests):
+        paths.append([SEARCHES[i % len(SEARCHES)],
+                      f"/api/creators/{creator_id(i % COUNTS['creators'])}",
+                      f"/api/campaigns/{campaign_id(i % COUNTS['campaigns'])}"][i % 3])
+
+    checks = []
+
+    print("🟢 Healthy")
+    statuses, latencies = _phase(app, paths, args.concurrency)
+    _summary('healthy', statuses, latencies)
+    checks.append(("healthy requests succeed", set(statuses) == {200}))
+
+    print(f"🐢 Slow: every call takes {args.delay}s, deadline {args.deadline}s")
+    time.sleep(0.6)  # let the warmed search results expire
+    faults.delay = args.delay
+    stale_before = search_cache.stale
+    statuses, latencies = _phase(app, paths, args.concurrency)
+    _summary('slow', statuses, latencies)
+    checks.append(("no request waits for the slow database", latencies[-1] < args.delay * 1000))
+    checks.append(("breaker opened", breaker.state == OPEN))
+    checks.append(("cached searches served stale", search_cache.stale > stale_before and statuses[200] > 0))
+    checks.append(("the rest fail with 503", set(statuses) <= {200, 503}))
+
+    print(f"🔧 Recovered: no delay, waiting {args.open_seconds}s for the breaker")
+    faults.delay = 0.0
+    time.sleep(args.open_seconds)
+    probe = app.test_client().get(paths[1]).status_code
+    checks.append(("probe succeeds and closes the breaker", probe == 200 and breaker.state == CLOSED))
+    statuses, latencies = _phase(app, paths, args.concurrency)
+    _summary('recovered', statuses, latencies)
+    checks.append(("recovered requests succeed", set(statuses) == {200}))
+    checks.append(("breaker stays closed", breaker.state == CLOSED))
+
+    for name, ok in checks:
+        print(f"{'✅' if ok else '❌'} {name}")
+    return 0 if all(ok for _, ok in checks) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
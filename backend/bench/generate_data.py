@@ -0,0 +1,351 @@
+"""
+Linkfluence Synthetic Data Generator
+Run from backend/: python -m bench.generate_data --scale small
+                   python -m bench.generate_data --creators 1000000 --messages 20000000
+
+Builds a realistic dataset of creators, businesses, campaigns, applications,
+reviews, messages, notifications and analytics points. Document ids are
+derived from each document's index, so workers never need to read back what
+other workers wrote and the load test can pick valid ids without querying.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+from dotenv import load_dotenv
+from werkzeug.security import generate_password_hash
+
+load_dotenv()
+
+SCALES = {
+    'tiny': dict(creators=1000, businesses=100, campaigns=500, applications=5000,
+                 reviews=2000, messages=20000, notifications=10000, analytics=50000),
+    'small': dict(creators=20000, businesses=2000, campaigns=10000, applications=100000,
+                  reviews=40000, messages=400000, notifications=200000, analytics=1000000),
+    'production': dict(creators=1000000, businesses=100000, campaigns=500000,
+                       applications=5000000, reviews=2000000, messages=20000000,
+                       notifications=10000000, analytics=50000000),
+}
+
+CATEGORIES = ['tech', 'lifestyle', 'fashion', 'fitness', 'food', 'travel', 'gaming', 'beauty', 'education', 'music']
+BUSINESS_TYPES = ['retail', 'tech', 'food', 'fashion', 'fitness', 'travel', 'agency', 'other']
+PLATFORMS = ['instagram', 'youtube', 'tiktok', 'twitter']
+PACKAGE_NAMES = ['Instagram Post', 'Instagram Story', 'YouTube Integration', 'TikTok Video', 'Tweet Thread']
+WORDS = ('brand content creator launch summer collection review video growth audience engage '
+         'product tutorial unboxing daily vlog style healthy recipe adventure code setup').split()
+
+PASSWORD = 'bench123'
+START = datetime(2025, 1, 1)
+
+# One byte per collection keeps generated ids distinct across collections
+KIND_PREFIX = {
+    'creators': 1, 'businesses': 2, 'campaigns': 3, 'applications': 4,
+    'reviews': 5, 'messages': 6, 'notifications': 7, 'analytics': 8,
+}
+
+
+def oid(kind, index):
+    """Deterministic ObjectId for the index-th document of a kind"""
+    return ObjectId(bytes([KIND_PREFIX[kind], 0, 0, 0]) + index.to_bytes(8, 'big'))
+
+
+def creator_id(i):
+    return str(oid('creators', i))
+
+
+def business_id(i):
+    return str(oid('businesses', i))
+
+
+def campaign_id(i):
+    return str(oid('campaigns', i))
+
+
+def campaign_business(c, counts):
+    """Index of the business owning campaign c"""
+    return c % counts['businesses']
+
+
+def applicant(c, j, counts):
+    """Index of the j-th creator applying to campaign c (distinct for j < creators)"""
+    return (c * 7919 + j) % counts['creators']
+
+
+def application_pair(a, counts):
+    """(campaign index, creator index) of application a"""
+    c = a % counts['campaigns']
+    return c, applicant(c, a // counts['campaigns'], counts)
+
+
+def creator_email(i):
+    return f"creator{i}@bench.linkfluence.test"
+
+
+def _sentence(rng, n):
+    return ' '.join(rng.choice(WORDS) for _ in range(n)).capitalize()
+
+
+def _followers(rng):
+    # Long-tailed: most creators are nano/micro, a few are macro
+    return int(min(rng.paretovariate(1.2) * 2000, 5000000))
+
+
+def _creator(i, rng, password):
+    platforms = rng.sample(PLATFORMS, rng.randint(1, 3))
+    name = f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS).capitalize()} {i}"
+    return {
+        '_id': oid('creators', i),
+        'name': name,
+        'email': creator_email(i),
+        'email_normalized': creator_email(i),
+        'password': password,
+        'role': 'creator',
+        'bio': _sentence(rng, rng.randint(8, 25)),
+        'category': rng.choice(CATEGORIES),
+        'followers': _followers(rng),
+        'social_links': {p: f"@{name.split()[0].lower()}{i}" for p in platforms},
+        'service_packages': [
+            {'name': rng.choice(PACKAGE_NAMES), 'price': rng.choice([50, 100, 250, 500, 1000, 2500, 5000]),
+             'description': _sentence(rng, 6)}
+            for _ in range(rng.randint(0, 3))
+        ],
+        'portfolio': [],
+        'average_rating': 0,
+        'review_count': 0,
+        'created_at': START + timedelta(minutes=i),
+    }
+
+
+def _business(i, rng, password):
+    email = f"business{i}@bench.linkfluence.test"
+    return {
+        '_id': oid('businesses', i),
+        'name': f"{rng.choice(WORDS).capitalize()} Co {i}",
+        'email': email,
+        'email_normalized': email,
+        'password': password,
+        'role': 'business',
+        'business_type': rng.choice(BUSINESS_TYPES),
+        'industry': rng.choice(CATEGORIES),
+        'description': _sentence(rng, rng.randint(8, 20)),
+        'created_at': START + timedelta(minutes=i),
+    }
+
+
+def _campaign(i, rng, counts):
+    created = START + timedelta(minutes=i * 3)
+    status = 'active' if rng.random() < 0.7 else 'closed'
+    doc = {
+        '_id': oid('campaigns', i),
+        'business_id': business_id(campaign_business(i, counts)),
+        'title': f"{_sentence(rng, 3)} Campaign",
+        'description': _sentence(rng, rng.randint(10, 30)),
+        'budget': rng.choice([500, 1000, 2000, 5000, 10000, 25000]),
+        'status': status,
+        'created_at': created,
+        'deadline': created + timedelta(days=rng.randint(7, 90)),
+    }
+    if status == 'closed':
+        doc['closed_at'] = doc['deadline']
+    return doc
+
+
+def _application(a, rng, counts):
+    c, creator = application_pair(a, counts)
+    return {
+        '_id': oid('applications', a),
+        'campaign_id': campaign_id(c),
+        'creator_id': creator_id(creator),
+        'creator_name': f"Creator {creator}",
+        'cover_letter': _sentence(rng, rng.randint(10, 40)),
+        'bid_amount': rng.choice([100, 250, 500, 1000, 2000]),
+        'status': rng.choice(['pending', 'pending', 'accepted', 'rejected']),
+        'created_at': START + timedelta(minutes=a),
+    }
+
+
+def _review(r, rng, counts):
+    creator = r % counts['creators']
+    reviewer = (r // counts['creators'] + creator) % counts['businesses']
+    return {
+        '_id': oid('reviews', r),
+        'creator_id': creator_id(creator),
+        'reviewer_id': business_id(reviewer),
+        'reviewer_name': f"Business {reviewer}",
+        'rating': rng.randint(1, 5),
+        'comment': _sentence(rng, rng.randint(5, 20)),
+        'created_at': START + timedelta(minutes=r),
+    }
+
+
+def _message(m, rng, counts):
+    # Messages belong to the conversation of an existing application
+    c, creator = application_pair(m % max(counts['applications'], 1), counts)
+    business = business_id(campaign_business(c, counts))
+    creator = creator_id(creator)
+    sender, receiver = (creator, business) if rng.random() < 0.5 else (business, creator)
+    return {
+        '_id': oid('messages', m),
+        'campaign_id': campaign_id(c),
+        'sender_id': sender,
+        'receiver_id': receiver,
+        'content': _sentence(rng, rng.randint(3, 30)),
+        'timestamp': START + timedelta(seconds=m * 7),
+    }
+
+
+def _notification(n, rng, counts):
+    c, creator = application_pair(n % max(counts['applications'], 1), counts)
+    if rng.random() < 0.5:
+        user, kind, title = business_id(campaign_business(c, counts)), 'new_application', 'New Application!'
+    else:
+        user, kind, title = creator_id(creator), 'application_update', 'Application Accepted'
+    return {
+        '_id': oid('notifications', n),
+        'user_id': user,
+        'type': kind,
+        'title': title,
+        'message': _sentence(rng, 8),
+        'campaign_id': campaign_id(c),
+        'read': rng.random() < 0.6,
+        'created_at': START + timedelta(seconds=n * 11),
+    }
+
+
+def _analytics(p, rng, counts):
+    creator = p % counts['creators']
+    day = START + timedelta(days=p // counts['creators'])
+    return {
+        '_id': oid('analytics', p),
+        'user_id': creator_id(creator),
+        'date': day.strftime("%Y-%m-%d"),
+        'stats': {platform: rng.randint(0, 50000) for platform in rng.sample(PLATFORMS, 2)},
+        'timestamp': day,
+    }
+
+
+# kind -> (collection, builder); builders for users also take the password hash
+BUILDERS = {
+    'creators': ('users', _creator),
+    'businesses': ('users', _business),
+    'campaigns': ('campaigns', _campaign),
+    'applications': ('applications', _application),
+    'reviews': ('reviews', _review),
+    'messages': ('messages', _message),
+    'notifications': ('notifications', _notification),
+    'analytics': ('analytics', _analytics),
+}
+
+
+def _insert_range(job):
+    """Worker: build documents [start, end) of one kind and insert them in batches"""
+    kind, start, end, counts, batch_size, seed, password = job
+    from pymongo.errors import BulkWriteError
+    from database import get_db
+
+    db = get_db()
+    collection, build = BUILDERS[kind]
+    rng = random.Random(f"{seed}:{kind}:{start}")
+    extra = password if kind in ('creators', 'businesses') else counts
+
+    batch = []
+    for i in range(start, end):
+        batch.append(build(i, rng, extra))
+        if len(batch) >= batch_size:
+            _flush(db[collection], batch, BulkWriteError)
+            batch = []
+    if batch:
+        _flush(db[collection], batch, BulkWriteError)
+    return kind, end - start
+
+
+def _flush(collection, batch, BulkWriteError):
+    try:
+        collection.insert_many(batch, ordered=False)
+    except BulkWriteError as e:
+        # Re-running over an existing dataset: duplicates are expected
+        if any(err.get('code') != 11000 for err in e.details.get('writeErrors', [])):
+            raise
+
+
+def generate(counts, workers, batch_size, chunk_size, seed, drop=False):
+    from database import get_db
+
+    import memorydb
+
+    # Connect (and create indexes) in the parent only; workers are spawned
+    # fresh so none of them inherits this client
+    db = get_db()
+    if drop:
+        # Only generated ids fall in these ranges, real data is left alone
+        for kind, (collection, _) in BUILDERS.items():
+            db[collection].delete_many({'_id': {'$gte': oid(kind, 0), '$lte': oid(kind, 2 ** 64 - 1)}})
+
+    password = generate_password_hash(PASSWORD)
+    summary = {}
+    # The in-memory engine lives in this process, so it is filled here
+    in_process = workers <= 1 or isinstance(db, memorydb.MemoryDatabase)
+    pool = None if in_process else multiprocessing.get_context('spawn').Pool(workers)
+    try:
+        # Kinds run in order so that referenced documents exist first
+        for kind in BUILDERS:
+            total = counts.get(kind, 0)
+            if not total:
+                continue
+            jobs = [(kind, s, min(s + chunk_size, total), counts, batch_size, seed, password)
+                    for s in range(0, total, chunk_size)]
+            started = time.perf_counter()
+            results = map(_insert_range, jobs) if pool is None else pool.imap_unordered(_insert_range, jobs)
+            inserted = sum(n for _, n in results)
+            elapsed = time.perf_counter() - started
+            summary[kind] = {'documents': inserted, 'seconds': round(elapsed, 2),
+                             'docs_per_second': round(inserted / elapsed) if elapsed else None}
+            print(f"📂 {kind}: {inserted} docs in {elapsed:.1f}s")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic Linkfluence dataset")
+    parser.add_argument('--scale', choices=SCALES, default='tiny')
+    for kind in BUILDERS:
+        parser.add_argument(f'--{kind}', type=int, help=f"Override number of {kind}")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--chunk-size', type=int, default=50000, help="Documents per worker job")
+    parser.add_argument('--seed', default='linkfluence')
+    parser.add_argument('--drop', action='store_true', help="Remove previously generated data first")
+    parser.add_argument('--manifest', default='bench_dataset.json',
+                        help="Where to write the counts the load test reads")
+    args = parser.parse_args(argv)
+
+    counts = dict(SCALES[args.scale])
+    for kind in BUILDERS:
+        if getattr(args, kind) is not None:
+            counts[kind] = getattr(args, kind)
+    if not counts['creators'] or not counts['businesses'] or not counts['campaigns']:
+        parser.error("creators, businesses and campaigns must be non-zero")
+    counts['applications'] = min(counts['applications'], counts['campaigns'] * counts['creators'])
+    counts['reviews'] = min(counts['reviews'], counts['creators'] * counts['businesses'])
+
+    print(f"🚀 Generating dataset: {counts}")
+    summary = generate(counts, args.workers, args.batch_size, args.chunk_size, args.seed, args.drop)
+
+    with open(args.manifest, 'w') as f:
+        json.dump({'counts': counts, 'seed': args.seed, 'password': PASSWORD,
+                   'generated_at': datetime.utcnow().isoformat(), 'summary': summary}, f, indent=2)
+    print(f"✨ Done. Manifest written to {args.manifest}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
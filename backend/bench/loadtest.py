@@ -0,0 +1,304 @@
+"""
+Linkfluence Load Test
+Run from backend/: python -m bench.loadtest --url http://localhost:5000 --duration 60
+                   python -m bench.loadtest --in-process --requests 5000
+                   python -m bench.loadtest --memory tiny --requests 5000 --concurrency 1
+
+Replays a weighted mix of the /api/* endpoints against a dataset built by
+bench.generate_data and reports p50/p95/p99 latency and throughput per
+route. Responses of 500 and above (or no response) count as errors;
+4xx responses are reported separately. Results are written as JSON so
+runs can be diffed as a baseline. Rate limiting is turned off in-process;
+against --url, start the server with RATE_LIMIT_ENABLED=false.
+
+With --memory SCALE the dataset is generated into the in-memory engine
+inside this process and replayed in-process, so the numbers are the
+app's own Python overhead with no database latency behind it.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from bench.generate_data import (
+    CATEGORIES, BUSINESS_TYPES, PASSWORD, SCALES, WORDS, application_pair, business_id,
+    campaign_business, campaign_id, creator_email, creator_id, generate,
+)
+
+TIERS = ['nano', 'micro', 'macro']
+
+
+def _creator_search(rng, counts):
+    return 'GET', f"/api/creators/search?category={rng.choice(CATEGORIES)}&follower_tier={rng.choice(TIERS)}", None
+
+
+def _creator_text_search(rng, counts):
+    return 'GET', f"/api/creators/search?q={rng.choice(WORDS)[:rng.randint(2, 5)]}", None
+
+
+def _business_search(rng, counts):
+    return 'GET', f"/api/businesses/search?category={rng.choice(BUSINESS_TYPES)}", None
+
+
+def _active_campaigns(rng, counts):
+    return 'GET', "/api/campaigns/?status=active", None
+
+
+def _business_campaigns(rng, counts):
+    return 'GET', f"/api/campaigns/?business_id={business_id(rng.randrange(counts['businesses']))}", None
+
+
+def _campaign(rng, counts):
+    return 'GET', f"/api/campaigns/{campaign_id(rng.randrange(counts['campaigns']))}", None
+
+
+def _creator_profile(rng, counts):
+    return 'GET', f"/api/creators/{creator_id(rng.randrange(counts['creators']))}", None
+
+
+def _campaign_applications(rng, counts):
+    return 'GET', f"/api/applications/campaign/{campaign_id(rng.randrange(counts['campaigns']))}", None
+
+
+def _creator_applications(rng, counts):
+    return 'GET', f"/api/applications/creator/{creator_id(rng.randrange(counts['creators']))}", None
+
+
+def _conversation(rng, counts):
+    c, creator = application_pair(rng.randrange(max(counts['applications'], 1)), counts)
+    return 'GET', (f"/api/messages/conversation?campaign_id={campaign_id(c)}"
+                   f"&creator_id={creator_id(creator)}"
+                   f"&business_id={business_id(campaign_business(c, counts))}"), None
+
+
+def _notifications(rng, counts):
+    return 'GET', f"/api/notifications?user_id={business_id(rng.randrange(counts['businesses']))}", None
+
+
+def _creator_reviews(rng, counts):
+    return 'GET', f"/api/reviews/creator/{creator_id(rng.randrange(counts['creators']))}", None
+
+
+def _login(rng, counts):
+    return 'POST', "/api/auth/login", {'email': creator_email(rng.randrange(counts['creators'])),
+                                       'password': counts.get('password', 'bench123')}
+
+
+def _send_message(rng, counts):
+    c, creator = application_pair(rng.randrange(max(counts['applications'], 1)), counts)
+    return 'POST', "/api/messages/", {
+        'campaign_id': campaign_id(c),
+        'sender_id': creator_id(creator),
+        'receiver_id': business_id(campaign_business(c, counts)),
+        'content': 'Load test message',
+    }
+
+
+def _apply(rng, counts):
+    creator = rng.randrange(counts['creators'])
+    return 'POST', "/api/applications/", {
+        'campaign_id': campaign_id(rng.randrange(counts['campaigns'])),
+        'creator_id': creator_id(creator),
+        'creator_name': f"Creator {creator}",
+        'bid_amount': 500,
+    }
+
+
+# route name -> (weight, request builder); weights approximate production traffic
+MIX = {
+    'GET /api/creators/search': (20, _creator_search),
+    'GET /api/creators/search?q': (5, _creator_text_search),
+    'GET /api/businesses/search': (5, _business_search),
+    'GET /api/campaigns?status': (3, _active_campaigns),
+    'GET /api/campaigns?business_id': (10, _business_campaigns),
+    'GET /api/campaigns/<id>': (10, _campaign),
+    'GET /api/creators/<id>': (10, _creator_profile),
+    'GET /api/applications/campaign/<id>': (5, _campaign_applications),
+    'GET /api/applications/creator/<id>': (5, _creator_applications),
+    'GET /api/messages/conversation': (10, _conversation),
+    'GET /api/notifications': (5, _notifications),
+    'GET /api/reviews/creator/<id>': (5, _creator_reviews),
+    'POST /api/auth/login': (2, _login),
+    'POST /api/messages': (5, _send_message),
+    'POST /api/applications': (3, _apply),
+}
+
+
+class HttpClient:
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def __call__(self, method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                resp.read()
+                return resp.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+class InProcessClient:
+    """Calls the Flask app directly, skipping the HTTP server"""
+
+    def __init__(self):
+        from app import app
+        self.client = app.test_client()
+
+    def __call__(self, method, path, body):
+        return self.client.open(path, method=method, json=body).status_code
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(samples, elapsed):
+    """samples: route -> list of (latency_ms, status)"""
+    routes = {}
+    for route, values in sorted(samples.items()):
+        latencies = sorted(v[0] for v in values)
+        errors = sum(1 for _, status in values if status is None or status >= 500)
+        rejected = sum(1 for _, status in values if status is not None and 400 <= status < 500)
+        routes[route] = {
+            'requests': len(values),
+            'errors': errors,
+            'client_errors': rejected,
+            'throughput_rps': round(len(values) / elapsed, 2) if elapsed else None,
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'max_ms': round(latencies[-1], 2),
+        }
+    total = sum(len(v) for v in samples.values())
+    return {'total_requests': total, 'elapsed_seconds': round(elapsed, 2),
+            'throughput_rps': round(total / elapsed, 2) if elapsed else None, 'routes': routes}
+
+
+def run(client, counts, concurrency, duration=None, total_requests=None, seed=0, mix=None, warmup=0):
+    mix = mix or MIX
+    names = list(mix)
+    weights = [mix[n][0] for n in names]
+    samples = {n: [] for n in names}
+    lock = threading.Lock()
+    issued = [0]
+    deadline = [None]
+
+    def next_slot():
+        with lock:
+            if total_requests is not None and issued[0] >= total_requests + warmup:
+                return None
+            if deadline[0] is not None and time.perf_counter() >= deadline[0]:
+                return None
+            issued[0] += 1
+            return issued[0]
+
+    def worker(index):
+        rng = random.Random(f"{seed}:{index}")
+        while True:
+            slot = next_slot()
+            if slot is None:
+                return
+            name = rng.choices(names, weights)[0]
+            method, path, body = mix[name][1](rng, counts)
+            started = time.perf_counter()
+            try:
+                status = client(method, path, body)
+            except Exception:
+                status = None
+            latency = (time.perf_counter() - started) * 1000
+            if slot > warmup:
+                with lock:
+                    samples[name].append((latency, status))
+
+    started = time.perf_counter()
+    if duration is not None:
+        deadline[0] = started + duration
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return summarize({n: v for n, v in samples.items() if v}, elapsed)
+
+
+def print_report(report):
+    print(f"\n{'route':<40} {'reqs':>7} {'5xx':>5} {'4xx':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for route, r in report['routes'].items():
+        print(f"{route:<40} {r['requests']:>7} {r['errors']:>5} {r['client_errors']:>5} {r['throughput_rps']:>8} "
+              f"{r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8}")
+    print(f"\nTotal: {report['total_requests']} requests in {report['elapsed_seconds']}s "
+          f"({report['throughput_rps']} req/s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a realistic request mix and report latency")
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--in-process', action='store_true', help="Use Flask's test client instead of HTTP")
+    parser.add_argument('--manifest', default='bench_dataset.json')
+    parser.add_argument('--memory', choices=SCALES, metavar='SCALE',
+                        help="Generate a dataset of this scale in memory and replay in-process")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, help="Seconds to run (default 30 unless --requests)")
+    parser.add_argument('--requests', type=int, help="Stop after this many measured requests")
+    parser.add_argument('--warmup', type=int, default=100, help="Requests to discard before measuring")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--routes', help="Comma-separated subset of route names to replay")
+    parser.add_argument('--output', default='loadtest_results.json')
+    args = parser.parse_args(argv)
+
+    if args.memory:
+        os.environ['DB_BACKEND'] = 'memory'
+        args.in_process = True
+    if args.in_process:
+        # One client replays the whole mix; per-client limits would only measure 429s
+        os.environ['RATE_LIMIT_ENABLED'] = 'false'
+        manifest = {'counts': dict(SCALES[args.memory]), 'password': PASSWORD}
+        generate(manifest['counts'], workers=1, batch_size=1000, chunk_size=50000, seed='linkfluence')
+    else:
+        with open(args.manifest) as f:
+            manifest = json.load(f)
+    counts = dict(manifest['counts'], password=manifest.get('password'))
+
+    mix = MIX
+    if args.routes:
+        wanted = [r.strip() for r in args.routes.split(',')]
+        mix = {name: MIX[name] for name in wanted if name in MIX}
+        if not mix:
+            parser.error(f"No known routes in --routes. Known: {', '.join(MIX)}")
+
+    duration = args.duration if args.duration is not None else (None if args.requests else 30)
+    client = InProcessClient() if args.in_process else HttpClient(args.url, args.timeout)
+
+    report = run(client, counts, args.concurrency, duration, args.requests, args.seed, mix, args.warmup)
+    report.update({
+        'target': ('in-memory' if args.memory else 'in-process') if args.in_process else args.url,
+        'concurrency': args.concurrency,
+        'seed': args.seed,
+        'dataset': manifest['counts'],
+        'finished_at': datetime.utcnow().isoformat(),
+    })
+
+    print_report(report)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Baseline written to {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
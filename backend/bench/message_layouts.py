@@ -0,0 +1,100 @@
+"""
+Linkfluence Message Layout Benchmark
+Run from backend/: python -m bench.message_layouts --conversations 200 --messages-per-conversation 500
+
+Writes the same synthetic chat traffic through the per-message and the
+bucketed layouts (into scratch collections), then compares write
+throughput, full-thread and last-50 read latency, and storage/index size.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+from database import get_db
+from models.message import BucketStore, DocumentStore, MESSAGE_BUCKET_SIZE
+
+
+def _traffic(conversations, per_conversation, seed):
+    """Interleaved messages across conversations, in send order"""
+    rng = random.Random(seed)
+    threads = [(str(ObjectId()), str(ObjectId()), str(ObjectId())) for _ in range(conversations)]
+    start = datetime(2025, 1, 1)
+    order = [i for i in range(conversations) for _ in range(per_conversation)]
+    rng.shuffle(order)
+    for n, i in enumerate(order):
+        campaign_id, creator_id, business_id = threads[i]
+        sender, receiver = (creator_id, business_id) if rng.random() < 0.5 else (business_id, creator_id)
+        yield threads[i], {
+            'campaign_id': campaign_id, 'sender_id': sender, 'receiver_id': receiver,
+            'content': 'x' * rng.randint(10, 200), 'timestamp': start + timedelta(seconds=n)
+        }
+
+
+def _measure(store, collection, traffic, threads, reads, limit):
+    started = time.perf_counter()
+    for _, msg in traffic:
+        store.send(dict(msg))
+    write_seconds = time.perf_counter() - started
+
+    def timed(read_limit):
+        samples = []
+        for campaign_id, creator_id, business_id in random.Random(1).choices(threads, k=reads):
+            t = time.perf_counter()
+            store.get_conversation(campaign_id, creator_id, business_id, read_limit)
+            samples.append((time.perf_counter() - t) * 1000)
+        samples.sort()
+        return {'p50_ms': round(statistics.median(samples), 3),
+                'p95_ms': round(samples[int(len(samples) * 0.95) - 1], 3)}
+
+    stats = collection.database.command('collStats', collection.name)
+    return {
+        'writes_per_second': round(len(traffic) / write_seconds),
+        'full_thread_read': timed(None),
+        f'last_{limit}_read': timed(limit),
+        'documents': stats.get('count'),
+        'storage_bytes': stats.get('storageSize'),
+        'index_bytes': stats.get('totalIndexSize'),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare per-message and bucketed message storage")
+    parser.add_argument('--conversations', type=int, default=200)
+    parser.add_argument('--messages-per-conversation', type=int, default=500)
+    parser.add_argument('--bucket-size', type=int, default=MESSAGE_BUCKET_SIZE)
+    parser.add_argument('--reads', type=int, default=500)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    db = get_db()
+    traffic = list(_traffic(args.conversations, args.messages_per_conversation, args.seed))
+    threads = sorted({t for t, _ in traffic})
+
+    results = {}
+    layouts = {
+        'documents': (db.bench_messages, DocumentStore),
+        'buckets': (db.bench_message_buckets, lambda c: BucketStore(c, args.bucket_size)),
+    }
+    for name, (collection, make_store) in layouts.items():
+        collection.drop()
+        if name == 'documents':
+            collection.create_index([('campaign_id', 1), ('sender_id', 1), ('receiver_id', 1), ('timestamp', 1)])
+        else:
+            collection.create_index([('conversation', 1), ('last_ts', -1)])
+        print(f"✍️  {name}: writing {len(traffic)} messages...")
+        results[name] = _measure(make_store(collection), collection, traffic, threads, args.reads, args.limit)
+        collection.drop()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
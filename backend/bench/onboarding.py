@@ -0,0 +1,84 @@
+"""
+Linkfluence Onboarding Benchmark
+Run from backend/: python -m bench.onboarding --users 5000 --workers 1,4,8
+
+Builds an NDJSON upload of synthetic creators and businesses (a share of
+them deliberately invalid or repeated), imports it once per --workers
+setting and reports users imported per second with the time spent hashing
+and writing. Imported users are deleted after each run.
+"""
+
+import argparse
+import io
+import json
+import random
+import sys
+
+import onboarding
+from bench.generate_data import BUSINESS_TYPES, PACKAGE_NAMES, PLATFORMS, WORDS
+from database import get_db, normalize_email
+
+EMAIL_DOMAIN = 'onboard.bench.linkfluence.test'
+
+
+def _records(count, seed, invalid_share, duplicate_share):
+    rng = random.Random(seed)
+    for i in range(count):
+        if rng.random() < duplicate_share and i:
+            i = rng.randrange(i)
+        email = f"user{i}@{EMAIL_DOMAIN}"
+        if rng.random() < 0.8:
+            record = {
+                'email': email, 'password': f'pass-{i}', 'role': 'creator',
+                'name': f"{rng.choice(WORDS).capitalize()} {i}",
+                'category': rng.choice(onboarding.CATEGORIES),
+                'followers': rng.randint(0, 500000),
+                'social_links': {p: f"https://{p}.com/user{i}" for p in rng.sample(PLATFORMS, 2)},
+                'service_packages': [{'name': rng.choice(PACKAGE_NAMES), 'price': f"${rng.randint(50, 5000)}"}],
+            }
+        else:
+            record = {'email': email, 'password': f'pass-{i}', 'role': 'business',
+                      'name': f"Co {i}", 'business_type': rng.choice(BUSINESS_TYPES)}
+        if rng.random() < invalid_share:
+            record['email'] = 'not-an-email'
+        yield json.dumps(record)
+
+
+def _cleanup(db, count):
+    emails = [normalize_email(f"user{i}@{EMAIL_DOMAIN}") for i in range(count)]
+    for start in range(0, len(emails), 10000):
+        db.users.delete_many({'email_normalized': {'$in': emails[start:start + 10000]}})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure bulk onboarding throughput")
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--workers', default=f"1,{onboarding.ONBOARD_HASH_WORKERS}",
+                        help="Comma-separated hashing pool sizes to compare")
+    parser.add_argument('--chunk-size', type=int, default=onboarding.ONBOARD_CHUNK_SIZE)
+    parser.add_argument('--invalid-share', type=float, default=0.02)
+    parser.add_argument('--duplicate-share', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    db = get_db()
+    upload = ('\n'.join(_records(args.users, args.seed, args.invalid_share, args.duplicate_share)) + '\n').encode()
+
+    results = {}
+    for workers in sorted({int(w) for w in args.workers.split(',')}):
+        _cleanup(db, args.users)
+        onboarding.shutdown_pool()
+        onboarding.ONBOARD_HASH_WORKERS = workers
+        print(f"📥 Importing {args.users} users with {workers} hashing worker(s)...")
+        report = onboarding.import_stream(io.BytesIO(upload), 'ndjson', chunk_size=args.chunk_size)
+        result = report.as_dict()
+        result.pop('errors')
+        results[f'workers={workers}'] = result
+    onboarding.shutdown_pool()
+    _cleanup(db, args.users)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Linkfluence Similar Creators Benchmark
+Run from backend/: python -m bench.similar --creators 200000 --queries 1000
+
+Builds the similar-creators index in-process from generated creator
+documents (no database needed), then reports build time, index size,
+lookup latency and how lookup latency holds up while creators are
+being re-indexed one at a time.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+
+from bench.generate_data import _creator
+from similar import SimilarityIndex, features
+
+
+def _latency(index, ids, queries, limit, rng):
+    samples = []
+    for doc_id in rng.choices(ids, k=queries):
+        t = time.perf_counter()
+        index.similar(doc_id, limit)
+        samples.append((time.perf_counter() - t) * 1000)
+    samples.sort()
+    return {'p50_ms': round(statistics.median(samples), 3),
+            'p95_ms': round(samples[int(len(samples) * 0.95) - 1], 3),
+            'max_ms': round(samples[-1], 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the similar-creators index")
+    parser.add_argument('--creators', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"🧮 Featurising {args.creators} creators...")
+    rows = []
+    for i in range(args.creators):
+        doc = _creator(i, rng, '')
+        rows.append((str(doc['_id']), *features(doc)))
+    ids = [r[0] for r in rows]
+
+    index = SimilarityIndex(max_docs=args.creators)
+    started = time.perf_counter()
+    index.load(rows)
+    build_seconds = time.perf_counter() - started
+
+    results = {
+        'creators': len(index),
+        'terms': index.term_count,
+        'build_seconds': round(build_seconds, 2),
+        'lookup': _latency(index, ids, args.queries, args.limit, rng),
+    }
+
+    print(f"✏️  Re-indexing {args.updates} creators...")
+    started = time.perf_counter()
+    for _ in range(args.updates):
+        i = rng.randrange(args.creators)
+        doc = _creator(i, rng, '')
+        index.upsert(str(doc['_id']), *features(doc))
+    results['upserts_per_second'] = round(args.updates / (time.perf_counter() - started))
+    results['lookup_after_updates'] = _latency(index, ids, args.queries, args.limit, rng)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Small in-process caches for hot, read-mostly results.
+
+Caches created with a name report lookups by outcome (hit, miss,
+coalesced, stale) and their size on /metrics. With stale_ttl set, expired
+entries are kept that much longer so get_stale() can still return them,
+e.g. while the database is unavailable.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from instrumentation import REGISTRY, counter, gauge
+
+CACHE_REQUESTS = counter('linkfluence_cache_requests_total', 'Cache lookups by outcome',
+                         ('cache', 'outcome'))
+CACHE_ENTRIES = gauge('linkfluence_cache_entries', 'Entries held per cache', ('cache',))
+
+_MISSING = object()
+_named = []
+
+# Lookup outcome -> TTLCache attribute counting it
+_OUTCOMES = {'hit': 'hits', 'miss': 'misses', 'coalesced': 'coalesced', 'stale': 'stale'}
+
+
+class _Flight:
+    """A computation other callers of the same key are waiting on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, ttl, max_entries=1024, name=None, stale_ttl=0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.name = name
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale = 0
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        if name:
+            _named.append(self)
+
+    def _count(self, outcome):
+        # Caller holds the lock
+        attr = _OUTCOMES[outcome]
+        setattr(self, attr, getattr(self, attr) + 1)
+        if self.name:
+            CACHE_REQUESTS.inc(cache=self.name, outcome=outcome)
+
+    def _lookup(self, key):
+        # Caller holds the lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires, value = entry
+        now = time.monotonic()
+        if expires < now:
+            if expires + self.stale_ttl < now:
+                del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def get_stale(self, key, default=None):
+        """The value for key even if expired, while within stale_ttl"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] + self.stale_ttl < time.monotonic():
+                return default
+            self._count('stale')
+            return entry[1]
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key)
+            self._count('miss' if value is _MISSING else 'hit')
+        return default if value is _MISSING else value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._set(key, value, ttl)
+
+    def _set(self, key, value, ttl):
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute, ttl=None):
+        """
+        The cached value for key, or compute()'s result, cached. Concurrent
+        misses on one key are coalesced: the first caller computes and the
+        others wait for its result (or its exception) instead of repeating
+        the work.
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self._count('hit')
+                return value
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            self._count('miss' if leader else 'coalesced')
+        if not leader:
+            return flight.wait()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            flight.value = value
+            with self._lock:
+                self._set(key, value, ttl)
+            return value
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'stale': self.stale,
+            # Coalesced lookups were served without running the query too
+            'hit_ratio': round((self.hits + self.coalesced) / lookups, 4) if lookups else None,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def collect_metrics():
+    for cache in _named:
+        CACHE_ENTRIES.set(len(cache), cache=cache.name)
+
+
+REGISTRY.add_collector(collect_metrics)
@@ -0,0 +1,356 @@
+"""
+Columnar in-memory snapshot of creators for structured discovery filters.
+
+Each creator is one row across NumPy arrays: a category code, follower
+count, average rating and a platform bitmask. Service package prices are
+kept flat with the row that owns them, so "some package priced within
+range" is a vectorized test too. A search builds a boolean mask, sorts
+and slices it, and only the ids of the requested page go back to Mongo.
+
+Enable with CREATOR_INDEX=1 (requires numpy). The snapshot is built on
+first use and kept current either from a change stream on `users`
+(CREATOR_INDEX_SYNC=change_stream, needs a replica set) or by a delta
+query on `updated_at` every CREATOR_INDEX_REFRESH_SECONDS. Deleted users
+are only dropped on the next full rebuild. `linkfluence_creator_index_
+staleness_seconds` reports how long ago the snapshot last caught up.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from instrumentation import gauge, REGISTRY
+
+try:
+    import numpy as np
+except ImportError:  # pinned in requirements.txt; without it searches fall back to Mongo
+    np = None
+
+logger = logging.getLogger(__name__)
+
+CREATOR_INDEX = os.getenv("CREATOR_INDEX", "0").lower() in ("1", "true", "yes")
+CREATOR_INDEX_SYNC = os.getenv("CREATOR_INDEX_SYNC", "poll")
+CREATOR_INDEX_REFRESH_SECONDS = float(os.getenv("CREATOR_INDEX_REFRESH_SECONDS", "5"))
+CREATOR_INDEX_MAX_DOCS = int(os.getenv("CREATOR_INDEX_MAX_DOCS", "2000000"))
+# Rebuild the price arrays once this share of entries belongs to stale rows
+PRICE_COMPACT_RATIO = 0.25
+
+PLATFORMS = ['instagram', 'tiktok', 'youtube', 'twitter']
+PLATFORM_BITS = {p: 1 << i for i, p in enumerate(PLATFORMS)}
+TIER_RANGES = {
+    'nano': (None, 10000),
+    'micro': (10000, 100000),
+    'macro': (100000, None),
+}
+SORT_COLUMNS = {'followers': 'followers', 'rating': 'rating'}
+
+PROJECTION = {'category': 1, 'followers': 1, 'average_rating': 1,
+              'social_links': 1, 'service_packages': 1, 'role': 1}
+
+INDEX_ROWS = gauge('linkfluence_creator_index_rows', 'Creators held in the columnar index')
+INDEX_STALENESS = gauge('linkfluence_creator_index_staleness_seconds',
+                        'Seconds since the columnar creator index last caught up with Mongo')
+
+
+def available():
+    return CREATOR_INDEX and np is not None
+
+
+def _number(value):
+    """Numeric value as Mongo's range operators see it, else NaN"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return float('nan')
+    return float(value)
+
+
+def _prices(packages):
+    """Package prices as the search route's price filter reads them"""
+    prices = []
+    for pkg in packages or []:
+        if not isinstance(pkg, dict):
+            continue
+        try:
+            prices.append(float(pkg.get('price', 0)))
+        except (ValueError, TypeError):
+            continue
+    return prices
+
+
+def _platform_mask(links):
+    mask = 0
+    if isinstance(links, dict):
+        for platform, bit in PLATFORM_BITS.items():
+            # Same as {'social_links.<p>': {'$exists': True, '$ne': ''}}
+            if platform in links and links[platform] != '':
+                mask |= bit
+    return mask
+
+
+class ColumnarCreatorIndex:
+    """Creator rows as parallel arrays; rows of changed creators are reused"""
+
+    def __init__(self, max_docs=CREATOR_INDEX_MAX_DOCS):
+        self.max_docs = max_docs
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.ids = []
+        self.rows = {}
+        self.categories = {}
+        self.category = np.zeros(0, dtype=np.int32)
+        self.followers = np.zeros(0, dtype=np.float64)
+        self.rating = np.zeros(0, dtype=np.float64)
+        self.platforms = np.zeros(0, dtype=np.uint8)
+        self.alive = np.zeros(0, dtype=bool)
+        self.price = np.zeros(0, dtype=np.float64)
+        self.price_row = np.zeros(0, dtype=np.int64)
+        self.stale_prices = 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _category_code(self, category):
+        if category is None:
+            return -1
+        code = self.categories.get(category)
+        if code is None:
+            code = self.categories[category] = len(self.categories)
+        return code
+
+    def _columns(self, docs):
+        """Column values for docs, plus their flat (price, position) pairs"""
+        category = [self._category_code(d.get('category')) for d in docs]
+        followers = [_number(d.get('followers')) for d in docs]
+        rating = [_number(d.get('average_rating')) for d in docs]
+        platforms = [_platform_mask(d.get('social_links')) for d in docs]
+        prices, owners = [], []
+        for i, d in enumerate(docs):
+            p = _prices(d.get('service_packages'))
+            prices.extend(p)
+            owners.extend([i] * len(p))
+        return (np.array(category, dtype=np.int32), np.array(followers, dtype=np.float64),
+                np.array(rating, dtype=np.float64), np.array(platforms, dtype=np.uint8),
+                np.array(prices, dtype=np.float64), np.array(owners, dtype=np.int64))
+
+    def load(self, docs):
+        """Replace the contents with an iterable of creator documents"""
+        batch = []
+        ids = []
+        for d in docs:
+            if len(batch) >= self.max_docs:
+                logger.warning("Creator index full at %d rows; the rest are not indexed", self.max_docs)
+                break
+            batch.append(d)
+            ids.append(str(d['_id']))
+        with self._lock:
+            self._reset()
+            category, followers, rating, platforms, price, owners = self._columns(batch)
+            self.ids = ids
+            self.rows = {doc_id: i for i, doc_id in enumerate(ids)}
+            self.category, self.followers, self.rating, self.platforms = category, followers, rating, platforms
+            self.alive = np.ones(len(ids), dtype=bool)
+            self.price, self.price_row = price, owners
+
+    def apply(self, docs):
+        """Upsert changed users; non-creators are dropped from the index"""
+        with self._lock:
+            changed = [d for d in docs if d.get('role') == 'creator']
+            gone = [str(d['_id']) for d in docs if d.get('role') != 'creator']
+            for doc_id in gone:
+                row = self.rows.pop(doc_id, None)
+                if row is not None:
+                    self.alive[row] = False
+            if not changed:
+                return
+
+            existing = [d for d in changed if str(d['_id']) in self.rows]
+            new = [d for d in changed if str(d['_id']) not in self.rows]
+            new = new[:max(0, self.max_docs - len(self.rows))]
+            rows = np.array([self.rows[str(d['_id'])] for d in existing] +
+                            list(range(len(self.ids), len(self.ids) + len(new))), dtype=np.int64)
+            category, followers, rating, platforms, price, owners = self._columns(existing + new)
+
+            if new:
+                grow = len(new)
+                self.category = np.concatenate([self.category, np.zeros(grow, dtype=np.int32)])
+                self.followers = np.concatenate([self.followers, np.zeros(grow)])
+                self.rating = np.concatenate([self.rating, np.zeros(grow)])
+                self.platforms = np.concatenate([self.platforms, np.zeros(grow, dtype=np.uint8)])
+                self.alive = np.concatenate([self.alive, np.zeros(grow, dtype=bool)])
+                for d in new:
+                    self.rows[str(d['_id'])] = len(self.ids)
+                    self.ids.append(str(d['_id']))
+
+            self.category[rows] = category
+            self.followers[rows] = followers
+            self.rating[rows] = rating
+            self.platforms[rows] = platforms
+            self.alive[rows] = True
+
+            # Old prices of updated rows go stale; new ones are appended
+            if existing:
+                stale = np.isin(self.price_row, rows[:len(existing)])
+                self.price_row[stale] = -1
+                self.stale_prices += int(stale.sum())
+            self.price = np.concatenate([self.price, price])
+            self.price_row = np.concatenate([self.price_row, rows[owners]])
+            if self.stale_prices > PRICE_COMPACT_RATIO * max(len(self.price), 1):
+                keep = self.price_row >= 0
+                self.price, self.price_row = self.price[keep], self.price_row[keep]
+                self.stale_prices = 0
+
+    def search(self, category=None, follower_tier=None, platforms=None, price_range=None,
+               sort=None, offset=0, limit=50):
+        """
+        Ids of creators matching every given predicate, one page of them.
+        platforms matches creators with at least one of the listed ones;
+        price_range is (min, max or None), inclusive.
+        """
+        with self._lock:
+            mask = self.alive.copy()
+            if category is not None:
+                code = self.categories.get(category)
+                if code is None:
+                    return []
+                mask &= self.category == code
+            if follower_tier is not None:
+                low, high = TIER_RANGES[follower_tier]
+                if low is not None:
+                    mask &= self.followers >= low
+                if high is not None:
+                    mask &= self.followers < high
+            if platforms:
+                bits = 0
+                for p in platforms:
+                    bits |= PLATFORM_BITS.get(p, 0)
+                mask &= (self.platforms & bits) != 0
+            if price_range is not None:
+                low, high = price_range
+                in_range = (self.price >= low) & (self.price_row >= 0)
+                if high is not None:
+                    in_range &= self.price <= high
+                has_price = np.zeros(len(mask), dtype=bool)
+                has_price[self.price_row[in_range]] = True
+                mask &= has_price
+
+            rows = np.flatnonzero(mask)
+            if sort in SORT_COLUMNS:
+                # Descending, creators without a value last, ties by row
+                key = -np.nan_to_num(getattr(self, SORT_COLUMNS[sort])[rows], nan=-np.inf)
+                wanted = offset + limit
+                if wanted < len(rows):
+                    # Only the leading rows need a full sort; keep every tie
+                    # with the cut-off value so pages stay deterministic
+                    cutoff = np.partition(key, wanted - 1)[wanted - 1]
+                    head = key <= cutoff
+                    rows, key = rows[head], key[head]
+                rows = rows[np.lexsort((rows, key))]
+            page = rows[offset:offset + limit]
+            return [self.ids[r] for r in page]
+
+
+class CreatorIndexService:
+    """Owns the process-wide snapshot: lazy build, sync, staleness"""
+
+    def __init__(self):
+        self.index = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self._last_sync = None
+        self._synced_at = None
+        self._last_check = 0.0
+        self._watcher = None
+
+    def _ensure_fresh(self):
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._full_load()
+                    if CREATOR_INDEX_SYNC == 'change_stream':
+                        self._start_watcher()
+            return
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        if time.monotonic() - self._last_check >= CREATOR_INDEX_REFRESH_SECONDS:
+            with self._load_lock:
+                if time.monotonic() - self._last_check >= CREATOR_INDEX_REFRESH_SECONDS:
+                    self._delta_sync()
+
+    def _full_load(self):
+        from database import get_db
+        db = get_db()
+        started = time.perf_counter()
+        sync_from = datetime.utcnow()
+        index = ColumnarCreatorIndex()
+        cursor = db.users.find({'role': 'creator'}, PROJECTION, batch_size=5000).sort('_id', 1)
+        index.load(cursor)
+        self.index = index
+        self._last_sync = sync_from
+        self._synced_at = time.time()
+        self._last_check = time.monotonic()
+        self._loaded = True
+        logger.info("Creator index built: %d creators in %.2fs", len(index), time.perf_counter() - started)
+
+    def _delta_sync(self):
+        from database import get_db
+        db = get_db()
+        sync_from = datetime.utcnow()
+        changed = list(db.users.find({'updated_at': {'$gte': self._last_sync}}, PROJECTION))
+        if changed:
+            self.index.apply(changed)
+        self._last_sync = sync_from
+        self._synced_at = time.time()
+        self._last_check = time.monotonic()
+
+    def _start_watcher(self):
+        self._watcher = threading.Thread(target=self._watch, name='creator-index-watch', daemon=True)
+        self._watcher.start()
+
+    def _watch(self):
+        """Apply change stream events; on failure fall back to polling"""
+        from database import get_db
+        from pymongo.errors import PyMongoError
+        pipeline = [{'$match': {'operationType': {'$in': ['insert', 'update', 'replace']}}}]
+        try:
+            with get_db().users.watch(pipeline, full_document='updateLookup') as stream:
+                # Catch anything written between the full load and the watch
+                with self._load_lock:
+                    self._delta_sync()
+                while True:
+                    change = stream.try_next()
+                    if change is not None and change.get('fullDocument'):
+                        self.index.apply([change['fullDocument']])
+                    self._synced_at = time.time()
+                    if change is None:
+                        time.sleep(0.1)
+        except PyMongoError as e:
+            logger.warning("Creator index change stream stopped (%s); falling back to polling", e)
+
+    def on_user_change(self, user_id, fields):
+        """User change listener: pick up this process's writes on the next search"""
+        self._last_check = 0.0
+
+    def search(self, **filters):
+        self._ensure_fresh()
+        return self.index.search(**filters)
+
+    def collect_metrics(self):
+        if self.index is not None:
+            INDEX_ROWS.set(len(self.index))
+        if self._synced_at is not None:
+            INDEX_STALENESS.set(round(time.time() - self._synced_at, 3))
+
+
+creator_index = CreatorIndexService()
+REGISTRY.add_collector(creator_index.collect_metrics)
+
+if CREATOR_INDEX and np is None:
+    logger.warning("CREATOR_INDEX is set but numpy is not installed; creator search stays on Mongo")
+
+
+def register_listeners():
+    from models.user import User
+    User.add_change_listener(creator_index.on_user_change)
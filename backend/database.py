@@ -1,53 +1,212 @@
 from pymongo import MongoClient
 from pymongo.server_api import ServerApi
+import logging
 import os
 import certifi
+from instrumentation import command_listener
+from resilience import check_available
+
+logger = logging.getLogger(__name__)
 
 _db = None
 
-def get_db():
-    global _db
-    if _db is None:
-        MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/linkfluence")
-        
-        # Standard, Secure Connection
-        # We use certifi to ensure we have the latest root certificates
-        # We use ServerApi('1') to ensure compatibility with Atlas
-        if "mongodb+srv" in MONGO_URI:
-            print("🔌 Connecting to Atlas (Secure Mode)...")
-            client = MongoClient(MONGO_URI, 
-                               tlsCAFile=certifi.where(),
-                               server_api=ServerApi('1'))
-        else:
-            print("🔌 Connecting to Local DB...")
-            client = MongoClient(MONGO_URI)
+# Driver timeouts for work outside a request deadline (jobs, CLI scripts,
+# exports). Within a deadline (see resilience.py) pymongo uses the time left
+# instead of the server selection and socket timeouts
+DRIVER_TIMEOUTS = {
+    'serverSelectionTimeoutMS': int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    'connectTimeoutMS': int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+    'socketTimeoutMS': int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000")),
+}
+
+# Indexes the models rely on, created once per process on first connection.
+# Each entry: collection -> list of (keys, options)
+INDEXES = {
+    'analytics': [
+        ([('user_id', 1), ('timestamp', 1)], {'name': 'user_timestamp'}),
+    ],
+    'applications': [
+        ([('campaign_id', 1), ('creator_id', 1)], {'unique': True, 'name': 'uniq_campaign_creator'}),
+        ([('campaign_id', 1), ('created_at', -1)], {'name': 'campaign_created'}),
+    ],
+    'campaign_rollups': [
+        ([('business_id', 1)], {'name': 'business_id'}),
+    ],
+    'campaigns': [
+        ([('status', 1), ('created_at', -1)], {'name': 'status_created'}),
+        ([('business_id', 1), ('created_at', -1)], {'name': 'business_created'}),
+        ([('status', 1), ('budget', 1)], {'name': 'status_budget'}),
+        ([('status', 1), ('deadline', 1)], {'name': 'status_deadline'}),
+        ([('status', 1), ('closed_at', 1)], {'name': 'status_closed_at'}),
+    ],
+    'messages': [
+        ([('campaign_id', 1), ('sender_id', 1), ('receiver_id', 1), ('timestamp', 1)], {'name': 'conversation_timestamp'}),
+    ],
+    'message_buckets': [
+        ([('conversation', 1), ('last_ts', -1)], {'name': 'conversation_last_ts'}),
+        ([('participants', 1), ('last_ts', -1)], {'name': 'participants_last_ts'}),
+    ],
+    'notifications': [
+        ([('user_id', 1), ('created_at', -1), ('_id', -1)], {'name': 'user_created'}),
+        ([('user_id', 1), ('read', 1)], {'name': 'user_read'}),
+        # Only read notifications carry read_at, so unread ones never expire
+        ([('read_at', 1)], {
+            'name': 'read_at_ttl',
+            'expireAfterSeconds': int(os.getenv("NOTIFICATION_READ_TTL_DAYS", "30")) * 86400
+        }),
+    ],
+    'reviews': [
+        ([('creator_id', 1), ('reviewer_id', 1)], {'unique': True, 'name': 'uniq_creator_reviewer'}),
+    ],
+    'users': [
+        ([('updated_at', 1)], {'name': 'updated_at'}),
+        # Discovery filters always start with role; category narrows most
+        ([('role', 1), ('category', 1), ('followers', -1)], {'name': 'role_category_followers'}),
+        ([('role', 1), ('business_type', 1)], {'name': 'role_business_type'}),
+        ([('email_normalized', 1)], {
+            'unique': True,
+            'name': 'uniq_email_normalized',
+            'partialFilterExpression': {'email_normalized': {'$type': 'string'}}
+        }),
+    ],
+}
+
+
+def normalize_email(email):
+    """Canonical form used for uniqueness checks and lookups"""
+    return (email or '').strip().lower()
+
 
+class UniqueIndexError(RuntimeError):
+    """A unique index the models depend on could not be built"""
+
+
+def ensure_indexes(db):
+    """
+    Create the indexes in INDEXES. Failures are logged, except for unique
+    indexes, which raise UniqueIndexError: without them duplicate accounts,
+    applications and reviews would be accepted.
+    """
+    # Older user documents predate email_normalized; backfill them first so
+    # the unique index covers every account
+    try:
+        db.users.update_many(
+            {'email_normalized': {'$exists': False}, 'email': {'$type': 'string'}},
+            [{'$set': {'email_normalized': {'$toLower': {'$trim': {'input': '$email'}}}}}]
+        )
+    except Exception as e:
+        logger.warning("Email backfill skipped: %s", e)
+
+    # Notifications read before read_at was recorded would never reach the
+    # read_at TTL; date them from creation instead
+    try:
+        db.notifications.update_many(
+            {'read': True, 'read_at': {'$exists': False}},
+            [{'$set': {'read_at': '$created_at'}}]
+        )
+    except Exception as e:
+        logger.warning("Notification read_at backfill skipped: %s", e)
+
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                db[collection].create_index(keys, **options)
+            except Exception as e:
+                if options.get('unique'):
+                    # Duplicate checks rely on these; never serve without them
+                    raise UniqueIndexError(
+                        f"Could not create unique index {options.get('name')} on {collection}: {e}. "
+                        f"Remove the duplicate documents and restart."
+                    ) from e
+                logger.warning("Could not create index %s on %s: %s", options.get('name'), collection, e)
+
+def _connect_mongo(uri):
+    # Standard, Secure Connection
+    # We use certifi to ensure we have the latest root certificates
+    # We use ServerApi('1') to ensure compatibility with Atlas
+    if "mongodb+srv" in uri:
+        logger.info("Connecting to Atlas (Secure Mode)...")
+        client = MongoClient(uri, 
+                           tlsCAFile=certifi.where(),
+                           server_api=ServerApi('1'),
+                           event_listeners=[command_listener],
+                           **DRIVER_TIMEOUTS)
+    else:
+        logger.info("Connecting to Local DB...")
+        client = MongoClient(uri, event_listeners=[command_listener], **DRIVER_TIMEOUTS)
+
+    try:
+        # Force a connection check
+        client.admin.command('ping')
+        logger.info("Connected to MongoDB")
+        
         try:
-            # Force a connection check
-            client.admin.command('ping')
-            print("✅ Connected to MongoDB!")
-            
+            # 1. Try to get database from URI
+            db_name_from_uri = client.get_database().name
+            return client.get_database(db_name_from_uri)
+        except:
+            # 2. Fallback: Check if 'linkfluence' exists in any case
+            target_db = 'linkfluence'
             try:
-                # 1. Try to get database from URI
-                db_name_from_uri = client.get_database().name
-                _db = client.get_database(db_name_from_uri)
+                existing_dbs = client.list_database_names()
+                for db_name in existing_dbs:
+                    if db_name.lower() == target_db.lower():
+                        target_db = db_name
+                        break
             except:
-                # 2. Fallback: Check if 'linkfluence' exists in any case
-                target_db = 'linkfluence'
-                try:
-                    existing_dbs = client.list_database_names()
-                    for db_name in existing_dbs:
-                        if db_name.lower() == target_db.lower():
-                            target_db = db_name
-                            break
-                except:
-                    pass
-                
-                print(f"⚠️ Using database: '{target_db}'")
-                _db = client.get_database(target_db)
-                
-        except Exception as e:
-            print(f"❌ Connection Failed: {e}")
-            raise e
+                pass
+            
+            logger.warning("Using database: '%s'", target_db)
+            return client.get_database(target_db)
+            
+    except Exception as e:
+        logger.error("Connection Failed: %s", e)
+        raise e
+
+
+def _connect_memory(uri):
+    import memorydb
+    logger.info("Using the in-memory database engine")
+    return memorydb.connect(uri)
+
+
+# Database engines by name: connect(uri) -> object with the pymongo Database API
+BACKENDS = {
+    'mongo': _connect_mongo,
+    'memory': _connect_memory,
+}
+
+
+def register_backend(name, connect):
+    """Make another engine selectable through DB_BACKEND"""
+    BACKENDS[name] = connect
+
+
+def backend_name(uri):
+    """DB_BACKEND if set, else 'memory' for memory:// URIs and 'mongo' otherwise"""
+    name = os.getenv("DB_BACKEND")
+    if name:
+        return name
+    return 'memory' if uri.startswith('memory://') else 'mongo'
+
+
+def set_db(db):
+    """Use db for every following get_db(); None reconnects on next use"""
+    global _db
+    _db = db
+
+
+def get_db():
+    global _db
+    # Fail fast while the circuit breaker is turning this request away
+    check_available()
+    if _db is None:
+        uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/linkfluence")
+        name = backend_name(uri)
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown DB_BACKEND '{name}' (known: {', '.join(sorted(BACKENDS))})")
+        db = BACKENDS[name](uri)
+        ensure_indexes(db)
+        _db = db
 
     return _db
@@ -0,0 +1,232 @@
+"""
+Ranked campaign feed for creators.
+
+One aggregation scores every active campaign for a creator:
+
+- category: the campaign's category, or its business's industry or
+  business type, is the creator's category
+- tier: the campaign budget falls in the band that suits the creator's
+  follower tier (TIER_BUDGETS)
+- price: the creator's cheapest service package fits the budget
+
+The best FEED_MAX ids then have the creator's own applications removed by
+an indexed $lookup on applications in the same pipeline. The ranked ids are
+cached per creator (FEED_CACHE_SECONDS). Each cache entry records the feed
+versions it was built from. Versions live in the `feed_versions` collection
+and are bumped by the creator applying or editing their profile (that
+creator's feed) and by campaign writes, which only bump the version of the
+categories the campaign matches: its own and its business's industry and
+type. Every worker process notices invalidations with one small _id lookup.
+Other feeds pick up a new or edited campaign when their entry expires;
+campaigns closed, expired or deleted since are dropped when a page is
+served.
+"""
+
+import logging
+import os
+from datetime import datetime
+
+from cache import TTLCache
+from instrumentation import counter
+
+logger = logging.getLogger(__name__)
+
+FEED_MAX = int(os.getenv("FEED_MAX", "500"))
+FEED_CACHE_SECONDS = float(os.getenv("FEED_CACHE_SECONDS", "300"))
+# Extra ranked candidates kept so already-applied campaigns can be dropped
+FEED_APPLIED_SLACK = 200
+
+WEIGHTS = {'category': 3.0, 'tier': 2.0, 'price': 2.0}
+# Budget band (inclusive low, exclusive high) that suits each follower tier
+TIER_BUDGETS = {
+    'nano': (0, 1000),
+    'micro': (1000, 10000),
+    'macro': (10000, None),
+}
+RANKING_FIELDS = ('category', 'followers', 'service_packages')
+
+FEED_REQUESTS = counter('linkfluence_feed_requests_total', 'Campaign feed lookups', ('outcome',))
+
+def _creator_version(creator_id):
+    return f'creator:{creator_id}'
+
+
+def _category_version(category):
+    return f'category:{category or ""}'
+
+
+def follower_tier(followers):
+    if not isinstance(followers, (int, float)) or isinstance(followers, bool):
+        return None
+    if followers < 10000:
+        return 'nano'
+    if followers < 100000:
+        return 'micro'
+    return 'macro'
+
+
+def min_package_price(packages):
+    prices = []
+    for pkg in packages or []:
+        try:
+            prices.append(float(pkg.get('price', 0)))
+        except (AttributeError, TypeError, ValueError):
+            continue
+    return min(prices) if prices else None
+
+
+def _score_expr(category, business_ids, tier, min_price):
+    budget = {'$convert': {'input': '$budget', 'to': 'double', 'onError': 0, 'onNull': 0}}
+
+    if category:
+        category_match = {'$or': [
+            {'$eq': ['$category', category]},
+            {'$in': ['$business_id', business_ids]},
+        ]}
+    else:
+        category_match = False
+
+    if tier:
+        low, high = TIER_BUDGETS[tier]
+        in_band = [{'$gte': [budget, low]}]
+        if high is not None:
+            in_band.append({'$lt': [budget, high]})
+        # Budgets above the band still pay; below it they rarely do
+        tier_fit = {'$cond': [{'$and': in_band}, 1, {'$cond': [{'$gte': [budget, low]}, 0.5, 0]}]}
+    else:
+        tier_fit = 0.5
+
+    if min_price is None:
+        price_fit = 0.5
+    elif min_price <= 0:
+        price_fit = 1
+    else:
+        price_fit = {'$min': [1, {'$divide': [budget, min_price]}]}
+
+    return {'$add': [
+        {'$cond': [category_match, WEIGHTS['category'], 0]},
+        {'$multiply': [tier_fit, WEIGHTS['tier']]},
+        {'$multiply': [price_fit, WEIGHTS['price']]},
+    ]}
+
+
+def feed_pipeline(creator, business_ids, now):
+    """Aggregation over campaigns returning [{_id, score}] best first"""
+    creator_id = str(creator['_id'])
+    score = _score_expr(creator.get('category'), business_ids,
+                        follower_tier(creator.get('followers')),
+                        min_package_price(creator.get('service_packages')))
+    return [
+        {'$match': {'status': 'active', '$or': [
+            {'deadline': {'$exists': False}}, {'deadline': None}, {'deadline': {'$gte': now}}
+        ]}},
+        {'$project': {'score': score, 'created_at': 1}},
+        {'$sort': {'score': -1, 'created_at': -1, '_id': 1}},
+        {'$limit': FEED_MAX + FEED_APPLIED_SLACK},
+        # Served by the unique (campaign_id, creator_id) index
+        {'$lookup': {
+            'from': 'applications',
+            'let': {'campaign_id': {'$toString': '$_id'}},
+            'pipeline': [
+                {'$match': {'$expr': {'$and': [
+                    {'$eq': ['$campaign_id', '$$campaign_id']},
+                    {'$eq': ['$creator_id', creator_id]},
+                ]}}},
+                {'$limit': 1},
+                {'$project': {'_id': 1}},
+            ],
+            'as': 'applied',
+        }},
+        {'$match': {'applied': {'$size': 0}}},
+        {'$limit': FEED_MAX},
+        {'$project': {'score': 1}},
+    ]
+
+
+class FeedService:
+    def __init__(self):
+        self.cache = TTLCache(ttl=FEED_CACHE_SECONDS, max_entries=10000)
+        # category -> ids of businesses whose industry/type is that category
+        self.business_cache = TTLCache(ttl=FEED_CACHE_SECONDS, max_entries=64)
+
+    def _versions(self, db, creator_id, category):
+        keys = [_category_version(category), _creator_version(creator_id)]
+        found = {d['_id']: d.get('v', 0) for d in db.feed_versions.find({'_id': {'$in': keys}})}
+        return tuple(found.get(k, 0) for k in keys)
+
+    def _category_businesses(self, db, category):
+        if not category:
+            return []
+        ids = self.business_cache.get(category)
+        if ids is None:
+            cursor = db.users.find(
+                {'role': 'business', '$or': [{'business_type': category}, {'industry': category}]},
+                {'_id': 1}
+            )
+            ids = [str(b['_id']) for b in cursor]
+            self.business_cache.set(category, ids)
+        return ids
+
+    def ranked(self, creator):
+        """[(campaign_id, score)] for the creator, best first, at most FEED_MAX"""
+        from database import get_db
+        db = get_db()
+        creator_id = str(creator['_id'])
+        versions = self._versions(db, creator_id, creator.get('category'))
+
+        cached = self.cache.get(creator_id)
+        if cached is not None and cached[0] == versions:
+            FEED_REQUESTS.inc(outcome='hit')
+            return cached[1]
+
+        FEED_REQUESTS.inc(outcome='miss' if cached is None else 'stale')
+        business_ids = self._category_businesses(db, creator.get('category'))
+        pipeline = feed_pipeline(creator, business_ids, datetime.utcnow())
+        ranked = [(str(c['_id']), round(c['score'], 3))
+                  for c in db.campaigns.aggregate(pipeline, allowDiskUse=True)]
+        self.cache.set(creator_id, (versions, ranked))
+        return ranked
+
+    def bump(self, key):
+        from database import get_db
+        get_db().feed_versions.update_one({'_id': key}, {'$inc': {'v': 1}}, upsert=True)
+
+    def on_campaign_change(self, campaign_id):
+        # None (bulk expiry, archival) and deletes only remove campaigns,
+        # which serving already skips
+        if campaign_id is None:
+            return
+        from models.campaign import Campaign
+        from models.user import User
+        campaign = Campaign.find_by_id(campaign_id)
+        if not campaign:
+            return
+        categories = {campaign.get('category')}
+        business = User.find_by_id(campaign.get('business_id'))
+        if business:
+            categories.update((business.get('industry'), business.get('business_type')))
+        for category in categories:
+            if isinstance(category, str) and category:
+                self.bump(_category_version(category))
+
+    def on_application(self, application):
+        if application.get('creator_id'):
+            self.bump(_creator_version(application['creator_id']))
+
+    def on_user_change(self, user_id, fields):
+        if 'created_at' in fields:
+            return  # a new user has no cached feed yet
+        if any(f in fields for f in RANKING_FIELDS):
+            self.bump(_creator_version(user_id))
+
+
+feeds = FeedService()
+
+
+def register_listeners():
+    from models.application import Application
+    from models.campaign import Campaign
+    from models.user import User
+    Campaign.add_change_listener(feeds.on_campaign_change)
+    Application.add_change_listener(feeds.on_application)
+    User.add_change_listener(feeds.on_user_change)
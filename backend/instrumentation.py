@@ -0,0 +1,298 @@
+"""
+Request and database instrumentation.
+
+- MongoCommandListener attributes every Mongo command (count and duration)
+  to the Flask request that issued it.
+- init_app() adds request timing, slow-request/slow-query logging and a
+  Prometheus-format /metrics endpoint.
+
+Metrics are kept per process; with several gunicorn workers each worker
+reports its own series (scrape every worker or aggregate upstream).
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from pymongo import monitoring
+
+logger = logging.getLogger('linkfluence.instrumentation')
+slow_logger = logging.getLogger('linkfluence.slow')
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key)) + list(extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                yield f'{self.name}_bucket', _format_labels(self.labelnames, key, [('le', repr(float(bound)))]), count
+            yield f'{self.name}_bucket', _format_labels(self.labelnames, key, [('le', '+Inf')]), series[-1]
+            yield f'{self.name}_sum', _format_labels(self.labelnames, key), series[-2]
+            yield f'{self.name}_count', _format_labels(self.labelnames, key), series[-1]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def register(self, metric):
+        # Re-registering a name returns the existing metric (module reloads)
+        return self._metrics.setdefault(metric.name, metric)
+
+    def add_collector(self, func):
+        """func() is called before each scrape, e.g. to refresh gauges"""
+        self._collectors.append(func)
+
+    def render(self):
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                logger.warning("Metrics collector failed: %s", e)
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+REQUESTS = counter('linkfluence_requests_total', 'HTTP requests handled',
+                   ('blueprint', 'method', 'status'))
+REQUEST_LATENCY = histogram('linkfluence_request_duration_seconds', 'HTTP request latency',
+                            ('blueprint', 'method'))
+REQUEST_MONGO_COMMANDS = histogram('linkfluence_request_mongo_commands', 'Mongo commands issued per request',
+                                   ('blueprint',), COUNT_BUCKETS)
+MONGO_COMMANDS = counter('linkfluence_mongo_commands_total', 'Mongo commands by blueprint and command',
+                         ('blueprint', 'command', 'outcome'))
+MONGO_LATENCY = histogram('linkfluence_mongo_command_duration_seconds', 'Mongo command latency',
+                          ('command',))
+SLOW_QUERIES = counter('linkfluence_slow_queries_total', 'Mongo commands slower than SLOW_QUERY_MS',
+                       ('blueprint', 'command'))
+SLOW_REQUESTS = counter('linkfluence_slow_requests_total', 'Requests slower than SLOW_REQUEST_MS',
+                        ('blueprint',))
+
+
+class RequestStats:
+    """Mongo activity of one request"""
+
+    __slots__ = ('route', 'blueprint', 'started', 'commands', 'db_seconds', 'by_command')
+
+    def __init__(self, route, blueprint):
+        self.route = route
+        self.blueprint = blueprint
+        self.started = time.perf_counter()
+        self.commands = 0
+        self.db_seconds = 0.0
+        self.by_command = {}
+
+
+_current = ContextVar('linkfluence_request_stats', default=None)
+
+
+def current_stats():
+    """Stats of the request being served on this thread, or None"""
+    return _current.get()
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Attributes command counts and durations to the current request"""
+
+    _SKIP = {'hello', 'ismaster', 'isMaster', 'ping', 'saslStart', 'saslContinue', 'endSessions'}
+
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        if event.command_name in self._SKIP:
+            return
+        stats = _current.get()
+        collection = event.command.get(event.command_name) if event.command else None
+        self._pending[(event.connection_id, event.request_id)] = (
+            stats, collection if isinstance(collection, str) else None
+        )
+
+    def succeeded(self, event):
+        self._finish(event, 'ok')
+
+    def failed(self, event):
+        self._finish(event, 'error')
+
+    def _finish(self, event, outcome):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        stats, collection = pending
+        seconds = event.duration_micros / 1e6
+        name = event.command_name
+        blueprint = stats.blueprint if stats else 'background'
+
+        MONGO_COMMANDS.inc(blueprint=blueprint, command=name, outcome=outcome)
+        MONGO_LATENCY.observe(seconds, command=name)
+
+        if stats is not None:
+            stats.commands += 1
+            stats.db_seconds += seconds
+            stats.by_command[name] = stats.by_command.get(name, 0) + 1
+
+        if seconds * 1000 >= SLOW_QUERY_MS:
+            SLOW_QUERIES.inc(blueprint=blueprint, command=name)
+            slow_logger.warning(json.dumps({
+                'event': 'slow_query',
+                'command': name,
+                'collection': collection,
+                'duration_ms': round(seconds * 1000, 2),
+                'outcome': outcome,
+                'route': stats.route if stats else None,
+            }))
+
+
+command_listener = MongoCommandListener()
+
+
+def init_app(app):
+    """Install request timing, slow-request logging and /metrics on the app"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_request_stats():
+        rule = request.url_rule.rule if request.url_rule else 'unmatched'
+        g._request_stats_token = _current.set(RequestStats(rule, request.blueprint or 'app'))
+
+    @app.after_request
+    def _record_request_stats(response):
+        stats = _current.get()
+        if stats is None:
+            return response
+        seconds = time.perf_counter() - stats.started
+
+        REQUESTS.inc(blueprint=stats.blueprint, method=request.method, status=response.status_code)
+        REQUEST_LATENCY.observe(seconds, blueprint=stats.blueprint, method=request.method)
+        REQUEST_MONGO_COMMANDS.observe(stats.commands, blueprint=stats.blueprint)
+
+        response.headers['X-Mongo-Commands'] = str(stats.commands)
+        response.headers['Server-Timing'] = (
+            f'db;dur={stats.db_seconds * 1000:.2f}, total;dur={seconds * 1000:.2f}'
+        )
+
+        if seconds * 1000 >= SLOW_REQUEST_MS:
+            SLOW_REQUESTS.inc(blueprint=stats.blueprint)
+            slow_logger.warning(json.dumps({
+                'event': 'slow_request',
+                'method': request.method,
+                'route': stats.route,
+                'status': response.status_code,
+                'duration_ms': round(seconds * 1000, 2),
+                'db_ms': round(stats.db_seconds * 1000, 2),
+                'mongo_commands': stats.commands,
+                'by_command': stats.by_command,
+            }))
+        return response
+
+    @app.teardown_request
+    def _clear_request_stats(exc):
+        token = g.pop('_request_stats_token', None)
+        if token is not None:
+            _current.reset(token)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
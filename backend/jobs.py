@@ -0,0 +1,173 @@
+"""
+Linkfluence Background Jobs
+Run once: python jobs.py expire-campaigns
+          python jobs.py archive-campaigns --days 30
+          python jobs.py notifications
+          python jobs.py refresh-leaderboards
+          python jobs.py migrate-messages
+          python jobs.py import-users creators.csv --role creator
+
+The same jobs can run inside the web process on a timer, see
+start_background_jobs() (enabled through environment variables).
+"""
+
+import argparse
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def run_periodically(name, interval_seconds, func):
+    """Run func every interval_seconds on a daemon thread"""
+    def loop():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                func()
+            except Exception:
+                logger.exception("Job '%s' failed", name)
+
+    thread = threading.Thread(target=loop, name=f"job-{name}", daemon=True)
+    thread.start()
+    return thread
+
+
+def expire_campaigns():
+    from models.campaign import Campaign
+    closed = Campaign.close_expired()
+    if closed:
+        logger.info("Closed %d expired campaigns", closed)
+    return closed
+
+
+def archive_campaigns(days=None, batch_size=None):
+    from models.campaign import Campaign
+    days = days if days is not None else int(os.getenv("CAMPAIGN_ARCHIVE_AFTER_DAYS", "30"))
+    batch_size = batch_size or int(os.getenv("CAMPAIGN_ARCHIVE_BATCH_SIZE", "500"))
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    campaigns, applications = Campaign.archive_closed(cutoff, batch_size=batch_size)
+    if campaigns:
+        logger.info("Archived %d campaigns and %d applications", campaigns, applications)
+    return campaigns, applications
+
+
+def migrate_messages(batch_size=1000, replace=False):
+    from models.message import Message
+    copied, buckets = Message.migrate_to_buckets(batch_size=batch_size, replace=replace)
+    logger.info("Copied %d messages into %d buckets", copied, buckets)
+    return copied, buckets
+
+
+def maintain_notifications():
+    from models.notification import Notification
+    compacted = Notification.compact()
+    trimmed = Notification.trim_all()
+    if compacted or trimmed:
+        logger.info("Notifications: %d collapsed into summaries, %d trimmed over the per-user cap",
+                    compacted, trimmed)
+    return compacted, trimmed
+
+
+def import_users(path, fmt=None, role=None, chunk_size=None, dry_run=False):
+    from onboarding import ONBOARD_CHUNK_SIZE, import_stream
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+    with open(path, 'rb') as f:
+        report = import_stream(f, fmt, role, chunk_size or ONBOARD_CHUNK_SIZE, dry_run)
+    return report.as_dict()
+
+
+def refresh_leaderboards():
+    from models.leaderboard import Leaderboard
+    started = time.perf_counter()
+    boards = Leaderboard.refresh()
+    logger.info("Refreshed %d leaderboards in %.2fs", boards, time.perf_counter() - started)
+    return boards
+
+
+def rebuild_rollups(batch_size=None):
+    from models.rollup import Rollup
+    batch_size = batch_size or int(os.getenv("ROLLUP_REBUILD_BATCH_SIZE", "500"))
+    campaigns, businesses = Rollup.rebuild(batch_size=batch_size)
+    logger.info("Rebuilt rollups for %d campaigns and %d businesses", campaigns, businesses)
+    return campaigns, businesses
+
+
+def start_background_jobs():
+    """
+    Start the timers configured through the environment. An interval of 0
+    (the default) leaves the job to be run externally, e.g. from cron.
+    Every job is idempotent, so running it in several workers is harmless.
+    """
+    jobs = {
+        'expire-campaigns': ("CAMPAIGN_EXPIRY_INTERVAL", expire_campaigns),
+        'archive-campaigns': ("CAMPAIGN_ARCHIVE_INTERVAL", archive_campaigns),
+        'notifications': ("NOTIFICATION_MAINTENANCE_INTERVAL", maintain_notifications),
+        'refresh-leaderboards': ("LEADERBOARD_REFRESH_INTERVAL", refresh_leaderboards),
+    }
+    for name, (env_var, func) in jobs.items():
+        interval = int(os.getenv(env_var, "0"))
+        if interval > 0:
+            run_periodically(name, interval, func)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Run Linkfluence maintenance jobs")
+    sub = parser.add_subparsers(dest="job", required=True)
+
+    sub.add_parser("expire-campaigns", help="Close active campaigns past their deadline")
+
+    archive = sub.add_parser("archive-campaigns", help="Move old closed campaigns to cold collections")
+    archive.add_argument("--days", type=int, default=None, help="Archive campaigns closed more than N days ago")
+    archive.add_argument("--batch-size", type=int, default=None)
+
+    sub.add_parser("notifications", help="Collapse repeated notifications and apply the per-user cap")
+
+    sub.add_parser("refresh-leaderboards", help="Rebuild the per-category top creator boards")
+
+    rollups = sub.add_parser("rebuild-rollups", help="Recompute campaign and business analytics rollups")
+    rollups.add_argument("--batch-size", type=int, default=None, help="Campaigns per aggregation")
+
+    migrate = sub.add_parser("migrate-messages", help="Copy per-message documents into message_buckets")
+    migrate.add_argument("--batch-size", type=int, default=1000)
+    migrate.add_argument("--replace", action="store_true", help="Rebuild message_buckets from scratch")
+
+    onboard = sub.add_parser("import-users", help="Bulk-create creators/businesses from NDJSON or CSV")
+    onboard.add_argument("path")
+    onboard.add_argument("--format", choices=["ndjson", "csv"], help="Default: from the file extension")
+    onboard.add_argument("--role", choices=["creator", "business"], help="Role for records without one")
+    onboard.add_argument("--chunk-size", type=int, default=None)
+    onboard.add_argument("--dry-run", action="store_true", help="Validate only")
+
+    args = parser.parse_args()
+    if args.job == "expire-campaigns":
+        print(f"✅ Closed {expire_campaigns()} campaigns")
+    elif args.job == "archive-campaigns":
+        campaigns, applications = archive_campaigns(args.days, args.batch_size)
+        print(f"✅ Archived {campaigns} campaigns, {applications} applications")
+    elif args.job == "notifications":
+        compacted, trimmed = maintain_notifications()
+        print(f"✅ Collapsed {compacted}, trimmed {trimmed} notifications")
+    elif args.job == "refresh-leaderboards":
+        print(f"✅ Refreshed {refresh_leaderboards()} leaderboards")
+    elif args.job == "rebuild-rollups":
+        campaigns, businesses = rebuild_rollups(args.batch_size)
+        print(f"✅ Rebuilt rollups for {campaigns} campaigns, {businesses} businesses")
+    elif args.job == "migrate-messages":
+        copied, buckets = migrate_messages(args.batch_size, args.replace)
+        print(f"✅ Copied {copied} messages into {buckets} buckets")
+    elif args.job == "import-users":
+        report = import_users(args.path, args.format, args.role, args.chunk_size, args.dry_run)
+        for error in report['errors']:
+            print(f"  line {error['line']}: {error['email']}: {'; '.join(error['errors'])}")
+        print(f"✅ Imported {report['imported']} of {report['received']} users "
+              f"({report['invalid']} invalid, {report['duplicates']} duplicates, "
+              f"{report['users_per_second']} users/s)")
@@ -0,0 +1,1837 @@
+"""
+In-memory database engine.
+
+Implements the part of the pymongo Database / Collection API that the
+models use: find (with sort/skip/limit), find_one, inserts, updates with
+the usual operators and upserts, deletes, find_one_and_*, bulk_write,
+count_documents, unique indexes and the aggregation stages and
+expressions in use. Results and errors are pymongo's own types, so model
+code cannot tell the difference.
+
+Select it with DB_BACKEND=memory (or MONGO_URI=memory://). Data lives in
+the process and is lost on exit; each worker process has its own copy.
+Meant for route tests and micro-benchmarks that should measure Python
+rather than the database, not for production.
+"""
+
+import datetime as _dt
+import itertools
+import math
+import re
+import threading
+from collections import OrderedDict
+
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.operations import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+_MISSING = object()
+
+NUMBER_TYPES = (int, float)
+
+# BSON comparison order of the types the models store
+_TYPE_ORDER = [
+    (type(None), 1),
+    (bool, 8),
+    (int, 2),
+    (float, 2),
+    (str, 3),
+    (dict, 4),
+    (list, 5),
+    (bytes, 6),
+    (ObjectId, 7),
+    (_dt.datetime, 9),
+    (re.Pattern, 11),
+]
+
+TYPE_ALIASES = {
+    1: 'double', 2: 'string', 3: 'object', 4: 'array', 7: 'objectId', 8: 'bool',
+    9: 'date', 10: 'null', 11: 'regex', 16: 'int', 18: 'long',
+}
+
+
+def _copy(value):
+    """deepcopy for BSON-like values, several times faster"""
+    kind = type(value)
+    if kind is dict:
+        return {k: _copy(v) for k, v in value.items()}
+    if kind is list:
+        return [_copy(v) for v in value]
+    return value
+
+
+def _type_rank(value):
+    if value is _MISSING:
+        return 0
+    for kind, rank in _TYPE_ORDER:
+        if isinstance(value, kind):
+            return rank
+    return 10
+
+
+def _type_name(value):
+    if value is _MISSING:
+        return 'missing'
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, int):
+        return 'int' if -2 ** 31 <= value < 2 ** 31 else 'long'
+    if isinstance(value, float):
+        return 'double'
+    if isinstance(value, str):
+        return 'string'
+    if isinstance(value, dict):
+        return 'object'
+    if isinstance(value, list):
+        return 'array'
+    if isinstance(value, ObjectId):
+        return 'objectId'
+    if isinstance(value, _dt.datetime):
+        return 'date'
+    if isinstance(value, re.Pattern):
+        return 'regex'
+    return type(value).__name__
+
+
+def _is_number(value):
+    return isinstance(value, NUMBER_TYPES) and not isinstance(value, bool)
+
+
+class _Key:
+    """Total ordering over mixed values, following BSON comparison order"""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return _compare(self.value, other.value) < 0
+
+    def __eq__(self, other):
+        return _compare(self.value, other.value) == 0
+
+
+def _compare(a, b):
+    ra, rb = _type_rank(a), _type_rank(b)
+    if ra != rb:
+        return -1 if ra < rb else 1
+    if a is _MISSING or a is None:
+        return 0
+    if isinstance(a, dict):
+        for (ka, va), (kb, vb) in zip(a.items(), b.items()):
+            c = _compare(ka, kb) or _compare(va, vb)
+            if c:
+                return c
+        return (len(a) > len(b)) - (len(a) < len(b))
+    if isinstance(a, list):
+        for va, vb in zip(a, b):
+            c = _compare(va, vb)
+            if c:
+                return c
+        return (len(a) > len(b)) - (len(a) < len(b))
+    if isinstance(a, re.Pattern):
+        a, b = a.pattern, b.pattern
+    return (a > b) - (a < b)
+
+
+def _equal(a, b):
+    return _type_rank(a) == _type_rank(b) and _compare(a, b) == 0
+
+
+def _freeze(value):
+    """Hashable stand-in for a value, for $group keys and set operations"""
+    if isinstance(value, dict):
+        return ('d', tuple((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return ('l', tuple(_freeze(v) for v in value))
+    if _is_number(value):
+        return ('n', float(value))
+    if value is _MISSING:
+        return ('z', None)
+    return (type(value).__name__, value)
+
+
+# ---------------------------------------------------------------------------
+# Field paths
+
+def _get(doc, path):
+    """Value at a dotted path without array traversal, or _MISSING"""
+    for part in path.split('.'):
+        if isinstance(doc, dict):
+            doc = doc.get(part, _MISSING)
+        elif isinstance(doc, list) and part.isdigit():
+            index = int(part)
+            doc = doc[index] if index < len(doc) else _MISSING
+        else:
+            return _MISSING
+        if doc is _MISSING:
+            return _MISSING
+    return doc
+
+
+def _candidates(doc, parts):
+    """Values a query path can match, expanding arrays along the way"""
+    if not parts:
+        return [doc]
+    head, rest = parts[0], parts[1:]
+    if isinstance(doc, dict):
+        if head not in doc:
+            return [_MISSING]
+        return _candidates(doc[head], rest)
+    if isinstance(doc, list):
+        found = []
+        if head.isdigit():
+            index = int(head)
+            if index < len(doc):
+                found.extend(_candidates(doc[index], rest))
+        for item in doc:
+            if isinstance(item, (dict, list)):
+                found.extend(v for v in _candidates(item, parts) if v is not _MISSING)
+        return found or [_MISSING]
+    return [_MISSING]
+
+
+def _set_path(doc, path, value):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        if isinstance(doc, list):
+            index = int(part)
+            while len(doc) <= index:
+                doc.append(None)
+            if not isinstance(doc[index], (dict, list)):
+                doc[index] = {}
+            doc = doc[index]
+            continue
+        child = doc.get(part)
+        if not isinstance(child, (dict, list)):
+            if part in doc and child is not None:
+                raise OperationFailure(f"Cannot create field '{parts[-1]}' in element {{{part}: {child!r}}}",
+                                       code=28)
+            child = doc[part] = {}
+        doc = child
+    leaf = parts[-1]
+    if isinstance(doc, list):
+        index = int(leaf)
+        while len(doc) <= index:
+            doc.append(None)
+        doc[index] = value
+    else:
+        doc[leaf] = value
+
+
+def _unset_path(doc, path):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        doc = doc.get(part) if isinstance(doc, dict) else None
+        if doc is None:
+            return
+    if isinstance(doc, dict):
+        doc.pop(parts[-1], None)
+
+
+# ---------------------------------------------------------------------------
+# Query matching
+
+def _regex(pattern, options=''):
+    if isinstance(pattern, re.Pattern):
+        return pattern
+    flags = 0
+    for option, flag in (('i', re.IGNORECASE), ('m', re.MULTILINE), ('s', re.DOTALL), ('x', re.VERBOSE)):
+        if option in (options or ''):
+            flags |= flag
+    return re.compile(pattern, flags)
+
+
+def _type_matches(value, wanted):
+    if isinstance(wanted, list):
+        return any(_type_matches(value, w) for w in wanted)
+    wanted = TYPE_ALIASES.get(wanted, wanted)
+    if wanted == 'number':
+        return _is_number(value)
+    return _type_name(value) == wanted
+
+
+def _value_matches(value, condition):
+    """Equality semantics of {field: condition}, arrays matching by element"""
+    if isinstance(condition, re.Pattern):
+        return isinstance(value, str) and condition.search(value) is not None
+    if condition is None:
+        return value is None or value is _MISSING
+    if _equal(value, condition):
+        return True
+    if isinstance(value, list):
+        return any(_equal(v, condition) for v in value)
+    return False
+
+
+def _compare_op(values, operand, test):
+    # Range operators only match values of the operand's type
+    for value in values:
+        for item in value if isinstance(value, list) else [value]:
+            if item is not _MISSING and _type_rank(item) == _type_rank(operand) and test(_compare(item, operand)):
+                return True
+    return False
+
+
+def _operator_matches(values, op, operand, spec, variables):
+    if op == '$eq':
+        return any(_value_matches(v, operand) for v in values)
+    if op == '$ne':
+        return not any(_value_matches(v, operand) for v in values)
+    if op == '$gt':
+        return _compare_op(values, operand, lambda c: c > 0)
+    if op == '$gte':
+        return _compare_op(values, operand, lambda c: c >= 0)
+    if op == '$lt':
+        return _compare_op(values, operand, lambda c: c < 0)
+    if op == '$lte':
+        return _compare_op(values, operand, lambda c: c <= 0)
+    if op == '$in':
+        return any(_value_matches(v, o) for v in values for o in operand)
+    if op == '$nin':
+        return not any(_value_matches(v, o) for v in values for o in operand)
+    if op == '$exists':
+        present = any(v is not _MISSING for v in values)
+        return present == bool(operand)
+    if op == '$type':
+        return any(v is not _MISSING and (_type_matches(v, operand) or
+                                          isinstance(v, list) and any(_type_matches(i, operand) for i in v))
+                   for v in values)
+    if op == '$regex':
+        pattern = _regex(operand, spec.get('$options', ''))
+        return any(_value_matches(v, pattern) for v in values)
+    if op == '$options':
+        return True
+    if op == '$not':
+        if isinstance(operand, (re.Pattern, str)):
+            pattern = _regex(operand)
+            return not any(_value_matches(v, pattern) for v in values)
+        return not _field_matches(values, operand, variables)
+    if op == '$size':
+        return any(isinstance(v, list) and len(v) == operand for v in values)
+    if op == '$all':
+        return all(any(_value_matches(v, o) for v in values) for o in operand)
+    if op == '$elemMatch':
+        for value in values:
+            for item in value if isinstance(value, list) else []:
+                if isinstance(item, dict) and not _is_operator_doc(operand):
+                    if _match(item, operand, variables):
+                        return True
+                elif _field_matches([item], operand, variables):
+                    return True
+        return False
+    if op == '$mod':
+        divisor, remainder = operand
+        return any(_is_number(v) and v % divisor == remainder for v in values)
+    raise OperationFailure(f"unknown operator: {op}", code=2)
+
+
+def _is_operator_doc(value):
+    return isinstance(value, dict) and value and all(str(k).startswith('$') for k in value)
+
+
+def _field_matches(values, condition, variables):
+    if _is_operator_doc(condition):
+        return all(_operator_matches(values, op, operand, condition, variables)
+                   for op, operand in condition.items())
+    return any(_value_matches(v, condition) for v in values)
+
+
+def _match(doc, query, variables=None):
+    for key, condition in query.items():
+        if key == '$and':
+            if not all(_match(doc, q, variables) for q in condition):
+                return False
+        elif key == '$or':
+            if not any(_match(doc, q, variables) for q in condition):
+                return False
+        elif key == '$nor':
+            if any(_match(doc, q, variables) for q in condition):
+                return False
+        elif key == '$expr':
+            scope = dict(variables or {}, ROOT=doc, CURRENT=doc)
+            if not _truthy(_evaluate(condition, doc, scope)):
+                return False
+        elif key == '$comment':
+            continue
+        elif not _field_matches(_candidates(doc, key.split('.')), condition, variables):
+            return False
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Projection and sorting
+
+def _project(doc, projection):
+    if not projection:
+        return doc
+    if isinstance(projection, (list, tuple)):
+        projection = {f: 1 for f in projection}
+    include_id = projection.get('_id', 1)
+    fields = {k: v for k, v in projection.items() if k != '_id'}
+    if any(fields.values()):
+        result = {}
+        if include_id and '_id' in doc:
+            result['_id'] = doc['_id']
+        for path, value in fields.items():
+            if value:
+                _copy_path(doc, result, path.split('.'))
+        return result
+    result = dict(doc)
+    for path, value in projection.items():
+        if not value:
+            if '.' in path:
+                result = _copy(result)
+                _unset_path(result, path)
+            else:
+                result.pop(path, None)
+    return result
+
+
+def _copy_path(source, target, parts):
+    head = parts[0]
+    if isinstance(source, list):
+        items = [item for item in source if isinstance(item, (dict, list))]
+        if not isinstance(target, list):
+            return
+        for item in items:
+            sub = {} if isinstance(item, dict) else []
+            _copy_path(item, sub, parts)
+            target.append(sub)
+        return
+    if not isinstance(source, dict) or head not in source:
+        return
+    value = source[head]
+    if len(parts) == 1:
+        target[head] = value
+        return
+    if isinstance(value, dict):
+        sub = target.setdefault(head, {})
+        _copy_path(value, sub, parts[1:])
+    elif isinstance(value, list):
+        sub = target.setdefault(head, [])
+        _copy_path(value, sub, parts[1:])
+
+
+def _sort_spec(key_or_list, direction=None):
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return [(k, d) for k, d in key_or_list]
+
+
+def _sort_value(doc, path, direction):
+    value = _get(doc, path)
+    if isinstance(value, list):
+        if not value:
+            return _MISSING
+        return (min if direction > 0 else max)(value, key=_Key)
+    return value
+
+
+def _sort(docs, spec):
+    # Stable sorts applied from the last key to the first
+    for path, direction in reversed(spec):
+        if isinstance(direction, dict):
+            continue  # {'$meta': ...}
+        docs.sort(key=lambda d: _Key(_sort_value(d, path, direction)), reverse=direction < 0)
+    return docs
+
+
+# ---------------------------------------------------------------------------
+# Aggregation expressions
+
+def _truthy(value):
+    if value is None or value is _MISSING or value is False:
+        return False
+    if _is_number(value) and value == 0:
+        return False
+    return True
+
+
+def _expr_path(value, parts):
+    for i, part in enumerate(parts):
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list):
+            rest = parts[i:]
+            found = [_expr_path(item, rest) for item in value if isinstance(item, dict)]
+            return [v for v in found if v is not _MISSING]
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _number(value, op):
+    if value is None or value is _MISSING:
+        return None
+    if _is_number(value) or isinstance(value, _dt.datetime):
+        return value
+    raise OperationFailure(f"{op} only supports numeric types, not {_type_name(value)}", code=14)
+
+
+def _to_double(value):
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, _dt.datetime):
+        return float(value.replace(tzinfo=_dt.timezone.utc).timestamp() * 1000)
+    if isinstance(value, str):
+        return float(value.strip())
+    return float(value)
+
+
+def _to_int(value):
+    if isinstance(value, str):
+        return int(value.strip())
+    return int(_to_double(value))
+
+
+def _to_string(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, _dt.datetime):
+        return value.strftime('%Y-%m-%dT%H:%M:%S.') + f'{value.microsecond // 1000:03d}Z'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _to_object_id(value):
+    if isinstance(value, ObjectId):
+        return value
+    return ObjectId(value)
+
+
+_CONVERTERS = {
+    'double': _to_double, 'decimal': _to_double, 'int': _to_int, 'long': _to_int,
+    'string': _to_string, 'bool': _truthy, 'objectId': _to_object_id,
+    'date': lambda v: v if isinstance(v, _dt.datetime) else _dt.datetime.utcfromtimestamp(_to_double(v) / 1000),
+}
+
+
+def _convert(value, to):
+    if value is None or value is _MISSING:
+        return None
+    to = TYPE_ALIASES.get(to, to)
+    if to not in _CONVERTERS:
+        raise OperationFailure(f"Unsupported conversion to {to}", code=241)
+    try:
+        return _CONVERTERS[to](value)
+    except (TypeError, ValueError, ArithmeticError) as e:
+        raise OperationFailure(f"Failed to parse {value!r} as {to}: {e}", code=241)
+
+
+_DATE_FORMATS = {
+    '%Y': lambda d: f'{d.year:04d}', '%m': lambda d: f'{d.month:02d}', '%d': lambda d: f'{d.day:02d}',
+    '%H': lambda d: f'{d.hour:02d}', '%M': lambda d: f'{d.minute:02d}', '%S': lambda d: f'{d.second:02d}',
+    '%L': lambda d: f'{d.microsecond // 1000:03d}', '%j': lambda d: f'{d.timetuple().tm_yday:03d}',
+    '%u': lambda d: str(d.isoweekday()), '%%': lambda d: '%',
+}
+
+
+def _date_to_string(date, fmt):
+    return re.sub(r'%[YmdHMSLju%]', lambda m: _DATE_FORMATS[m.group(0)](date), fmt)
+
+
+def _args(spec, doc, variables):
+    if isinstance(spec, list):
+        return [_evaluate(a, doc, variables) for a in spec]
+    return [_evaluate(spec, doc, variables)]
+
+
+def _array(value, op):
+    if value is None or value is _MISSING:
+        return None
+    if not isinstance(value, list):
+        raise OperationFailure(f"{op} requires an array, not {_type_name(value)}", code=28664)
+    return value
+
+
+def _op_add(args):
+    total = 0
+    date = None
+    for a in args:
+        a = _number(a, '$add')
+        if a is None:
+            return None
+        if isinstance(a, _dt.datetime):
+            date = a
+        else:
+            total += a
+    return date + _dt.timedelta(milliseconds=total) if date else total
+
+
+def _op_subtract(a, b):
+    if a is None or b is None or a is _MISSING or b is _MISSING:
+        return None
+    if isinstance(a, _dt.datetime) and isinstance(b, _dt.datetime):
+        return int((a - b).total_seconds() * 1000)
+    if isinstance(a, _dt.datetime):
+        return a - _dt.timedelta(milliseconds=b)
+    return _number(a, '$subtract') - _number(b, '$subtract')
+
+
+def _op_multiply(args):
+    result = 1
+    for a in args:
+        a = _number(a, '$multiply')
+        if a is None:
+            return None
+        result *= a
+    return result
+
+
+def _op_divide(a, b):
+    if a is None or b is None or a is _MISSING or b is _MISSING:
+        return None
+    if b == 0:
+        raise OperationFailure("can't $divide by zero", code=2)
+    return _number(a, '$divide') / _number(b, '$divide')
+
+
+def _numbers_of(args):
+    """Operands of $sum/$avg/$min/$max as expressions: one array or a list"""
+    if len(args) == 1 and isinstance(args[0], list):
+        args = args[0]
+    return args
+
+
+def _op_min_max(args, pick):
+    values = [v for v in _numbers_of(args) if v is not None and v is not _MISSING]
+    if not values:
+        return None
+    return pick(values, key=_Key)
+
+
+def _op_sum(args):
+    return sum(v for v in _numbers_of(args) if _is_number(v))
+
+
+def _op_avg(args):
+    values = [v for v in _numbers_of(args) if _is_number(v)]
+    return sum(values) / len(values) if values else None
+
+
+def _op_round(args, func):
+    value = args[0]
+    if value is None or value is _MISSING:
+        return None
+    if not isinstance(value, float):
+        return value
+    if func is round:
+        return round(value, args[1] if len(args) > 1 else 0) * 1.0
+    return float(func(value))
+
+
+def _op_concat(args):
+    if any(a is None or a is _MISSING for a in args):
+        return None
+    for a in args:
+        if not isinstance(a, str):
+            raise OperationFailure(f"$concat only supports strings, not {_type_name(a)}", code=16702)
+    return ''.join(args)
+
+
+def _op_trim(spec, doc, variables, strip):
+    value = _evaluate(spec['input'], doc, variables)
+    if value is None or value is _MISSING:
+        return None
+    chars = _evaluate(spec['chars'], doc, variables) if 'chars' in spec else None
+    return getattr(value, strip)(chars)
+
+
+def _op_cond(spec, doc, variables):
+    if isinstance(spec, list):
+        test, then, otherwise = spec
+    else:
+        test, then, otherwise = spec['if'], spec['then'], spec['else']
+    branch = then if _truthy(_evaluate(test, doc, variables)) else otherwise
+    return _evaluate(branch, doc, variables)
+
+
+def _op_switch(spec, doc, variables):
+    for branch in spec['branches']:
+        if _truthy(_evaluate(branch['case'], doc, variables)):
+            return _evaluate(branch['then'], doc, variables)
+    if 'default' not in spec:
+        raise OperationFailure("$switch could not find a matching branch for an input, "
+                               "and no default was specified.", code=40066)
+    return _evaluate(spec['default'], doc, variables)
+
+
+def _op_map(spec, doc, variables):
+    items = _array(_evaluate(spec['input'], doc, variables), '$map')
+    if items is None:
+        return None
+    name = spec.get('as', 'this')
+    return [_evaluate(spec['in'], doc, dict(variables, **{name: item})) for item in items]
+
+
+def _op_filter(spec, doc, variables):
+    items = _array(_evaluate(spec['input'], doc, variables), '$filter')
+    if items is None:
+        return None
+    name = spec.get('as', 'this')
+    kept = [item for item in items
+            if _truthy(_evaluate(spec['cond'], doc, dict(variables, **{name: item})))]
+    if 'limit' in spec:
+        kept = kept[:_evaluate(spec['limit'], doc, variables)]
+    return kept
+
+
+def _op_reduce(spec, doc, variables):
+    items = _array(_evaluate(spec['input'], doc, variables), '$reduce')
+    if items is None:
+        return None
+    value = _evaluate(spec['initialValue'], doc, variables)
+    for item in items:
+        value = _evaluate(spec['in'], doc, dict(variables, value=value, this=item))
+    return value
+
+
+def _op_let(spec, doc, variables):
+    scope = dict(variables)
+    for name, expr in spec['vars'].items():
+        scope[name] = _evaluate(expr, doc, variables)
+    return _evaluate(spec['in'], doc, scope)
+
+
+def _op_set_union(args):
+    seen = OrderedDict()
+    for a in args:
+        if a is None or a is _MISSING:
+            return None
+        for item in _array(a, '$setUnion'):
+            seen.setdefault(_freeze(item), item)
+    return list(seen.values())
+
+
+def _op_array_elem_at(items, index):
+    items = _array(items, '$arrayElemAt')
+    if items is None or index is None:
+        return None
+    try:
+        return items[int(index)]
+    except IndexError:
+        return _MISSING
+
+
+def _op_array_to_object(items):
+    items = _array(items, '$arrayToObject')
+    if items is None:
+        return None
+    result = {}
+    for item in items:
+        if isinstance(item, dict):
+            result[item['k']] = item['v']
+        else:
+            result[item[0]] = item[1]
+    return result
+
+
+def _op_object_to_array(value):
+    if value is None or value is _MISSING:
+        return None
+    return [{'k': k, 'v': v} for k, v in value.items()]
+
+
+def _op_merge_objects(args):
+    result = {}
+    for a in _numbers_of(args):
+        if isinstance(a, dict):
+            result.update(a)
+    return result
+
+
+def _op_size(items):
+    items = _array(items, '$size')
+    if items is None:
+        raise OperationFailure("The argument to $size must be an array", code=17124)
+    return len(items)
+
+
+def _op_in(value, items):
+    items = _array(items, '$in')
+    if items is None:
+        raise OperationFailure("$in requires an array as a second argument", code=40081)
+    return any(_equal(value, item) for item in items)
+
+
+def _op_date_to_string(spec, doc, variables):
+    date = _evaluate(spec['date'], doc, variables)
+    if date is None or date is _MISSING:
+        return _evaluate(spec['onNull'], doc, variables) if 'onNull' in spec else None
+    if isinstance(date, ObjectId):
+        date = date.generation_time.replace(tzinfo=None)
+    fmt = spec.get('format', '%Y-%m-%dT%H:%M:%S.%LZ')
+    return _date_to_string(date, fmt)
+
+
+def _op_convert(spec, doc, variables):
+    value = _evaluate(spec['input'], doc, variables)
+    if value is None or value is _MISSING:
+        return _evaluate(spec['onNull'], doc, variables) if 'onNull' in spec else None
+    try:
+        return _convert(value, _evaluate(spec['to'], doc, variables))
+    except OperationFailure:
+        if 'onError' in spec:
+            return _evaluate(spec['onError'], doc, variables)
+        raise
+
+
+def _op_regex_match(spec, doc, variables):
+    value = _evaluate(spec['input'], doc, variables)
+    if not isinstance(value, str):
+        return False
+    pattern = _regex(_evaluate(spec['regex'], doc, variables), spec.get('options', ''))
+    return pattern.search(value) is not None
+
+
+def _op_ifnull(args):
+    for a in args[:-1]:
+        if a is not None and a is not _MISSING:
+            return a
+    return args[-1]
+
+
+# Operators taking their evaluated arguments as a list
+_SIMPLE_OPERATORS = {
+    '$eq': lambda a: _equal(a[0], a[1]),
+    '$ne': lambda a: not _equal(a[0], a[1]),
+    '$gt': lambda a: _compare(a[0], a[1]) > 0,
+    '$gte': lambda a: _compare(a[0], a[1]) >= 0,
+    '$lt': lambda a: _compare(a[0], a[1]) < 0,
+    '$lte': lambda a: _compare(a[0], a[1]) <= 0,
+    '$cmp': lambda a: _compare(a[0], a[1]),
+    '$not': lambda a: not _truthy(a[0]),
+    '$in': lambda a: _op_in(a[0], a[1]),
+    '$ifNull': _op_ifnull,
+    '$add': _op_add,
+    '$subtract': lambda a: _op_subtract(a[0], a[1]),
+    '$multiply': _op_multiply,
+    '$divide': lambda a: _op_divide(a[0], a[1]),
+    '$mod': lambda a: None if a[0] is None or a[1] is None else a[0] % a[1],
+    '$abs': lambda a: None if a[0] is None or a[0] is _MISSING else abs(a[0]),
+    '$floor': lambda a: _op_round(a, math.floor),
+    '$ceil': lambda a: _op_round(a, math.ceil),
+    '$round': lambda a: _op_round(a, round),
+    '$min': lambda a: _op_min_max(a, min),
+    '$max': lambda a: _op_min_max(a, max),
+    '$sum': _op_sum,
+    '$avg': _op_avg,
+    '$size': lambda a: _op_size(a[0]),
+    '$arrayElemAt': lambda a: _op_array_elem_at(a[0], a[1]),
+    '$first': lambda a: _op_array_elem_at(a[0], 0) if a[0] else None,
+    '$last': lambda a: _op_array_elem_at(a[0], -1) if a[0] else None,
+    '$concatArrays': lambda a: None if any(x is None or x is _MISSING for x in a)
+    else [i for x in a for i in _array(x, '$concatArrays')],
+    '$setUnion': _op_set_union,
+    '$anyElementTrue': lambda a: any(_truthy(x) for x in _array(_numbers_of(a), '$anyElementTrue')),
+    '$allElementsTrue': lambda a: all(_truthy(x) for x in _array(_numbers_of(a), '$allElementsTrue')),
+    '$isArray': lambda a: isinstance(a[0], list),
+    '$isNumber': lambda a: _is_number(a[0]),
+    '$arrayToObject': lambda a: _op_array_to_object(a[0]),
+    '$objectToArray': lambda a: _op_object_to_array(a[0]),
+    '$mergeObjects': _op_merge_objects,
+    '$concat': _op_concat,
+    '$toLower': lambda a: '' if a[0] is None or a[0] is _MISSING else str(a[0]).lower(),
+    '$toUpper': lambda a: '' if a[0] is None or a[0] is _MISSING else str(a[0]).upper(),
+    '$split': lambda a: None if a[0] is None or a[0] is _MISSING else a[0].split(a[1]),
+    '$strLenCP': lambda a: len(a[0]),
+    '$substrCP': lambda a: a[0][a[1]:a[1] + a[2]] if isinstance(a[0], str) else '',
+    '$type': lambda a: _type_name(a[0]),
+    '$toString': lambda a: _convert(a[0], 'string'),
+    '$toDouble': lambda a: _convert(a[0], 'double'),
+    '$toDecimal': lambda a: _convert(a[0], 'double'),
+    '$toInt': lambda a: _convert(a[0], 'int'),
+    '$toLong': lambda a: _convert(a[0], 'long'),
+    '$toBool': lambda a: _convert(a[0], 'bool'),
+    '$toObjectId': lambda a: _convert(a[0], 'objectId'),
+    '$toDate': lambda a: _convert(a[0], 'date'),
+}
+
+# Operators that need the unevaluated spec
+_SPECIAL_OPERATORS = {
+    '$cond': _op_cond,
+    '$switch': _op_switch,
+    '$map': _op_map,
+    '$filter': _op_filter,
+    '$reduce': _op_reduce,
+    '$let': _op_let,
+    '$dateToString': _op_date_to_string,
+    '$convert': _op_convert,
+    '$regexMatch': _op_regex_match,
+    '$trim': lambda s, d, v: _op_trim(s, d, v, 'strip'),
+    '$ltrim': lambda s, d, v: _op_trim(s, d, v, 'lstrip'),
+    '$rtrim': lambda s, d, v: _op_trim(s, d, v, 'rstrip'),
+    '$and': lambda s, d, v: all(_truthy(_evaluate(a, d, v)) for a in s),
+    '$or': lambda s, d, v: any(_truthy(_evaluate(a, d, v)) for a in s),
+    '$literal': lambda s, d, v: s,
+}
+
+
+def _evaluate(expr, doc, variables):
+    if isinstance(expr, str):
+        if expr.startswith('$$'):
+            name, _, path = expr[2:].partition('.')
+            if name == 'REMOVE':
+                return _MISSING
+            if name not in variables:
+                if name in ('ROOT', 'CURRENT'):
+                    value = doc
+                else:
+                    raise OperationFailure(f"Use of undefined variable: {name}", code=17276)
+            else:
+                value = variables[name]
+            return _expr_path(value, path.split('.')) if path else value
+        if expr.startswith('$'):
+            return _expr_path(variables.get('CURRENT', doc), expr[1:].split('.'))
+        return expr
+    if isinstance(expr, dict):
+        if len(expr) == 1:
+            op, spec = next(iter(expr.items()))
+            if op.startswith('$'):
+                if op in _SPECIAL_OPERATORS:
+                    return _SPECIAL_OPERATORS[op](spec, doc, variables)
+                if op in _SIMPLE_OPERATORS:
+                    return _SIMPLE_OPERATORS[op](_args(spec, doc, variables))
+                raise OperationFailure(f"Unrecognized expression '{op}'", code=168)
+        result = {}
+        for key, value in expr.items():
+            value = _evaluate(value, doc, variables)
+            if value is not _MISSING:
+                result[key] = value
+        return result
+    if isinstance(expr, list):
+        return [_evaluate(e, doc, variables) for e in expr]
+    return expr
+
+
+# ---------------------------------------------------------------------------
+# Aggregation stages
+
+class _Accumulator:
+    def __init__(self, op, spec):
+        self.op = op
+        self.spec = spec
+        self.values = []
+
+    def add(self, doc, variables):
+        if self.op in ('$topN', '$bottomN', '$top', '$bottom'):
+            self.values.append((doc, _evaluate(self.spec['output'], doc, variables)))
+        elif self.op == '$count':
+            self.values.append(1)
+        else:
+            self.values.append(_evaluate(self.spec, doc, variables))
+
+    def result(self, variables):
+        op, values = self.op, self.values
+        present = [v for v in values if v is not _MISSING]
+        if op == '$sum' or op == '$count':
+            return sum(v for v in present if _is_number(v))
+        if op == '$avg':
+            return _op_avg(present)
+        if op == '$min':
+            return _op_min_max([v for v in present if v is not None], min)
+        if op == '$max':
+            return _op_min_max([v for v in present if v is not None], max)
+        if op == '$first':
+            return None if not values or values[0] is _MISSING else values[0]
+        if op == '$last':
+            return None if not values or values[-1] is _MISSING else values[-1]
+        if op == '$push':
+            return present
+        if op == '$addToSet':
+            return list(OrderedDict((_freeze(v), v) for v in present).values())
+        if op == '$mergeObjects':
+            return _op_merge_objects(present)
+        if op in ('$topN', '$bottomN', '$top', '$bottom'):
+            spec = _sort_spec(self.spec['sortBy'])
+            if op.startswith('$bottom'):
+                spec = [(k, -d) for k, d in spec]
+            ordered = _sort([dict(d, __out=o) for d, o in values], spec)
+            if op in ('$top', '$bottom'):
+                return ordered[0]['__out'] if ordered else None
+            n = _evaluate(self.spec['n'], {}, variables)
+            return [d['__out'] for d in ordered[:n]]
+        raise OperationFailure(f"unknown group operator '{op}'", code=15952)
+
+
+def _stage_group(docs, spec, variables):
+    groups = OrderedDict()
+    id_expr = spec['_id']
+    fields = {k: v for k, v in spec.items() if k != '_id'}
+    for doc in docs:
+        scope = dict(variables, ROOT=doc, CURRENT=doc)
+        key = _evaluate(id_expr, doc, scope)
+        if key is _MISSING:
+            key = None
+        frozen = _freeze(key)
+        if frozen not in groups:
+            groups[frozen] = (key, {name: _Accumulator(*next(iter(acc.items())))
+                                    for name, acc in fields.items()})
+        for acc in groups[frozen][1].values():
+            acc.add(doc, scope)
+    results = []
+    for key, accumulators in groups.values():
+        out = {'_id': key}
+        for name, acc in accumulators.items():
+            out[name] = acc.result(variables)
+        results.append(out)
+    return results
+
+
+def _is_inclusion(value):
+    return value is True or (_is_number(value) and value != 0)
+
+
+def _is_exclusion(value):
+    return value is False or (_is_number(value) and value == 0)
+
+
+def _stage_project(docs, spec, variables):
+    exclusions = [k for k, v in spec.items() if _is_exclusion(v)]
+    computed = {k: v for k, v in spec.items() if k not in exclusions and not _is_inclusion(v)}
+    included = [k for k, v in spec.items() if _is_inclusion(v)]
+    if exclusions and not included and not computed:
+        return [_project(doc, {k: 0 for k in exclusions}) for doc in docs]
+    results = []
+    for doc in docs:
+        scope = dict(variables, ROOT=doc, CURRENT=doc)
+        out = _project(doc, dict({k: 1 for k in included}, _id=0 if '_id' in exclusions else 1))
+        for path, expr in computed.items():
+            value = _evaluate(expr, doc, scope)
+            if value is not _MISSING:
+                _set_path(out, path, value)
+        results.append(out)
+    return results
+
+
+def _stage_add_fields(docs, spec, variables):
+    results = []
+    for doc in docs:
+        scope = dict(variables, ROOT=doc, CURRENT=doc)
+        out = _copy(doc)
+        for path, expr in spec.items():
+            value = _evaluate(expr, doc, scope)
+            if value is _MISSING:
+                _unset_path(out, path)
+            else:
+                _set_path(out, path, value)
+        results.append(out)
+    return results
+
+
+def _stage_unwind(docs, spec):
+    if isinstance(spec, str):
+        spec = {'path': spec}
+    path = spec['path'].lstrip('$')
+    keep_empty = spec.get('preserveNullAndEmptyArrays', False)
+    index_field = spec.get('includeArrayIndex')
+    results = []
+    for doc in docs:
+        value = _get(doc, path)
+        if isinstance(value, list) and value:
+            for i, item in enumerate(value):
+                out = dict(doc)
+                out = _copy(out) if '.' in path else out
+                _set_path(out, path, item)
+                if index_field:
+                    out[index_field] = i
+                results.append(out)
+        elif isinstance(value, list) or value is None or value is _MISSING:
+            if keep_empty:
+                out = dict(doc)
+                if isinstance(value, list):
+                    _unset_path(out, path)
+                if index_field:
+                    out[index_field] = None
+                results.append(out)
+        else:
+            out = dict(doc)
+            if index_field:
+                out[index_field] = None
+            results.append(out)
+    return results
+
+
+def _stage_lookup(db, docs, spec, variables):
+    foreign = db[spec['from']]._snapshot()
+    results = []
+    for doc in docs:
+        if 'pipeline' in spec:
+            scope = dict(variables, ROOT=doc, CURRENT=doc)
+            lets = {name: _evaluate(expr, doc, scope) for name, expr in spec.get('let', {}).items()}
+            candidates = foreign
+            if 'localField' in spec:
+                candidates = _lookup_matches(foreign, doc, spec)
+            matched = _run_pipeline(db, [_copy(d) for d in candidates], spec['pipeline'],
+                                    dict(variables, **lets))
+        else:
+            matched = [_copy(d) for d in _lookup_matches(foreign, doc, spec)]
+        out = dict(doc)
+        _set_path(out, spec['as'], matched)
+        results.append(out)
+    return results
+
+
+def _lookup_matches(foreign, doc, spec):
+    local = _get(doc, spec['localField'])
+    local = local if isinstance(local, list) else [None if local is _MISSING else local]
+    return [f for f in foreign
+            if any(_value_matches(v, l) for v in _candidates(f, spec['foreignField'].split('.'))
+                   for l in local)]
+
+
+def _stage_merge(db, docs, spec):
+    if isinstance(spec, str):
+        spec = {'into': spec}
+    into = spec['into']
+    target = db[into if isinstance(into, str) else into['coll']]
+    on = spec.get('on', '_id')
+    on = [on] if isinstance(on, str) else list(on)
+    when_matched = spec.get('whenMatched', 'merge')
+    when_not_matched = spec.get('whenNotMatched', 'insert')
+    with target._lock:
+        for doc in docs:
+            doc = _copy(doc)
+            query = {field: _get(doc, field) for field in on}
+            existing = next(iter(target._filter(query)), None)
+            if existing is None:
+                if when_not_matched == 'insert':
+                    target._insert(doc)
+                elif when_not_matched == 'fail':
+                    raise OperationFailure("$merge could not find a matching document", code=13113)
+                continue
+            if when_matched == 'replace':
+                doc['_id'] = existing['_id']
+                target._replace(existing, doc)
+            elif when_matched == 'merge':
+                merged = dict(existing)
+                merged.update({k: v for k, v in doc.items() if k != '_id'})
+                target._replace(existing, merged)
+            elif when_matched == 'fail':
+                raise DuplicateKeyError("$merge found a matching document", 11000)
+            elif isinstance(when_matched, list):
+                updated = _run_pipeline(db, [existing], when_matched, {'new': doc})[0]
+                target._replace(existing, updated)
+    return []
+
+
+def _stage_out(db, docs, spec):
+    target = db[spec if isinstance(spec, str) else spec['coll']]
+    with target._lock:
+        target._reset()
+        for doc in docs:
+            target._insert(_copy(doc))
+    return []
+
+
+def _run_pipeline(db, docs, pipeline, variables=None):
+    variables = variables or {}
+    for stage in pipeline:
+        name, spec = next(iter(stage.items()))
+        if name == '$match':
+            docs = [d for d in docs if _match(d, spec, variables)]
+        elif name == '$project':
+            docs = _stage_project(docs, spec, variables)
+        elif name in ('$addFields', '$set'):
+            docs = _stage_add_fields(docs, spec, variables)
+        elif name == '$unset':
+            fields = [spec] if isinstance(spec, str) else spec
+            docs = [_project(d, {f: 0 for f in fields}) for d in docs]
+        elif name == '$group':
+            docs = _stage_group(docs, spec, variables)
+        elif name == '$sort':
+            docs = _sort(list(docs), _sort_spec(spec))
+        elif name == '$limit':
+            docs = docs[:spec]
+        elif name == '$skip':
+            docs = docs[spec:]
+        elif name == '$unwind':
+            docs = _stage_unwind(docs, spec)
+        elif name == '$count':
+            docs = [{spec: len(docs)}] if docs else []
+        elif name == '$facet':
+            docs = [{key: _run_pipeline(db, [_copy(d) for d in docs], sub, variables)
+                     for key, sub in spec.items()}]
+        elif name == '$lookup':
+            docs = _stage_lookup(db, docs, spec, variables)
+        elif name in ('$replaceRoot', '$replaceWith'):
+            expr = spec['newRoot'] if name == '$replaceRoot' else spec
+            docs = [_evaluate(expr, d, dict(variables, ROOT=d, CURRENT=d)) for d in docs]
+        elif name == '$sortByCount':
+            docs = _sort(_stage_group(docs, {'_id': spec, 'count': {'$sum': 1}}, variables),
+                         [('count', -1)])
+        elif name == '$merge':
+            docs = _stage_merge(db, docs, spec)
+        elif name == '$out':
+            docs = _stage_out(db, docs, spec)
+        else:
+            raise OperationFailure(f"Unrecognized pipeline stage name: '{name}'", code=40324)
+    return docs
+
+
+# ---------------------------------------------------------------------------
+# Updates
+
+def _apply_update(doc, update, inserting=False):
+    """Apply an update document or pipeline to doc in place"""
+    if isinstance(update, list):
+        updated = _run_pipeline(None, [doc], update)[0]
+        doc.clear()
+        doc.update(updated)
+        return
+    for op, fields in update.items():
+        if op == '$setOnInsert' and not inserting:
+            continue
+        for path, value in fields.items():
+            current = _get(doc, path)
+            if op in ('$set', '$setOnInsert'):
+                _set_path(doc, path, _copy(value))
+            elif op == '$unset':
+                _unset_path(doc, path)
+            elif op == '$inc':
+                if current is _MISSING or current is None:
+                    current = 0
+                if not _is_number(current):
+                    raise OperationFailure(f"Cannot apply $inc to a value of non-numeric type {_type_name(current)}",
+                                           code=14)
+                _set_path(doc, path, current + value)
+            elif op == '$mul':
+                _set_path(doc, path, (0 if current is _MISSING else current) * value)
+            elif op in ('$min', '$max'):
+                better = _compare(value, current) < 0 if op == '$min' else _compare(value, current) > 0
+                if current is _MISSING or better:
+                    _set_path(doc, path, _copy(value))
+            elif op in ('$push', '$addToSet'):
+                items = current if isinstance(current, list) else []
+                if current is not _MISSING and current is not None and not isinstance(current, list):
+                    raise OperationFailure(f"The field '{path}' must be an array", code=2)
+                new = value['$each'] if isinstance(value, dict) and '$each' in value else [value]
+                for item in new:
+                    if op == '$push' or not any(_equal(item, i) for i in items):
+                        items.append(_copy(item))
+                if isinstance(value, dict) and '$slice' in value:
+                    n = value['$slice']
+                    items = items[n:] if n < 0 else items[:n]
+                _set_path(doc, path, items)
+            elif op == '$pull':
+                if isinstance(current, list):
+                    if isinstance(value, dict) and not _is_operator_doc(value):
+                        kept = [i for i in current if not (isinstance(i, dict) and _match(i, value))]
+                    else:
+                        kept = [i for i in current if not _field_matches([i], value, None)]
+                    _set_path(doc, path, kept)
+            elif op == '$pullAll':
+                if isinstance(current, list):
+                    _set_path(doc, path, [i for i in current if not any(_equal(i, v) for v in value)])
+            elif op == '$pop':
+                if isinstance(current, list) and current:
+                    _set_path(doc, path, current[1:] if value < 0 else current[:-1])
+            elif op == '$rename':
+                if current is not _MISSING:
+                    _unset_path(doc, path)
+                    _set_path(doc, value, current)
+            elif op == '$currentDate':
+                _set_path(doc, path, _dt.datetime.utcnow())
+            else:
+                raise OperationFailure(f"Unknown modifier: {op}", code=9)
+
+
+def _is_update_doc(update):
+    return isinstance(update, list) or (isinstance(update, dict) and update
+                                        and all(k.startswith('$') for k in update))
+
+
+def _upsert_seed(query):
+    """Fields an upsert copies from the equality parts of its filter"""
+    doc = {}
+    for key, value in query.items():
+        if key == '$and':
+            for part in value:
+                for k, v in _upsert_seed(part).items():
+                    _set_path(doc, k, v)
+        elif key.startswith('$'):
+            continue
+        elif _is_operator_doc(value):
+            if '$eq' in value:
+                _set_path(doc, key, _copy(value['$eq']))
+        else:
+            _set_path(doc, key, _copy(value))
+    return doc
+
+
+# ---------------------------------------------------------------------------
+# Collections
+
+def _lookup_keys(doc, field):
+    keys = set()
+    for value in _candidates(doc, field.split('.')):
+        for item in value if isinstance(value, list) else [value]:
+            if item is not _MISSING and item is not None and not isinstance(item, (dict, list)):
+                keys.add(_freeze(item))
+    return keys
+
+
+class MemoryCursor:
+    """The pymongo Cursor methods the models chain; evaluated on first read"""
+
+    def __init__(self, collection, query=None, projection=None, sort=None, skip=0, limit=0, docs=None):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort = _sort_spec(sort) if sort else None
+        self._skip = skip
+        self._limit = limit
+        self._docs = docs
+        self._iter = None
+
+    def _check(self):
+        if self._iter is not None:
+            raise OperationFailure("cannot set options after executing query")
+
+    def sort(self, key_or_list, direction=None):
+        self._check()
+        self._sort = _sort_spec(key_or_list, direction)
+        return self
+
+    def skip(self, n):
+        self._check()
+        self._skip = n
+        return self
+
+    def limit(self, n):
+        self._check()
+        self._limit = abs(n)
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def max_time_ms(self, ms):
+        return self
+
+    def hint(self, index):
+        return self
+
+    def allow_disk_use(self, allow):
+        return self
+
+    def collation(self, collation):
+        return self
+
+    def comment(self, comment):
+        return self
+
+    def _results(self):
+        if self._docs is not None:
+            return self._docs
+        docs = self._collection._filter(self._query)
+        if self._sort:
+            docs = _sort(docs, self._sort)
+        if self._skip:
+            docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        return [_copy(_project(d, self._projection)) for d in docs]
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._iter is None:
+            self._iter = iter(self._results())
+        return next(self._iter)
+
+    next = __next__
+
+    def to_list(self, length=None):
+        items = list(self)
+        return items[:length] if length else items
+
+    def clone(self):
+        return MemoryCursor(self._collection, self._query, self._projection, self._sort,
+                            self._skip, self._limit, self._docs)
+
+    def close(self):
+        self._iter = iter(())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _Index:
+    def __init__(self, keys, name, unique=False, sparse=False, partial=None, **options):
+        self.keys = keys
+        self.name = name
+        self.unique = unique
+        self.sparse = sparse
+        self.partial = partial
+        self.options = options
+        # Unique indexes only: key -> frozen _id of the document holding it
+        self.entries = {}
+
+    def key_of(self, doc):
+        """The doc's key, or None when the index does not cover the doc"""
+        if self.partial and not _match(doc, self.partial):
+            return None
+        values = [_get(doc, field) for field, _ in self.keys]
+        if self.sparse and all(v is _MISSING for v in values):
+            return None
+        return tuple(_freeze(None if v is _MISSING else v) for v in values)
+
+
+class MemoryCollection:
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self.full_name = f"{database.name}.{name}"
+        self._lock = database._lock
+        self._docs = OrderedDict()
+        self._indexes = {'_id_': _Index([('_id', 1)], '_id_', unique=True)}
+        # Leading field of each index -> {value: {_id: doc}} for equality lookups
+        self._lookups = {}
+        # Insertion order, so lookups return documents in natural order
+        self._seq = {}
+        self._counter = itertools.count()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self.database[f"{self.name}.{name}"]
+
+    def __getitem__(self, name):
+        return self.database[f"{self.name}.{name}"]
+
+    def __repr__(self):
+        return f"MemoryCollection({self.full_name!r})"
+
+    # -- internals -------------------------------------------------------
+
+    def _reset(self):
+        self._docs.clear()
+        self._seq.clear()
+        for index in self._indexes.values():
+            index.entries.clear()
+        for lookup in self._lookups.values():
+            lookup.clear()
+
+    def _snapshot(self):
+        return list(self._docs.values())
+
+    def _plan(self, query):
+        """Candidates from the narrowest equality lookup the query allows, or None to scan"""
+        best = None
+        for field, condition in query.items():
+            lookup = self._lookups.get(field)
+            if lookup is None:
+                continue
+            if _is_operator_doc(condition):
+                if list(condition) == ['$eq']:
+                    values = [condition['$eq']]
+                elif list(condition) == ['$in']:
+                    values = condition['$in']
+                else:
+                    continue
+            else:
+                values = [condition]
+            if any(v is None or isinstance(v, (dict, list, re.Pattern)) for v in values):
+                continue
+            found = {}
+            for value in values:
+                found.update(lookup.get(_freeze(value), {}))
+            if best is None or len(found) < len(best):
+                best = found
+        if best is None:
+            return None
+        return sorted(best.values(), key=lambda d: self._seq[_freeze(d['_id'])])
+
+    def _filter(self, query):
+        with self._lock:
+            by_id = query.get('_id', _MISSING) if len(query) == 1 else _MISSING
+            if by_id is not _MISSING and not isinstance(by_id, (dict, re.Pattern)):
+                doc = self._docs.get(_freeze(by_id))
+                return [doc] if doc is not None else []
+            if isinstance(by_id, dict) and list(by_id) == ['$in']:
+                found = (self._docs.get(_freeze(i)) for i in by_id['$in'] if not isinstance(i, re.Pattern))
+                # Natural order, like a collection scan
+                found = {id(d): d for d in found if d is not None}
+                return [d for d in self._docs.values() if id(d) in found]
+            candidates = self._plan(query)
+            if candidates is None:
+                candidates = self._docs.values()
+            return [d for d in candidates if _match(d, query)]
+
+    def _unique_indexes(self):
+        return [index for index in self._indexes.values() if index.unique]
+
+    def _check_unique(self, doc):
+        doc_id = _freeze(doc['_id'])
+        for index in self._unique_indexes():
+            key = index.key_of(doc)
+            if key is not None and index.entries.get(key, doc_id) != doc_id:
+                values = {field: _get(doc, field) for field, _ in index.keys}
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: {self.full_name} index: {index.name} "
+                    f"dup key: {values}",
+                    11000,
+                    {'code': 11000, 'keyPattern': dict(index.keys), 'keyValue': values,
+                     'errmsg': f"E11000 duplicate key error index: {index.name}"}
+                )
+
+    def _index_add(self, doc):
+        doc_id = _freeze(doc['_id'])
+        for index in self._unique_indexes():
+            key = index.key_of(doc)
+            if key is not None:
+                index.entries[key] = doc_id
+        for field, lookup in self._lookups.items():
+            for key in _lookup_keys(doc, field):
+                lookup.setdefault(key, {})[doc_id] = doc
+
+    def _index_remove(self, doc):
+        doc_id = _freeze(doc['_id'])
+        for index in self._unique_indexes():
+            key = index.key_of(doc)
+            if key is not None:
+                index.entries.pop(key, None)
+        for field, lookup in self._lookups.items():
+            for key in _lookup_keys(doc, field):
+                bucket = lookup.get(key)
+                if bucket is not None:
+                    bucket.pop(doc_id, None)
+                    if not bucket:
+                        del lookup[key]
+
+    def _insert(self, doc):
+        if '_id' not in doc:
+            doc['_id'] = ObjectId()
+        key = _freeze(doc['_id'])
+        if key in self._docs:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.full_name} index: _id_ "
+                                    f"dup key: {{ _id: {doc['_id']!r} }}", 11000)
+        self._check_unique(doc)
+        stored = _copy(doc)
+        self._docs[key] = stored
+        self._seq[key] = next(self._counter)
+        self._index_add(stored)
+        return doc['_id']
+
+    def _replace(self, existing, new):
+        key = _freeze(existing['_id'])
+        if '_id' in new and not _equal(new['_id'], existing['_id']):
+            raise OperationFailure("Performing an update on the path '_id' would modify the immutable field '_id'",
+                                   code=66)
+        new = dict(new)
+        # Keep the _id first and the natural order stable
+        new = {'_id': existing['_id'], **{k: v for k, v in new.items() if k != '_id'}}
+        self._index_remove(existing)
+        try:
+            self._check_unique(new)
+        except DuplicateKeyError:
+            self._index_add(existing)
+            raise
+        self._docs[key] = new
+        self._index_add(new)
+
+    def _remove(self, doc):
+        key = _freeze(doc['_id'])
+        del self._docs[key]
+        del self._seq[key]
+        self._index_remove(doc)
+
+    def _update_docs(self, query, update, many, upsert, sort=None, replace=False):
+        """Returns (matched, modified, upserted_id, before, after) for the first document"""
+        with self._lock:
+            matches = self._filter(query)
+            if sort:
+                matches = _sort(matches, _sort_spec(sort))
+            if not many:
+                matches = matches[:1]
+            if not matches:
+                if not upsert:
+                    return 0, 0, None, None, None
+                doc = {} if replace else _upsert_seed(query)
+                if replace:
+                    doc.update(_copy(update))
+                    if '_id' not in doc and '_id' in query and not isinstance(query['_id'], dict):
+                        doc['_id'] = query['_id']
+                else:
+                    _apply_update(doc, update, inserting=True)
+                self._insert(doc)
+                return 0, 0, doc['_id'], None, self._docs[_freeze(doc['_id'])]
+            modified = 0
+            first_before = first_after = None
+            for existing in matches:
+                if replace:
+                    new = _copy(update)
+                else:
+                    new = _copy(existing)
+                    _apply_update(new, update)
+                changed = not _equal(new, existing)
+                self._replace(existing, new)
+                if changed:
+                    modified += 1
+                if first_before is None:
+                    first_before = existing
+                    first_after = self._docs[_freeze(existing['_id'])]
+            return len(matches), modified, None, first_before, first_after
+
+    # -- pymongo API -----------------------------------------------------
+
+    def find(self, filter=None, projection=None, skip=0, limit=0, sort=None, **kwargs):
+        return MemoryCursor(self, filter, projection, sort, skip, limit)
+
+    def find_one(self, filter=None, projection=None, *args, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {'_id': filter}
+        for doc in self.find(filter, projection, *args, **kwargs).limit(1):
+            return doc
+        return None
+
+    def count_documents(self, filter, skip=0, limit=0, **kwargs):
+        count = len(self._filter(filter)) - skip
+        if limit:
+            count = min(count, limit)
+        return max(0, count)
+
+    def estimated_document_count(self, **kwargs):
+        return len(self._docs)
+
+    def distinct(self, key, filter=None, **kwargs):
+        seen = OrderedDict()
+        for doc in self._filter(filter or {}):
+            for value in _candidates(doc, key.split('.')):
+                for item in value if isinstance(value, list) else [value]:
+                    if item is not _MISSING:
+                        seen.setdefault(_freeze(item), item)
+        return [_copy(v) for v in seen.values()]
+
+    def insert_one(self, document, **kwargs):
+        with self._lock:
+            return InsertOneResult(self._insert(document), True)
+
+    def insert_many(self, documents, ordered=True, **kwargs):
+        inserted = []
+        errors = []
+        with self._lock:
+            for index, doc in enumerate(documents):
+                try:
+                    inserted.append(self._insert(doc))
+                except DuplicateKeyError as e:
+                    errors.append({'index': index, 'code': 11000, 'errmsg': str(e), 'op': doc})
+                    if ordered:
+                        break
+        if errors:
+            raise BulkWriteError({
+                'writeErrors': errors, 'writeConcernErrors': [], 'nInserted': len(inserted),
+                'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': [],
+            })
+        return InsertManyResult(inserted, True)
+
+    def _update_result(self, matched, modified, upserted_id):
+        raw = {'n': matched + (1 if upserted_id is not None else 0), 'nModified': modified,
+               'updatedExisting': matched > 0, 'ok': 1.0}
+        if upserted_id is not None:
+            raw['upserted'] = upserted_id
+        return UpdateResult(raw, True)
+
+    def update_one(self, filter, update, upsert=False, sort=None, **kwargs):
+        if not _is_update_doc(update):
+            raise ValueError("update only works with $ operators")
+        return self._update_result(*self._update_docs(filter, update, False, upsert, sort)[:3])
+
+    def update_many(self, filter, update, upsert=False, **kwargs):
+        if not _is_update_doc(update):
+            raise ValueError("update only works with $ operators")
+        return self._update_result(*self._update_docs(filter, update, True, upsert)[:3])
+
+    def replace_one(self, filter, replacement, upsert=False, **kwargs):
+        if _is_update_doc(replacement):
+            raise ValueError("replacement can not include $ operators")
+        return self._update_result(*self._update_docs(filter, replacement, False, upsert, replace=True)[:3])
+
+    def delete_one(self, filter, **kwargs):
+        return self._delete(filter, many=False)
+
+    def delete_many(self, filter, **kwargs):
+        return self._delete(filter, many=True)
+
+    def _delete(self, filter, many):
+        with self._lock:
+            matches = self._filter(filter)
+            if not many:
+                matches = matches[:1]
+            for doc in matches:
+                self._remove(doc)
+        return DeleteResult({'n': len(matches), 'ok': 1.0}, True)
+
+    def _find_and_modify(self, filter, update, projection, sort, upsert, return_document, replace):
+        _, _, _, before, after = self._update_docs(filter, update, False, upsert, sort, replace=replace)
+        doc = after if return_document == ReturnDocument.AFTER else before
+        return None if doc is None else _copy(_project(doc, projection))
+
+    def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                            return_document=ReturnDocument.BEFORE, **kwargs):
+        return self._find_and_modify(filter, update, projection, sort, upsert, return_document, False)
+
+    def find_one_and_replace(self, filter, replacement, projection=None, sort=None, upsert=False,
+                             return_document=ReturnDocument.BEFORE, **kwargs):
+        return self._find_and_modify(filter, replacement, projection, sort, upsert, return_document, True)
+
+    def find_one_and_delete(self, filter, projection=None, sort=None, **kwargs):
+        with self._lock:
+            matches = self._filter(filter)
+            if sort:
+                matches = _sort(matches, _sort_spec(sort))
+            if not matches:
+                return None
+            doc = matches[0]
+            self._remove(doc)
+        return _copy(_project(doc, projection))
+
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        counts = {'nInserted': 0, 'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0}
+        upserted = []
+        errors = []
+        with self._lock:
+            for index, op in enumerate(requests):
+                try:
+                    if isinstance(op, InsertOne):
+                        self._insert(op._doc)
+                        counts['nInserted'] += 1
+                    elif isinstance(op, (UpdateOne, UpdateMany, ReplaceOne)):
+                        replace = isinstance(op, ReplaceOne)
+                        matched, modified, upserted_id, _, _ = self._update_docs(
+                            op._filter, op._doc, isinstance(op, UpdateMany), op._upsert,
+                            getattr(op, '_sort', None), replace=replace)
+                        counts['nMatched'] += matched
+                        counts['nModified'] += modified
+                        if upserted_id is not None:
+                            counts['nUpserted'] += 1
+                            upserted.append({'index': index, '_id': upserted_id})
+                    elif isinstance(op, (DeleteOne, DeleteMany)):
+                        counts['nRemoved'] += self._delete(op._filter, isinstance(op, DeleteMany)).deleted_count
+                    else:
+                        raise TypeError(f"{op!r} is not a valid request")
+                except DuplicateKeyError as e:
+                    errors.append({'index': index, 'code': 11000, 'errmsg': str(e)})
+                    if ordered:
+                        break
+        result = dict(counts, upserted=upserted, writeErrors=errors, writeConcernErrors=[])
+        if errors:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    def aggregate(self, pipeline, **kwargs):
+        with self._lock:
+            docs = [_copy(d) for d in self._docs.values()]
+            return MemoryCursor(self, docs=_run_pipeline(self.database, docs, pipeline))
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure("Change streams are not supported by the in-memory engine", code=40573)
+
+    def create_index(self, keys, **options):
+        keys = _sort_spec(keys, 1)
+        name = options.pop('name', None) or '_'.join(f"{k}_{d}" for k, d in keys)
+        partial = options.pop('partialFilterExpression', None)
+        index = _Index(keys, name, partial=partial, **options)
+        with self._lock:
+            if name in self._indexes:
+                return name
+            if index.unique:
+                for doc in self._docs.values():
+                    key = index.key_of(doc)
+                    if key is None:
+                        continue
+                    if key in index.entries:
+                        raise DuplicateKeyError(f"E11000 duplicate key error index: {name}", 11000)
+                    index.entries[key] = _freeze(doc['_id'])
+            self._indexes[name] = index
+            field = keys[0][0]
+            if field != '_id' and field not in self._lookups:
+                lookup = self._lookups[field] = {}
+                for doc in self._docs.values():
+                    for key in _lookup_keys(doc, field):
+                        lookup.setdefault(key, {})[_freeze(doc['_id'])] = doc
+        return name
+
+    def create_indexes(self, indexes, **kwargs):
+        return [self.create_index(i.document['key'].items(), **{k: v for k, v in i.document.items()
+                                                                   if k != 'key'})
+                for i in indexes]
+
+    def index_information(self):
+        return {name: dict({'key': list(i.keys)}, **({'unique': True} if i.unique else {}))
+                for name, i in self._indexes.items()}
+
+    def drop_index(self, name):
+        self._indexes.pop(name if isinstance(name, str) else '_'.join(f"{k}_{d}" for k, d in name), None)
+
+    def drop_indexes(self):
+        self._indexes = {'_id_': self._indexes['_id_']}
+
+    def drop(self, **kwargs):
+        self.database.drop_collection(self.name)
+
+
+class MemoryDatabase:
+    def __init__(self, name='linkfluence'):
+        self.name = name
+        self._lock = threading.RLock()
+        self._collections = {}
+
+    def __getitem__(self, name):
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = MemoryCollection(self, name)
+            return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def __repr__(self):
+        return f"MemoryDatabase({self.name!r})"
+
+    def get_collection(self, name, **kwargs):
+        return self[name]
+
+    def list_collection_names(self, **kwargs):
+        return [name for name, c in self._collections.items() if c._docs]
+
+    def drop_collection(self, name, **kwargs):
+        name = name if isinstance(name, str) else name.name
+        with self._lock:
+            self._collections.pop(name, None)
+
+    def command(self, command, *args, **kwargs):
+        name = command if isinstance(command, str) else next(iter(command))
+        if name in ('ping', 'isMaster', 'hello'):
+            return {'ok': 1.0}
+        raise OperationFailure(f"no such command: '{name}'", code=59)
+
+    def reset(self):
+        """Drop every collection"""
+        with self._lock:
+            self._collections.clear()
+
+
+def connect(uri=None):
+    """A new empty database named after the URI path (memory://host/<name>)"""
+    name = 'linkfluence'
+    if uri and '/' in uri.split('://', 1)[-1]:
+        name = uri.split('://', 1)[-1].split('/', 1)[1].split('?')[0] or name
+    return MemoryDatabase(name)
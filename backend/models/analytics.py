@@ -21,3 +21,11 @@ class Analytics:
     def get_history(user_id):
         db = get_db()
         return list(db.analytics.find({"user_id": user_id}).sort("timestamp", 1))
+
+    @staticmethod
+    def iter_history(user_id, projection=None, batch_size=1000):
+        """Cursor over a creator's history, oldest first, for exports"""
+        db = get_db()
+        return (db.analytics.find({"user_id": user_id}, projection)
+                .sort("timestamp", 1)
+                .batch_size(batch_size))
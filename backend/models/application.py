@@ -1,8 +1,36 @@
 from database import get_db
 from bson.objectid import ObjectId
 from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from models import loader
+from models.rollup import Rollup
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Listeners are called as fn(application) after a creator applies
+_change_listeners = []
+
+
+def _normalize_id(app_id):
+    """Canonical string form of an ObjectId, or None if it is not one"""
+    return str(ObjectId(app_id)) if ObjectId.is_valid(app_id) else None
+
+
+def _notify_change(application):
+    for listener in _change_listeners:
+        try:
+            listener(application)
+        except Exception:
+            logger.exception("Application change listener failed")
+
 
 class Application:
+    @staticmethod
+    def add_change_listener(listener):
+        _change_listeners.append(listener)
+    
     @staticmethod
     def create(data):
         """Create a new application"""
@@ -12,15 +40,13 @@ class Application:
         data['created_at'] = datetime.utcnow()
         data['status'] = 'pending'  # pending, accepted, rejected
         
-        # Check if already applied
-        existing = db.applications.find_one({
-            'campaign_id': data['campaign_id'],
-            'creator_id': data['creator_id']
-        })
-        if existing:
+        # The unique (campaign_id, creator_id) index rejects repeat applications
+        try:
+            result = db.applications.insert_one(data)
+        except DuplicateKeyError:
             return None  # Already applied
-        
-        result = db.applications.insert_one(data)
+        Rollup.record_created(data)
+        _notify_change(data)
         return str(result.inserted_id)
     
     @staticmethod
@@ -38,6 +64,14 @@ class Application:
         
         return apps
     
+    @staticmethod
+    def iter_by_campaign(campaign_id, projection=None, batch_size=1000):
+        """Cursor over a campaign's applications, newest first, for exports"""
+        db = get_db()
+        return (db.applications.find({'campaign_id': campaign_id}, projection)
+                .sort('created_at', -1)
+                .batch_size(batch_size))
+    
     @staticmethod
     def find_by_creator(creator_id):
         """Get all applications by a creator"""
@@ -60,22 +94,117 @@ class Application:
         if not ObjectId.is_valid(app_id):
             return False
         
-        result = db.applications.update_one(
+        # The previous status moves the rollup counts; the updated document
+        # is primed so a following find_by_id costs nothing
+        now = datetime.utcnow()
+        app = db.applications.find_one_and_update(
             {'_id': ObjectId(app_id)},
-            {'$set': {'status': status, 'updated_at': datetime.utcnow()}}
+            {'$set': {'status': status, 'updated_at': now}},
+            return_document=ReturnDocument.BEFORE
         )
+        if app is None:
+            return False
+        previous = app.get('status', 'pending')
+        app.update({'status': status, 'updated_at': now})
+        loader.prime('applications', app)
+        Rollup.record_status_changes([(app, previous, status)])
         
-        return result.modified_count > 0
+        return True
     
     @staticmethod
-    def find_by_id(app_id):
-        """Find application by ID"""
+    def update_status_many(updates):
+        """
+        Apply many status changes in one bulk write.
+        updates: list of (app_id, status) pairs.
+        Returns (results, changed) where results holds one
+        {'application_id', 'result'} dict per input pair and changed lists
+        the application documents whose status actually changed.
+        Each write only applies if the status is still the one read, so an
+        application changed concurrently is reported as 'conflict', and one
+        changed and set back within the batch as 'unchanged'.
+        """
         db = get_db()
         
-        if not ObjectId.is_valid(app_id):
-            return None
+        ids = [_normalize_id(app_id) for app_id, _ in updates]
+        valid_ids = [ObjectId(app_id) for app_id in ids if app_id]
+        existing = {}
+        if valid_ids:
+            for app in db.applications.find(
+                {'_id': {'$in': valid_ids}},
+                {'campaign_id': 1, 'creator_id': 1, 'status': 1, 'bid_amount': 1}
+            ):
+                existing[str(app['_id'])] = app
+        
+        # One write per application, from the status read to the last one
+        # asked for; later entries for the same id see earlier ones
+        targets = {}
+        outcomes = []
+        for app_id, (_, status) in zip(ids, updates):
+            app = existing.get(app_id)
+            if app is None:
+                outcomes.append('not_found')
+                continue
+            current = targets.get(app_id, app.get('status'))
+            if current == status:
+                outcomes.append('unchanged')
+                continue
+            targets[app_id] = status
+            outcomes.append(app_id)
+        targets = {app_id: status for app_id, status in targets.items()
+                   if status != existing[app_id].get('status')}
         
-        app = db.applications.find_one({'_id': ObjectId(app_id)})
+        now = datetime.utcnow()
+        applied = set()
+        if targets:
+            operations = [
+                UpdateOne(
+                    {'_id': existing[app_id]['_id'], 'status': existing[app_id].get('status')},
+                    {'$set': {'status': status, 'updated_at': now}}
+                )
+                for app_id, status in targets.items()
+            ]
+            matched = db.applications.bulk_write(operations).matched_count
+            if matched == len(operations):
+                applied = set(targets)
+            elif matched:
+                # Find which writes landed: they carry this batch's timestamp
+                for app in db.applications.find(
+                    {'_id': {'$in': [existing[app_id]['_id'] for app_id in targets]}, 'updated_at': now},
+                    {'status': 1}
+                ):
+                    app_id = str(app['_id'])
+                    if app.get('status') == targets[app_id]:
+                        applied.add(app_id)
+            for app_id in targets:
+                loader.evict('applications', app_id)
+            Rollup.record_status_changes([
+                (existing[app_id], existing[app_id].get('status', 'pending'), targets[app_id])
+                for app_id in applied
+            ])
+        
+        results = []
+        for (app_id, _), outcome in zip(updates, outcomes):
+            if outcome in ('not_found', 'unchanged'):
+                results.append({'application_id': app_id, 'result': outcome})
+            elif outcome not in targets:
+                # Changed and set back within the batch: nothing was written
+                results.append({'application_id': app_id, 'result': 'unchanged'})
+            else:
+                results.append({'application_id': app_id,
+                                'result': 'updated' if outcome in applied else 'conflict'})
+        changed = [{
+            '_id': app_id,
+            'campaign_id': existing[app_id].get('campaign_id'),
+            'creator_id': existing[app_id].get('creator_id'),
+            'status': targets[app_id]
+        } for app_id in targets if app_id in applied]
+        
+        return results, changed
+    
+    @staticmethod
+    def find_by_id(app_id):
+        """Find application by ID"""
+        app = loader.load('applications', app_id)
         if app:
             app['_id'] = str(app['_id'])
             if 'created_at' in app:
@@ -1,14 +1,40 @@
 from database import get_db
 from bson.objectid import ObjectId
 from datetime import datetime
+from pymongo import ReplaceOne
+from models import loader
+from models.rollup import Rollup
+import logging
+
+logger = logging.getLogger(__name__)
+
+CAMPAIGN_STATUSES = ['active', 'closed']
+
+# Derived data (campaign feeds etc.) subscribes here. Listeners are called
+# as fn(campaign_id) after a write, with None when many campaigns changed.
+_change_listeners = []
+
+
+def _notify_change(campaign_id):
+    for listener in _change_listeners:
+        try:
+            listener(campaign_id)
+        except Exception:
+            logger.exception("Campaign change listener failed")
+
 
 class Campaign:
+    @staticmethod
+    def add_change_listener(listener):
+        _change_listeners.append(listener)
+
     @staticmethod
     def create(data):
         db = get_db()
         data['created_at'] = datetime.utcnow()
         data['status'] = 'active'
         result = db.campaigns.insert_one(data)
+        _notify_change(str(result.inserted_id))
         return str(result.inserted_id)
 
     @staticmethod
@@ -17,14 +43,159 @@ class Campaign:
         query = filters or {}
         return list(db.campaigns.find(query).sort("created_at", -1))
 
+    @staticmethod
+    def build_query(business_id=None, status=None, min_budget=None, max_budget=None,
+                    created_after=None, created_before=None,
+                    deadline_after=None, deadline_before=None):
+        """Translate lifecycle filters into a Mongo query for find_all"""
+        query = {}
+        if business_id:
+            query["business_id"] = business_id
+        if status:
+            query["status"] = status
+
+        budget = {}
+        if min_budget is not None:
+            budget["$gte"] = min_budget
+        if max_budget is not None:
+            budget["$lte"] = max_budget
+        if budget:
+            query["budget"] = budget
+
+        created = {}
+        if created_after is not None:
+            created["$gte"] = created_after
+        if created_before is not None:
+            created["$lt"] = created_before
+        if created:
+            query["created_at"] = created
+
+        deadline = {}
+        if deadline_after is not None:
+            deadline["$gte"] = deadline_after
+        if deadline_before is not None:
+            deadline["$lt"] = deadline_before
+        if deadline:
+            query["deadline"] = deadline
+
+        return query
+
     @staticmethod
     def find_by_business(business_id):
         db = get_db()
         return list(db.campaigns.find({"business_id": business_id}).sort("created_at", -1))
-    
+
     @staticmethod
     def find_by_id(campaign_id):
+        return loader.load('campaigns', campaign_id)
+
+    @staticmethod
+    def find_by_ids(campaign_ids):
+        """Resolve several campaigns with one $in query, keyed by string id"""
+        return loader.load_many('campaigns', campaign_ids)
+
+    @staticmethod
+    def update(campaign_id, fields):
+        db = get_db()
+        if not ObjectId.is_valid(campaign_id):
+            return False
+        result = db.campaigns.update_one({"_id": ObjectId(campaign_id)}, {"$set": fields})
+        loader.evict('campaigns', campaign_id)
+        _notify_change(campaign_id)
+        return result.matched_count > 0
+
+    @staticmethod
+    def delete(campaign_id):
+        """Delete a campaign together with its applications and messages"""
         db = get_db()
         if not ObjectId.is_valid(campaign_id):
-            return None
-        return db.campaigns.find_one({"_id": ObjectId(campaign_id)})
+            return False
+        result = db.campaigns.delete_one({"_id": ObjectId(campaign_id)})
+        loader.evict('campaigns', campaign_id)
+        if result.deleted_count:
+            db.applications.delete_many({"campaign_id": campaign_id})
+            db.messages.delete_many({"campaign_id": campaign_id})
+            db.message_buckets.delete_many({"campaign_id": campaign_id})
+            Rollup.remove_campaign(campaign_id)
+            _notify_change(campaign_id)
+        return result.deleted_count > 0
+
+    @staticmethod
+    def close_expired(now=None):
+        """Close every active campaign whose deadline has passed"""
+        db = get_db()
+        now = now or datetime.utcnow()
+        result = db.campaigns.update_many(
+            {"status": "active", "deadline": {"$lt": now}},
+            {"$set": {"status": "closed", "closed_at": now}}
+        )
+        loader.evict('campaigns')
+        if result.modified_count:
+            _notify_change(None)
+        return result.modified_count
+
+    @staticmethod
+    def archive_closed(closed_before, batch_size=500):
+        """
+        Move closed campaigns (and their applications) into the
+        campaigns_archive / applications_archive collections in batches.
+        Copies are upserted before the hot documents are deleted, so an
+        interrupted run can simply be repeated.
+        Returns (campaigns_archived, applications_archived).
+        """
+        db = get_db()
+        campaigns_moved = 0
+        applications_moved = 0
+
+        while True:
+            batch = list(db.campaigns.find(
+                {"status": "closed", "closed_at": {"$lt": closed_before}}
+            ).sort("closed_at", 1).limit(batch_size))
+            if not batch:
+                break
+
+            archived_at = datetime.utcnow()
+            for c in batch:
+                c["archived_at"] = archived_at
+            db.campaigns_archive.bulk_write(
+                [ReplaceOne({"_id": c["_id"]}, c, upsert=True) for c in batch],
+                ordered=False
+            )
+
+            campaign_ids = [str(c["_id"]) for c in batch]
+            apps_query = {"campaign_id": {"$in": campaign_ids}}
+            while True:
+                apps = list(db.applications.find(apps_query).limit(batch_size))
+                if not apps:
+                    break
+                db.applications_archive.bulk_write(
+                    [ReplaceOne({"_id": a["_id"]}, a, upsert=True) for a in apps],
+                    ordered=False
+                )
+                db.applications.delete_many({"_id": {"$in": [a["_id"] for a in apps]}})
+                applications_moved += len(apps)
+
+            # A campaign reopened since it was read stays hot; undo its copy
+            batch_ids = [c["_id"] for c in batch]
+            deleted = db.campaigns.delete_many({"_id": {"$in": batch_ids}, "status": "closed"}).deleted_count
+            if deleted < len(batch):
+                reopened = [c["_id"] for c in db.campaigns.find({"_id": {"$in": batch_ids}}, {"_id": 1})]
+                applications_moved -= Campaign._unarchive(db, reopened)
+            campaigns_moved += deleted
+
+        if campaigns_moved:
+            _notify_change(None)
+        return campaigns_moved, applications_moved
+
+    @staticmethod
+    def _unarchive(db, campaign_ids):
+        """Move the archived copies of these campaigns' applications back; returns how many"""
+        db.campaigns_archive.delete_many({"_id": {"$in": campaign_ids}})
+        apps = list(db.applications_archive.find({"campaign_id": {"$in": [str(i) for i in campaign_ids]}}))
+        if apps:
+            db.applications.bulk_write(
+                [ReplaceOne({"_id": a["_id"]}, a, upsert=True) for a in apps],
+                ordered=False
+            )
+            db.applications_archive.delete_many({"_id": {"$in": [a["_id"] for a in apps]}})
+        return len(apps)
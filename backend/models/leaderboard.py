@@ -0,0 +1,93 @@
+from database import get_db
+from datetime import datetime
+from instrumentation import gauge, histogram
+import os
+import time
+
+# Ranking name -> creator field, best first
+LEADERBOARD_METRICS = {
+    'rating': 'average_rating',
+    'reviews': 'review_count',
+    'followers': 'followers',
+}
+LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", "100"))
+OVERALL = 'all'
+
+ENTRY_FIELDS = ('name', 'category', 'followers', 'average_rating', 'review_count')
+
+REFRESH_SECONDS = histogram('linkfluence_leaderboard_refresh_seconds', 'Time to rebuild all leaderboards',
+                            buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+LAST_REFRESH = gauge('linkfluence_leaderboard_last_refresh_timestamp', 'Unix time of the last leaderboard rebuild')
+
+
+def board_id(metric, category):
+    return f"{metric}:{category}"
+
+
+def _top(field, group_by):
+    output = {'_id': {'$toString': '$_id'}}
+    output.update({f: f'${f}' for f in ENTRY_FIELDS})
+    return [
+        {'$match': {field: {'$type': 'number'}}},
+        {'$group': {
+            '_id': group_by,
+            'entries': {'$topN': {
+                'n': LEADERBOARD_SIZE,
+                'sortBy': {field: -1, '_id': 1},
+                'output': output
+            }}
+        }}
+    ]
+
+
+class Leaderboard:
+    @staticmethod
+    def get(category=OVERALL, metric='rating'):
+        """The materialised top creators, or None if never built"""
+        db = get_db()
+        return db.leaderboards.find_one({'_id': board_id(metric, category)})
+
+    @staticmethod
+    def refresh():
+        """
+        Rebuild every category's top-N per metric in one pass over creators,
+        $merge-ing one small document per (metric, category) into
+        leaderboards. Boards for categories that no longer exist are removed.
+        Returns the number of boards written.
+        """
+        db = get_db()
+        started = time.perf_counter()
+        refreshed_at = datetime.utcnow()
+        facets = {}
+        for metric, field in LEADERBOARD_METRICS.items():
+            facets[f'{metric}|cat'] = [{'$match': {'category': {'$type': 'string', '$ne': ''}}}] + _top(field, '$category')
+            facets[f'{metric}|all'] = _top(field, OVERALL)
+
+        boards = [
+            {'$map': {
+                'input': f'${name}',
+                'as': 'b',
+                'in': {
+                    '_id': {'$concat': [name.split('|')[0] + ':', '$$b._id']},
+                    'metric': name.split('|')[0],
+                    'category': '$$b._id',
+                    'entries': '$$b.entries',
+                    'refreshed_at': refreshed_at
+                }
+            }}
+            for name in facets
+        ]
+        pipeline = [
+            {'$match': {'role': 'creator'}},
+            {'$facet': facets},
+            {'$project': {'boards': {'$concatArrays': boards}}},
+            {'$unwind': '$boards'},
+            {'$replaceRoot': {'newRoot': '$boards'}},
+            {'$merge': {'into': 'leaderboards', 'on': '_id',
+                        'whenMatched': 'replace', 'whenNotMatched': 'insert'}}
+        ]
+        db.users.aggregate(pipeline, allowDiskUse=True)
+        db.leaderboards.delete_many({'refreshed_at': {'$lt': refreshed_at}})
+        REFRESH_SECONDS.observe(time.perf_counter() - started)
+        LAST_REFRESH.set(time.time())
+        return db.leaderboards.count_documents({'refreshed_at': refreshed_at})
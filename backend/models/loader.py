@@ -0,0 +1,161 @@
+"""
+Request-scoped identity map and batching loader for lookups by _id.
+
+Inside a request every document fetched through `load`/`load_many` is
+remembered, so repeated `find_by_id` calls for the same id hit Mongo once.
+Ids queued with `prefetch` (and any misses of a `load_many`) are resolved
+together with a single `$in` query the next time that collection is read.
+
+Outside a request scope (jobs, CLI scripts) nothing is cached and every
+call goes straight to Mongo. Writes made through the models evict or
+re-prime the affected documents, so a request always reads its own writes.
+"""
+
+import copy
+from contextvars import ContextVar
+
+from bson.objectid import ObjectId
+
+from database import get_db
+from instrumentation import counter
+
+LOADER_QUERIES = counter('linkfluence_loader_queries_total',
+                         'Mongo lookups issued by the request loader', ('collection',))
+LOADER_SAVED = counter('linkfluence_loader_saved_queries_total',
+                       'Lookups answered from the identity map or folded into a batch', ('collection',))
+
+_MISSING = object()
+
+
+class IdentityMap:
+    """Documents seen during one request, per collection and string id"""
+
+    __slots__ = ('docs', 'pending', 'queries', 'saved')
+
+    def __init__(self):
+        self.docs = {}
+        self.pending = {}
+        self.queries = 0
+        self.saved = 0
+
+
+_scope = ContextVar('linkfluence_identity_map', default=None)
+
+
+def current_scope():
+    return _scope.get()
+
+
+def begin_scope():
+    return _scope.set(IdentityMap())
+
+
+def end_scope(token):
+    _scope.reset(token)
+
+
+def _fetch(collection, ids):
+    object_ids = [ObjectId(i) for i in ids]
+    if not object_ids:
+        return {}
+    db = get_db()
+    if len(object_ids) == 1:
+        doc = db[collection].find_one({"_id": object_ids[0]})
+        found = [doc] if doc else []
+    else:
+        found = db[collection].find({"_id": {"$in": object_ids}})
+    return {str(d['_id']): d for d in found}
+
+
+def _resolve(scope, collection, ids):
+    """Fill the identity map for ids (plus anything queued), one query"""
+    docs = scope.docs.setdefault(collection, {})
+    wanted = set(ids) | scope.pending.pop(collection, set())
+    missing = [i for i in wanted if i not in docs]
+    if missing:
+        fetched = _fetch(collection, missing)
+        for i in missing:
+            docs[i] = fetched.get(i)
+        scope.queries += 1
+        LOADER_QUERIES.inc(collection=collection)
+    # Without the loader every id asked for would have been its own query
+    saved = len(set(ids)) - (1 if missing else 0)
+    if saved > 0:
+        scope.saved += saved
+        LOADER_SAVED.inc(saved, collection=collection)
+    return docs
+
+
+def load(collection, doc_id):
+    """Fetch one document by string id; returns a copy, or None"""
+    doc_id = str(doc_id) if doc_id is not None else None
+    if not doc_id or not ObjectId.is_valid(doc_id):
+        return None
+    scope = _scope.get()
+    if scope is None:
+        return _fetch(collection, [doc_id]).get(doc_id)
+    doc = _resolve(scope, collection, [doc_id]).get(doc_id)
+    # Callers serialise results in place; keep the cached copy pristine
+    return copy.deepcopy(doc)
+
+
+def load_many(collection, doc_ids):
+    """Fetch several documents with at most one query, keyed by string id"""
+    ids = {str(i) for i in doc_ids if i and ObjectId.is_valid(str(i))}
+    if not ids:
+        return {}
+    scope = _scope.get()
+    if scope is None:
+        return _fetch(collection, ids)
+    docs = _resolve(scope, collection, ids)
+    return {i: copy.deepcopy(docs[i]) for i in ids if docs.get(i) is not None}
+
+
+def prefetch(collection, doc_ids):
+    """Queue ids so the next load from this collection fetches them too"""
+    scope = _scope.get()
+    if scope is None:
+        return
+    known = scope.docs.get(collection, {})
+    queue = scope.pending.setdefault(collection, set())
+    queue.update(str(i) for i in doc_ids if i and ObjectId.is_valid(str(i)) and str(i) not in known)
+
+
+def prime(collection, doc):
+    """Record a document the caller already holds (e.g. after an update)"""
+    scope = _scope.get()
+    if scope is not None and doc is not None:
+        scope.docs.setdefault(collection, {})[str(doc['_id'])] = copy.deepcopy(doc)
+
+
+def evict(collection, doc_id=_MISSING):
+    """Forget one document, or the whole collection when no id is given"""
+    scope = _scope.get()
+    if scope is None:
+        return
+    if doc_id is _MISSING:
+        scope.docs.pop(collection, None)
+    else:
+        scope.docs.get(collection, {}).pop(str(doc_id), None)
+
+
+def init_app(app):
+    """Open an identity map for each request and report queries saved"""
+    from flask import g
+
+    @app.before_request
+    def _open_identity_map():
+        g._identity_map_token = begin_scope()
+
+    @app.after_request
+    def _report_identity_map(response):
+        scope = _scope.get()
+        if scope is not None:
+            response.headers['X-Queries-Saved'] = str(scope.saved)
+        return response
+
+    @app.teardown_request
+    def _close_identity_map(exc):
+        token = g.pop('_identity_map_token', None)
+        if token is not None:
+            end_scope(token)
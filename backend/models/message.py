@@ -1,18 +1,54 @@
 from database import get_db
 from datetime import datetime
+from bson.errors import InvalidId
 from bson.objectid import ObjectId
+import os
 
-class Message:
-    @staticmethod
-    def send(data):
-        db = get_db()
-        data['timestamp'] = datetime.utcnow()
-        result = db.messages.insert_one(data)
+# 'documents' stores one document per message (the original layout);
+# 'buckets' packs up to MESSAGE_BUCKET_SIZE messages of one conversation
+# into a single document. Migrate with `python jobs.py migrate-messages`.
+MESSAGE_STORAGE = os.getenv("MESSAGE_STORAGE", "documents")
+MESSAGE_BUCKET_SIZE = int(os.getenv("MESSAGE_BUCKET_SIZE", "200"))
+# Most messages one conversation read returns (the newest ones); older
+# pages are read with a `before` cursor, and the whole history is
+# available through the export endpoint
+MAX_CONVERSATION_MESSAGES = 500
+
+
+def encode_cursor(message):
+    return f"{message['timestamp'].isoformat()}|{message['_id']}"
+
+
+def decode_cursor(cursor):
+    """Returns (timestamp, ObjectId) or None if the cursor is malformed"""
+    timestamp, _, oid = (cursor or '').partition('|')
+    try:
+        return datetime.fromisoformat(timestamp), ObjectId(oid)
+    except (ValueError, TypeError, InvalidId):
+        return None
+
+
+def _sort_key(message):
+    return message['timestamp'], message['_id']
+
+
+def conversation_key(campaign_id, user_a, user_b):
+    """Same key whichever side of the conversation is sending"""
+    first, second = sorted([user_a, user_b])
+    return f"{campaign_id}:{first}:{second}"
+
+
+class DocumentStore:
+    """One document per message in `messages`"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def send(self, data):
+        result = self.collection.insert_one(data)
         return str(result.inserted_id)
 
-    @staticmethod
-    def get_conversation(campaign_id, creator_id, business_id):
-        db = get_db()
+    def get_conversation(self, campaign_id, creator_id, business_id, limit=None, before=None):
         query = {
             "campaign_id": campaign_id,
             "$or": [
@@ -20,19 +56,221 @@ class Message:
                 {"sender_id": business_id, "receiver_id": creator_id}
             ]
         }
-        return list(db.messages.find(query).sort("timestamp", 1))
+        if before:
+            timestamp, oid = before
+            query = {"$and": [query, {"$or": [
+                {"timestamp": {"$lt": timestamp}},
+                {"timestamp": timestamp, "_id": {"$lt": oid}}
+            ]}]}
+        if limit:
+            # Newest `limit` messages, returned oldest first
+            return list(self.collection.find(query)
+                        .sort([("timestamp", -1), ("_id", -1)])
+                        .limit(limit))[::-1]
+        return list(self.collection.find(query).sort([("timestamp", 1), ("_id", 1)]))
 
-    @staticmethod
-    def get_chats_for_user(user_id):
+    def iter_conversation(self, campaign_id, creator_id, business_id, projection=None, batch_size=1000):
+        query = {
+            "campaign_id": campaign_id,
+            "$or": [
+                {"sender_id": creator_id, "receiver_id": business_id},
+                {"sender_id": business_id, "receiver_id": creator_id}
+            ]
+        }
+        return self.collection.find(query, projection).sort("timestamp", 1).batch_size(batch_size)
+
+    def get_chats_for_user(self, user_id):
         # Find unique conversations for a user (simplified)
-        db = get_db()
         pipeline = [
             {"$match": {"$or": [{"sender_id": user_id}, {"receiver_id": user_id}]}},
             {"$group": {
-                "_id": "$campaign_id", 
+                "_id": "$campaign_id",
                 "last_message": {"$last": "$$ROOT"},
                 "participants": {"$addToSet": "$sender_id"} # Crude way to get participants
             }},
             {"$sort": {"last_message.timestamp": -1}}
         ]
-        return list(db.messages.aggregate(pipeline))
+        return list(self.collection.aggregate(pipeline))
+
+
+class BucketStore:
+    """
+    Messages of one conversation packed into bucket documents:
+    {conversation, campaign_id, participants, count, first_ts, last_ts, messages: [...]}
+    A send is a single upsert that $pushes into the conversation's open
+    bucket, or starts a new one when it is full.
+    """
+
+    def __init__(self, collection, bucket_size=MESSAGE_BUCKET_SIZE):
+        self.collection = collection
+        self.bucket_size = bucket_size
+
+    def send(self, data):
+        data.setdefault('_id', ObjectId())
+        key = conversation_key(data['campaign_id'], data['sender_id'], data['receiver_id'])
+        self.collection.update_one(
+            {"conversation": key, "count": {"$lt": self.bucket_size}},
+            {
+                "$push": {"messages": data},
+                "$inc": {"count": 1},
+                "$min": {"first_ts": data['timestamp']},
+                "$max": {"last_ts": data['timestamp']},
+                "$setOnInsert": {
+                    "campaign_id": data['campaign_id'],
+                    "participants": sorted([data['sender_id'], data['receiver_id']])
+                }
+            },
+            upsert=True
+        )
+        return str(data['_id'])
+
+    def get_conversation(self, campaign_id, creator_id, business_id, limit=None, before=None):
+        key = conversation_key(campaign_id, creator_id, business_id)
+        query = {"conversation": key}
+        if before:
+            # Buckets that start after the cursor hold nothing older
+            query["first_ts"] = {"$lte": before[0]}
+        if limit:
+            # Walk buckets newest first until enough messages are collected.
+            # Concurrent sends can interleave two open buckets, so keep going
+            # until the next bucket ends before everything collected so far
+            messages = []
+            for bucket in self.collection.find(query).sort("last_ts", -1):
+                if len(messages) >= limit and bucket['last_ts'] < messages[-limit]['timestamp']:
+                    break
+                messages.extend(m for m in bucket.get('messages', [])
+                                if not before or _sort_key(m) < before)
+                messages.sort(key=_sort_key)
+            return messages[-limit:]
+        messages = []
+        for bucket in self.collection.find(query).sort("first_ts", 1):
+            messages.extend(m for m in bucket.get('messages', [])
+                            if not before or _sort_key(m) < before)
+        # Concurrent sends can interleave two open buckets
+        messages.sort(key=_sort_key)
+        return messages
+
+    def iter_conversation(self, campaign_id, creator_id, business_id, projection=None, batch_size=1000):
+        """Messages oldest first, holding one batch of buckets at a time"""
+        key = conversation_key(campaign_id, creator_id, business_id)
+        buckets = (self.collection.find({"conversation": key}, {"messages": 1})
+                   .sort("first_ts", 1)
+                   .batch_size(max(1, batch_size // self.bucket_size)))
+        for bucket in buckets:
+            for msg in sorted(bucket.get('messages', []), key=lambda m: m['timestamp']):
+                if projection:
+                    msg = {k: v for k, v in msg.items() if projection.get(k)}
+                yield msg
+
+    def get_chats_for_user(self, user_id):
+        pipeline = [
+            {"$match": {"participants": user_id}},
+            {"$sort": {"last_ts": 1}},
+            {"$group": {
+                "_id": "$campaign_id",
+                "last_message": {"$last": {"$arrayElemAt": ["$messages", -1]}},
+                "participants": {"$addToSet": "$participants"}
+            }},
+            {"$project": {
+                "last_message": 1,
+                "participants": {"$reduce": {
+                    "input": "$participants", "initialValue": [],
+                    "in": {"$setUnion": ["$$value", "$$this"]}
+                }}
+            }},
+            {"$sort": {"last_message.timestamp": -1}}
+        ]
+        return list(self.collection.aggregate(pipeline))
+
+    def import_conversation(self, key, messages):
+        """Write already-sorted messages of one conversation as full buckets"""
+        buckets = []
+        for start in range(0, len(messages), self.bucket_size):
+            chunk = messages[start:start + self.bucket_size]
+            buckets.append({
+                "conversation": key,
+                "campaign_id": chunk[0]['campaign_id'],
+                "participants": sorted([chunk[0]['sender_id'], chunk[0]['receiver_id']]),
+                "count": len(chunk),
+                "first_ts": chunk[0]['timestamp'],
+                "last_ts": chunk[-1]['timestamp'],
+                "messages": chunk
+            })
+        if buckets:
+            self.collection.insert_many(buckets, ordered=False)
+        return len(buckets)
+
+
+def message_store():
+    db = get_db()
+    if MESSAGE_STORAGE == 'buckets':
+        return BucketStore(db.message_buckets)
+    return DocumentStore(db.messages)
+
+
+class Message:
+    @staticmethod
+    def send(data):
+        data['timestamp'] = datetime.utcnow()
+        return message_store().send(data)
+
+    @staticmethod
+    def get_conversation(campaign_id, creator_id, business_id, limit=None, before=None):
+        """
+        The newest `limit` messages (1..MAX_CONVERSATION_MESSAGES) older
+        than the `before` cursor if given, oldest first.
+        Returns (messages, has_more); pass encode_cursor(messages[0]) as
+        `before` to read the page preceding this one.
+        """
+        if limit is None:
+            limit = MAX_CONVERSATION_MESSAGES
+        limit = min(max(limit, 1), MAX_CONVERSATION_MESSAGES)
+        messages = message_store().get_conversation(campaign_id, creator_id, business_id, limit + 1, before)
+        return messages[-limit:], len(messages) > limit
+
+    @staticmethod
+    def iter_conversation(campaign_id, creator_id, business_id, projection=None, batch_size=1000):
+        return message_store().iter_conversation(campaign_id, creator_id, business_id, projection, batch_size)
+
+    @staticmethod
+    def get_chats_for_user(user_id):
+        return message_store().get_chats_for_user(user_id)
+
+    @staticmethod
+    def migrate_to_buckets(batch_size=1000, replace=False):
+        """
+        Copy the per-message layout into message_buckets, conversation by
+        conversation. The source collection is left untouched; switch
+        MESSAGE_STORAGE to 'buckets' once the copy is done.
+        Refuses to run over existing buckets unless replace=True.
+        Returns (messages_copied, buckets_written).
+        """
+        db = get_db()
+        if db.message_buckets.find_one({}, {"_id": 1}):
+            if not replace:
+                raise RuntimeError("message_buckets is not empty; pass replace=True to rebuild it")
+            db.message_buckets.delete_many({})
+        store = BucketStore(db.message_buckets)
+        pipeline = [
+            {"$addFields": {"_conversation": {"$concat": [
+                "$campaign_id", ":",
+                {"$min": ["$sender_id", "$receiver_id"]}, ":",
+                {"$max": ["$sender_id", "$receiver_id"]}
+            ]}}},
+            {"$sort": {"_conversation": 1, "timestamp": 1}}
+        ]
+        copied = 0
+        written = 0
+        current_key = None
+        pending = []
+        cursor = db.messages.aggregate(pipeline, allowDiskUse=True, batchSize=batch_size)
+        for msg in cursor:
+            key = msg.pop('_conversation')
+            if key != current_key or len(pending) >= store.bucket_size:
+                written += store.import_conversation(current_key, pending)
+                copied += len(pending)
+                current_key, pending = key, []
+            pending.append(msg)
+        written += store.import_conversation(current_key, pending)
+        copied += len(pending)
+        return copied, written
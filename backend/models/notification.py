@@ -1,6 +1,33 @@
 from database import get_db
+from bson.errors import InvalidId
 from bson.objectid import ObjectId
 from datetime import datetime
+import os
+
+# Retention: read notifications expire through the TTL index on read_at
+# (NOTIFICATION_READ_TTL_DAYS, see database.INDEXES) and each user keeps at
+# most NOTIFICATION_MAX_PER_USER, trimmed by `python jobs.py notifications`
+NOTIFICATION_MAX_PER_USER = int(os.getenv("NOTIFICATION_MAX_PER_USER", "500"))
+
+# Repeated unread notifications of these types on the same campaign are
+# collapsed into one summary by compact(); type -> summary title
+COMPACTABLE_TYPES = {
+    'new_application': '{count} New Applications',
+}
+
+
+def encode_cursor(notification):
+    return f"{notification['created_at'].isoformat()}|{notification['_id']}"
+
+
+def decode_cursor(cursor):
+    """Returns (created_at, ObjectId) or None if the cursor is malformed"""
+    created_at, _, oid = (cursor or '').partition('|')
+    try:
+        return datetime.fromisoformat(created_at), ObjectId(oid)
+    except (ValueError, TypeError, InvalidId):
+        return None
+
 
 class Notification:
     @staticmethod
@@ -12,9 +39,35 @@ class Notification:
         return str(result.inserted_id)
 
     @staticmethod
-    def find_for_user(user_id):
+    def create_many(items):
+        """Insert several notifications in a single round trip"""
+        if not items:
+            return []
+        db = get_db()
+        now = datetime.utcnow()
+        for data in items:
+            data['created_at'] = now
+            data['read'] = False
+        result = db.notifications.insert_many(items, ordered=False)
+        return [str(i) for i in result.inserted_ids]
+
+    @staticmethod
+    def find_for_user(user_id, limit=50, before=None):
+        """
+        Newest notifications first. `before` is a cursor from a previous
+        page (see encode_cursor); pages are stable while new ones arrive.
+        """
         db = get_db()
-        return list(db.notifications.find({"user_id": user_id}).sort("created_at", -1).limit(50))
+        query = {"user_id": user_id}
+        if before:
+            created_at, oid = before
+            query["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": oid}}
+            ]
+        return list(db.notifications.find(query)
+                    .sort([("created_at", -1), ("_id", -1)])
+                    .limit(limit))
 
     @staticmethod
     def mark_as_read(notification_id):
@@ -23,7 +76,7 @@ class Notification:
             return False
         db.notifications.update_one(
             {"_id": ObjectId(notification_id)},
-            {"$set": {"read": True}}
+            {"$set": {"read": True, "read_at": datetime.utcnow()}}
         )
         return True
 
@@ -31,3 +84,101 @@ class Notification:
     def count_unread(user_id):
         db = get_db()
         return db.notifications.count_documents({"user_id": user_id, "read": False})
+
+    @staticmethod
+    def trim_user(user_id, keep=NOTIFICATION_MAX_PER_USER):
+        """Delete everything older than the user's newest `keep` notifications"""
+        db = get_db()
+        if keep <= 0:
+            return db.notifications.delete_many({"user_id": user_id}).deleted_count
+        boundary = list(db.notifications.find({"user_id": user_id}, {"created_at": 1})
+                        .sort([("created_at", -1), ("_id", -1)])
+                        .skip(keep - 1).limit(1))
+        if not boundary:
+            return 0
+        created_at, oid = boundary[0]['created_at'], boundary[0]['_id']
+        result = db.notifications.delete_many({"user_id": user_id, "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": oid}}
+        ]})
+        return result.deleted_count
+
+    @staticmethod
+    def trim_all(keep=NOTIFICATION_MAX_PER_USER):
+        """Apply the per-user cap to every user over it"""
+        db = get_db()
+        over_cap = db.notifications.aggregate([
+            {"$group": {"_id": "$user_id", "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": keep}}}
+        ], allowDiskUse=True)
+        return sum(Notification.trim_user(row['_id'], keep) for row in over_cap)
+
+    @staticmethod
+    def compact(batch_size=500):
+        """
+        Collapse repeated unread notifications (same user, type and campaign)
+        into one summary carrying a `count`. Returns notifications removed.
+        """
+        db = get_db()
+        groups = db.notifications.aggregate([
+            {"$match": {"read": False, "type": {"$in": list(COMPACTABLE_TYPES)}}},
+            {"$sort": {"created_at": 1}},
+            {"$group": {
+                "_id": {"user_id": "$user_id", "type": "$type", "campaign_id": "$campaign_id"},
+                "ids": {"$push": "$_id"},
+                "count": {"$sum": {"$ifNull": ["$count", 1]}},
+                "latest": {"$last": "$$ROOT"}
+            }},
+            {"$match": {"ids.1": {"$exists": True}}}
+        ], allowDiskUse=True)
+
+        removed = 0
+        batch = []
+        for group in groups:
+            batch.append(group)
+            if len(batch) >= batch_size:
+                removed += Notification._replace(db, batch)
+                batch = []
+        if batch:
+            removed += Notification._replace(db, batch)
+        return removed
+
+    @staticmethod
+    def _summary(latest, count):
+        return {
+            "user_id": latest['user_id'],
+            "type": latest['type'],
+            "campaign_id": latest.get('campaign_id'),
+            "title": COMPACTABLE_TYPES[latest['type']].format(count=count),
+            "message": f"{latest.get('message', '')} (+{count - 1} more)",
+            "count": count,
+            "compacted": True,
+            "read": False,
+            "created_at": latest['created_at']
+        }
+
+    @staticmethod
+    def _replace(db, groups):
+        # Insert first: a crash in between leaves duplicates, never losses.
+        # Ones read since the aggregation ran are kept, and the summaries
+        # are then corrected to count only what was actually deleted
+        summaries = [Notification._summary(group['latest'], group['count']) for group in groups]
+        db.notifications.insert_many(summaries, ordered=False)
+        stale_ids = [oid for group in groups for oid in group['ids']]
+        deleted = db.notifications.delete_many({"_id": {"$in": stale_ids}, "read": False}).deleted_count
+        kept = {doc['_id']: doc.get('count', 1)
+                for doc in db.notifications.find({"_id": {"$in": stale_ids}}, {"count": 1})}
+        remaining = len(summaries)
+        for group, summary in zip(groups, summaries) if kept else ():
+            count = group['count'] - sum(kept.get(oid, 0) for oid in group['ids'])
+            if count == group['count']:
+                continue
+            if count <= 0:
+                db.notifications.delete_one({"_id": summary['_id']})
+                remaining -= 1
+                continue
+            fixed = Notification._summary(group['latest'], count)
+            db.notifications.update_one({"_id": summary['_id']}, {"$set": {
+                "title": fixed['title'], "message": fixed['message'], "count": count
+            }})
+        return deleted - remaining
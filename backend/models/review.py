@@ -1,6 +1,7 @@
 from database import get_db
-from bson.objectid import ObjectId
 from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+from models.user import User
 
 class Review:
     @staticmethod
@@ -11,17 +12,13 @@ class Review:
         # Add metadata
         data['created_at'] = datetime.utcnow()
         
-        # Check if this reviewer already reviewed this creator
-        existing = db.reviews.find_one({
-            'creator_id': data['creator_id'],
-            'reviewer_id': data['reviewer_id']
-        })
-        if existing:
+        # Insert the review; the unique (creator_id, reviewer_id) index
+        # rejects a second review from the same reviewer
+        try:
+            result = db.reviews.insert_one(data)
+        except DuplicateKeyError:
             return None  # Already reviewed
         
-        # Insert the review
-        result = db.reviews.insert_one(data)
-        
         # Update creator's cached stats
         Review.update_creator_stats(data['creator_id'])
         
@@ -69,13 +66,10 @@ class Review:
     @staticmethod
     def update_creator_stats(creator_id):
         """Update cached rating stats on creator's user document"""
-        db = get_db()
         stats = Review.get_stats(creator_id)
         
-        db.users.update_one(
-            {'_id': ObjectId(creator_id)},
-            {'$set': {
-                'average_rating': stats['average_rating'],
-                'review_count': stats['review_count']
-            }}
-        )
+        # Through the User model so updated_at and change listeners see it
+        User.update_user(creator_id, {
+            'average_rating': stats['average_rating'],
+            'review_count': stats['review_count']
+        })
@@ -0,0 +1,233 @@
+from database import get_db
+from datetime import datetime
+from pymongo import ReplaceOne, UpdateOne
+from collections import defaultdict
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Per-campaign (campaign_rollups) and per-business (business_rollups)
+# application counters, kept up to date with $inc as applications are
+# created and reviewed. Fields:
+#   applications         all applications received
+#   status.<status>      applications currently in each status
+#   bid_total            sum of bid_amount over all applications
+#   accepted_bid_total   sum of bid_amount over accepted applications
+#   daily.<YYYY-MM-DD>   applications received that day (UTC)
+STATUSES = ('pending', 'accepted', 'rejected')
+
+
+def _bid(application):
+    value = application.get('bid_amount')
+    if isinstance(value, bool):
+        return 0
+    try:
+        bid = float(value or 0)
+    except (TypeError, ValueError):
+        return 0
+    return bid if bid == bid and bid not in (float('inf'), float('-inf')) else 0
+
+
+def _day(created_at):
+    return created_at.strftime('%Y-%m-%d')
+
+
+def _created_delta(application):
+    return {
+        'applications': 1,
+        f"status.{application.get('status', 'pending')}": 1,
+        'bid_total': _bid(application),
+        f"daily.{_day(application.get('created_at') or datetime.utcnow())}": 1,
+    }
+
+
+def _status_delta(bid, old, new):
+    delta = {f'status.{old}': -1, f'status.{new}': 1}
+    if new == 'accepted':
+        delta['accepted_bid_total'] = bid
+    elif old == 'accepted':
+        delta['accepted_bid_total'] = -bid
+    return delta
+
+
+def _add(target, delta):
+    for field, value in delta.items():
+        target[field] = target.get(field, 0) + value
+
+
+def _business_ids(campaign_ids):
+    from models.campaign import Campaign
+    campaigns = Campaign.find_by_ids(campaign_ids)
+    return {cid: c.get('business_id') for cid, c in campaigns.items() if c}
+
+
+def _empty():
+    return {'applications': 0, 'status': {s: 0 for s in STATUSES},
+            'bid_total': 0, 'accepted_bid_total': 0, 'daily': {}}
+
+
+def _fold(total, rollup):
+    """Add one rollup document's counters into total"""
+    for field in ('applications', 'bid_total', 'accepted_bid_total'):
+        total[field] += rollup.get(field, 0)
+    for status, n in (rollup.get('status') or {}).items():
+        total['status'][status] = total['status'].get(status, 0) + n
+    for day, n in (rollup.get('daily') or {}).items():
+        total['daily'][day] = total['daily'].get(day, 0) + n
+
+
+class Rollup:
+    @staticmethod
+    def _write(campaign_deltas, business_ids):
+        """Apply {campaign_id: delta} to both rollup collections"""
+        if not campaign_deltas:
+            return
+        db = get_db()
+        now = datetime.utcnow()
+        business_deltas = defaultdict(dict)
+        campaign_ops = []
+        for campaign_id, delta in campaign_deltas.items():
+            business_id = business_ids.get(campaign_id)
+            campaign_ops.append(UpdateOne(
+                {'_id': campaign_id},
+                {'$inc': delta, '$set': {'business_id': business_id, 'updated_at': now}},
+                upsert=True
+            ))
+            if business_id:
+                _add(business_deltas[business_id], delta)
+        db.campaign_rollups.bulk_write(campaign_ops, ordered=False)
+        if business_deltas:
+            db.business_rollups.bulk_write([
+                UpdateOne({'_id': business_id}, {'$inc': delta, '$set': {'updated_at': now}}, upsert=True)
+                for business_id, delta in business_deltas.items()
+            ], ordered=False)
+
+    @staticmethod
+    def record_created(application):
+        """Count a new application"""
+        campaign_id = application.get('campaign_id')
+        if not campaign_id:
+            return
+        try:
+            Rollup._write({campaign_id: _created_delta(application)}, _business_ids([campaign_id]))
+        except Exception:
+            logger.exception("Rollup update failed for new application on campaign %s", campaign_id)
+
+    @staticmethod
+    def record_status_changes(changes):
+        """
+        Move counts between statuses.
+        changes: list of (application, old_status, new_status); the
+        application needs campaign_id and bid_amount.
+        """
+        deltas = defaultdict(dict)
+        for app, old, new in changes:
+            if old == new or not app.get('campaign_id'):
+                continue
+            _add(deltas[app['campaign_id']], _status_delta(_bid(app), old, new))
+        if not deltas:
+            return
+        try:
+            Rollup._write(deltas, _business_ids(list(deltas)))
+        except Exception:
+            logger.exception("Rollup update failed for %d status changes", len(changes))
+
+    @staticmethod
+    def remove_campaign(campaign_id):
+        """Drop a deleted campaign's rollup and take its counts off its business"""
+        db = get_db()
+        rollup = db.campaign_rollups.find_one_and_delete({'_id': campaign_id})
+        if not rollup or not rollup.get('business_id'):
+            return
+        delta = {'applications': -rollup.get('applications', 0),
+                 'bid_total': -rollup.get('bid_total', 0),
+                 'accepted_bid_total': -rollup.get('accepted_bid_total', 0)}
+        for status, n in (rollup.get('status') or {}).items():
+            delta[f'status.{status}'] = -n
+        for day, n in (rollup.get('daily') or {}).items():
+            delta[f'daily.{day}'] = -n
+        db.business_rollups.update_one({'_id': rollup['business_id']}, {'$inc': delta})
+
+    @staticmethod
+    def for_business(business_id):
+        """(business rollup or None, campaign rollups for that business)"""
+        db = get_db()
+        business = db.business_rollups.find_one({'_id': business_id})
+        campaigns = list(db.campaign_rollups.find({'business_id': business_id}))
+        return business, campaigns
+
+    @staticmethod
+    def rebuild(batch_size=500):
+        """
+        Recompute every rollup from the applications collection, one batch
+        of campaigns per aggregation, then sum the campaign rollups into the
+        business rollups. Rollups of archived campaigns are left as they are.
+        Application writes made while the rebuild runs may be lost for the
+        campaign being recomputed, so run it when review traffic is low.
+        Returns (campaigns, businesses) rebuilt.
+        """
+        db = get_db()
+        rebuilt_at = datetime.utcnow()
+        campaigns_rebuilt = 0
+        last_id = None
+
+        while True:
+            query = {'_id': {'$gt': last_id}} if last_id else {}
+            batch = list(db.campaigns.find(query, {'business_id': 1}).sort('_id', 1).limit(batch_size))
+            if not batch:
+                break
+            last_id = batch[-1]['_id']
+            business_ids = {str(c['_id']): c.get('business_id') for c in batch}
+
+            totals = {campaign_id: _empty() for campaign_id in business_ids}
+            pipeline = [
+                {'$match': {'campaign_id': {'$in': list(business_ids)}}},
+                {'$group': {
+                    '_id': {
+                        'campaign_id': '$campaign_id',
+                        'status': {'$ifNull': ['$status', 'pending']},
+                        'day': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}},
+                    },
+                    'n': {'$sum': 1},
+                    'bids': {'$sum': {'$convert': {'input': '$bid_amount', 'to': 'double',
+                                                   'onError': 0, 'onNull': 0}}},
+                }},
+            ]
+            for r in db.applications.aggregate(pipeline, allowDiskUse=True):
+                key = r['_id']
+                status, day = key['status'], key.get('day')
+                bids = r['bids']
+                _fold(totals[key['campaign_id']], {
+                    'applications': r['n'],
+                    'status': {status: r['n']},
+                    'bid_total': bids,
+                    'accepted_bid_total': bids if status == 'accepted' else 0,
+                    'daily': {day: r['n']} if day else {},
+                })
+
+            db.campaign_rollups.bulk_write([
+                ReplaceOne({'_id': campaign_id},
+                           dict(total, business_id=business_ids[campaign_id], updated_at=rebuilt_at),
+                           upsert=True)
+                for campaign_id, total in totals.items()
+            ], ordered=False)
+            campaigns_rebuilt += len(totals)
+
+        businesses = Rollup._rebuild_businesses(db, rebuilt_at, batch_size)
+        return campaigns_rebuilt, businesses
+
+    @staticmethod
+    def _rebuild_businesses(db, rebuilt_at, batch_size):
+        totals = defaultdict(_empty)
+        for r in db.campaign_rollups.find({'business_id': {'$type': 'string'}}, {'updated_at': 0},
+                                          batch_size=batch_size):
+            _fold(totals[r['business_id']], r)
+        operations = [
+            ReplaceOne({'_id': business_id}, dict(total, updated_at=rebuilt_at), upsert=True)
+            for business_id, total in totals.items()
+        ]
+        for start in range(0, len(operations), batch_size):
+            db.business_rollups.bulk_write(operations[start:start + batch_size], ordered=False)
+        # Businesses whose campaigns are all gone
+        db.business_rollups.delete_many({'updated_at': {'$lt': rebuilt_at}})
+        return len(totals)
@@ -1,35 +1,106 @@
-from database import get_db
+from database import get_db, normalize_email
 from bson.objectid import ObjectId
 from datetime import datetime
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from models import loader
+import logging
+
+logger = logging.getLogger(__name__)
+
+# In-process indexes (search suggestions etc.) subscribe here to hear about
+# profile writes. Listeners are called as fn(user_id, fields) where fields
+# is the full document on create and only the changed fields on update.
+_change_listeners = []
+
+
+def _notify_change(user_id, fields):
+    for listener in _change_listeners:
+        try:
+            listener(user_id, fields)
+        except Exception:
+            logger.exception("User change listener failed")
+
 
 class User:
+    @staticmethod
+    def add_change_listener(listener):
+        _change_listeners.append(listener)
+
     @staticmethod
     def create_user(data):
         """
         Creates a new user (Creator or Business).
         data: dict containing user details.
+        Returns None if the email is already registered.
         """
         db = get_db()
         data['created_at'] = datetime.utcnow()
-        result = db.users.insert_one(data)
+        data['updated_at'] = data['created_at']
+        data['email_normalized'] = normalize_email(data.get('email'))
+        try:
+            result = db.users.insert_one(data)
+        except DuplicateKeyError:
+            return None
+        _notify_change(str(result.inserted_id), data)
         return str(result.inserted_id)
 
+    @staticmethod
+    def create_many(docs):
+        """
+        Insert many users with one unordered insert_many.
+        Returns (inserted, duplicates): the ids of the new users by
+        position in docs, and the positions rejected as already registered.
+        """
+        if not docs:
+            return {}, []
+        db = get_db()
+        now = datetime.utcnow()
+        for data in docs:
+            data['created_at'] = now
+            data['updated_at'] = now
+            data['email_normalized'] = normalize_email(data.get('email'))
+            data.setdefault('_id', ObjectId())
+        
+        failed = {}
+        try:
+            db.users.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for err in e.details.get('writeErrors', []):
+                failed[err['index']] = err.get('code')
+            others = [code for code in failed.values() if code != 11000]
+            if others:
+                raise
+        
+        inserted = {}
+        for i, data in enumerate(docs):
+            if i not in failed:
+                inserted[i] = str(data['_id'])
+                _notify_change(inserted[i], data)
+        return inserted, sorted(failed)
+
     @staticmethod
     def find_by_email(email):
         db = get_db()
-        return db.users.find_one({"email": email})
+        # email_normalized is backfilled for older accounts by ensure_indexes
+        return db.users.find_one({"email_normalized": normalize_email(email)})
 
     @staticmethod
     def find_by_id(user_id):
-        db = get_db()
-        if not ObjectId.is_valid(user_id):
-            return None
-        return db.users.find_one({"_id": ObjectId(user_id)})
+        # Repeat lookups within a request are served from the identity map
+        return loader.load('users', user_id)
+
+    @staticmethod
+    def find_by_ids(user_ids):
+        """Resolve several users with one $in query, keyed by string id"""
+        return loader.load_many('users', user_ids)
 
     @staticmethod
     def update_user(user_id, updates):
         db = get_db()
+        updates['updated_at'] = datetime.utcnow()
         db.users.update_one({"_id": ObjectId(user_id)}, {"$set": updates})
+        loader.evict('users', user_id)
+        _notify_change(str(user_id), updates)
 
     # Specific to Business
     @staticmethod
@@ -0,0 +1,334 @@
+"""
+Bulk onboarding of creators and businesses from NDJSON or CSV.
+
+Records are parsed one at a time from the upload stream and validated and
+normalised (categories, social handles, package prices), then handled in
+chunks of ONBOARD_CHUNK_SIZE. For each chunk the passwords are hashed in
+parallel on a process pool (ONBOARD_HASH_WORKERS, default one per CPU,
+started through a forkserver on first use), and
+the users are written with one unordered insert_many. The unique
+email_normalized index reports addresses that are already registered,
+including repeats within the same file.
+
+CSV columns are the user fields; nested ones use dotted names
+(social_links.instagram). service_packages may be a JSON list or
+"name:price|name:price".
+"""
+
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import generate_password_hash
+
+logger = logging.getLogger(__name__)
+
+ONBOARD_CHUNK_SIZE = int(os.getenv("ONBOARD_CHUNK_SIZE", "1000"))
+ONBOARD_HASH_WORKERS = int(os.getenv("ONBOARD_HASH_WORKERS", "0")) or os.cpu_count() or 1
+# Rejected rows listed in the report; the counts always cover every row
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = ('ndjson', 'csv')
+ROLES = ('creator', 'business')
+CATEGORIES = ['tech', 'lifestyle', 'fashion', 'fitness', 'food', 'travel', 'entertainment',
+              'gaming', 'beauty', 'education', 'music', 'other']
+BUSINESS_TYPES = ['tech', 'fashion', 'food', 'beauty', 'fitness', 'travel', 'entertainment',
+                  'finance', 'retail', 'agency', 'other']
+PLATFORMS = ['instagram', 'tiktok', 'youtube', 'twitter']
+PLATFORM_HOSTS = re.compile(
+    r'^(https?://)?(www\.)?(instagram\.com|tiktok\.com|youtube\.com|twitter\.com|x\.com)/(@)?',
+    re.IGNORECASE
+)
+HANDLE = re.compile(r'^@[\w.\-]{1,64}$', re.UNICODE)
+EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+MIN_PASSWORD_LENGTH = 6
+
+CREATOR_FIELDS = ('bio',)
+BUSINESS_FIELDS = ('description', 'industry', 'logo_url', 'banner_url')
+
+
+def parse_ndjson(stream):
+    """Yield (line_number, record or None, error or None) from a text stream"""
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f"invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, "each line must be a JSON object"
+            continue
+        yield line_no, record, None
+
+
+def parse_csv(stream):
+    """Same as parse_ndjson; dotted headers become nested dicts"""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        record = {}
+        for column, value in row.items():
+            if column is None or value is None or value.strip() == '':
+                continue
+            target = record
+            *parents, leaf = column.strip().split('.')
+            for part in parents:
+                target = target.setdefault(part, {})
+            target[leaf] = value.strip()
+        yield reader.line_num, record, None
+
+
+def parse(stream, fmt):
+    return parse_csv(stream) if fmt == 'csv' else parse_ndjson(stream)
+
+
+def normalize_handle(platform, value):
+    """'https://instagram.com/jane', 'jane' and '@jane' all become '@jane'"""
+    handle = PLATFORM_HOSTS.sub('', str(value).strip()).strip('/').split('?')[0]
+    if not handle.startswith('@'):
+        handle = '@' + handle
+    if not HANDLE.match(handle):
+        raise ValueError(f"invalid {platform} handle")
+    return handle
+
+
+def normalize_price(value):
+    """Numbers or strings like '$1,200' / '1200.50'; must not be negative"""
+    if isinstance(value, bool):
+        raise ValueError("invalid price")
+    if isinstance(value, str):
+        value = value.strip().lstrip('$').replace(',', '')
+    price = float(value)
+    if price < 0 or price != price or price == float('inf'):
+        raise ValueError("invalid price")
+    return int(price) if price.is_integer() else round(price, 2)
+
+
+def _packages(value):
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith('['):
+            value = json.loads(value)
+        else:
+            items = []
+            for part in value.split('|'):
+                name, _, price = part.rpartition(':')
+                items.append({'name': name.strip(), 'price': price})
+            value = items
+    if not isinstance(value, list):
+        raise ValueError("service_packages must be a list")
+    packages = []
+    for pkg in value:
+        if not isinstance(pkg, dict) or not str(pkg.get('name', '')).strip():
+            raise ValueError("each service package needs a name")
+        packages.append({
+            'name': str(pkg['name']).strip(),
+            'price': normalize_price(pkg.get('price', 0)),
+            'description': str(pkg.get('description', '')).strip(),
+        })
+    return packages
+
+
+def validate(record, default_role=None):
+    """
+    Returns (user document without a password hash, password, errors).
+    The document is None when there are errors.
+    """
+    errors = []
+    email = str(record.get('email', '')).strip()
+    if not EMAIL.match(email):
+        errors.append("invalid email")
+    password = record.get('password')
+    if not isinstance(password, str) or len(password) < MIN_PASSWORD_LENGTH:
+        errors.append(f"password must be at least {MIN_PASSWORD_LENGTH} characters")
+    role = str(record.get('role') or default_role or '').strip().lower()
+    if role not in ROLES:
+        errors.append("role must be creator or business")
+    name = str(record.get('name', '')).strip()
+    if not name:
+        errors.append("name is required")
+
+    doc = {'email': email, 'role': role, 'name': name}
+
+    if role == 'creator':
+        category = str(record.get('category', '')).strip().lower()
+        if category not in CATEGORIES:
+            errors.append(f"category must be one of: {', '.join(CATEGORIES)}")
+        doc['category'] = category
+
+        try:
+            followers = int(float(str(record.get('followers', 0)).replace(',', '')))
+            if followers < 0:
+                raise ValueError
+            doc['followers'] = followers
+        except ValueError:
+            errors.append("followers must be a non-negative number")
+
+        links = record.get('social_links') or record.get('social_handles') or {}
+        if not isinstance(links, dict):
+            errors.append("social_links must be an object")
+            links = {}
+        doc['social_links'] = {}
+        for platform, value in links.items():
+            platform = str(platform).strip().lower()
+            if platform not in PLATFORMS:
+                errors.append(f"unknown platform {platform}")
+            elif value:
+                try:
+                    doc['social_links'][platform] = normalize_handle(platform, value)
+                except ValueError as e:
+                    errors.append(str(e))
+
+        try:
+            doc['service_packages'] = _packages(record.get('service_packages', []))
+        except (ValueError, TypeError) as e:
+            errors.append(f"service_packages: {e}")
+
+        doc.update({k: str(record[k]).strip() for k in CREATOR_FIELDS if record.get(k)})
+        doc.update({'portfolio': [], 'average_rating': 0, 'review_count': 0})
+
+    elif role == 'business':
+        business_type = str(record.get('business_type', 'other')).strip().lower()
+        if business_type not in BUSINESS_TYPES:
+            errors.append(f"business_type must be one of: {', '.join(BUSINESS_TYPES)}")
+        doc['business_type'] = business_type
+        doc.update({k: str(record[k]).strip() for k in BUSINESS_FIELDS if record.get(k)})
+
+    if errors:
+        return None, None, errors
+    return doc, password, []
+
+
+_pool = None
+_pool_pid = None
+
+
+def _hash_pool():
+    """
+    Per-process executor. Web workers run threads (Mongo monitors, job
+    runners), so hash workers come from a forkserver, or are spawned,
+    rather than forked from the worker itself.
+    """
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        _pool = ProcessPoolExecutor(max_workers=ONBOARD_HASH_WORKERS, mp_context=context)
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def hash_passwords(passwords):
+    if ONBOARD_HASH_WORKERS <= 1 or len(passwords) < 2:
+        return [generate_password_hash(p) for p in passwords]
+    chunksize = max(1, len(passwords) // (ONBOARD_HASH_WORKERS * 4))
+    return list(_hash_pool().map(generate_password_hash, passwords, chunksize=chunksize))
+
+
+class ImportReport:
+    def __init__(self):
+        self.received = 0
+        self.valid = 0
+        self.imported = 0
+        self.invalid = 0
+        self.duplicates = 0
+        self.errors = []
+        self.hash_seconds = 0.0
+        self.write_seconds = 0.0
+        self.started = time.perf_counter()
+
+    def reject(self, line, email, reasons):
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'email': email, 'errors': reasons})
+
+    def as_dict(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            'received': self.received,
+            'valid': self.valid,
+            'imported': self.imported,
+            'invalid': self.invalid,
+            'duplicates': self.duplicates,
+            'errors': self.errors,
+            'errors_truncated': self.invalid + self.duplicates > len(self.errors),
+            'seconds': round(elapsed, 3),
+            'hash_seconds': round(self.hash_seconds, 3),
+            'write_seconds': round(self.write_seconds, 3),
+            'users_per_second': round(self.imported / elapsed, 1) if elapsed else None,
+        }
+
+
+def import_users(records, default_role=None, chunk_size=ONBOARD_CHUNK_SIZE, dry_run=False):
+    """
+    Validate, hash and insert (line, record, parse_error) tuples as produced
+    by parse(). With dry_run nothing is hashed or written.
+    Returns an ImportReport.
+    """
+    from models.user import User
+
+    report = ImportReport()
+    chunk = []
+
+    def flush():
+        if not chunk or dry_run:
+            chunk.clear()
+            return
+        started = time.perf_counter()
+        hashes = hash_passwords([password for _, _, password in chunk])
+        report.hash_seconds += time.perf_counter() - started
+
+        docs = []
+        for (_, doc, _), hashed in zip(chunk, hashes):
+            doc['password'] = hashed
+            docs.append(doc)
+        started = time.perf_counter()
+        inserted, duplicates = User.create_many(docs)
+        report.write_seconds += time.perf_counter() - started
+
+        report.imported += len(inserted)
+        report.duplicates += len(duplicates)
+        for i in duplicates:
+            line, doc, _ = chunk[i]
+            report.reject(line, doc['email'], ["email already registered"])
+        chunk.clear()
+
+    for line, record, parse_error in records:
+        report.received += 1
+        if parse_error:
+            report.invalid += 1
+            report.reject(line, None, [parse_error])
+            continue
+        doc, password, errors = validate(record, default_role)
+        if errors:
+            report.invalid += 1
+            report.reject(line, record.get('email'), errors)
+            continue
+        report.valid += 1
+        chunk.append((line, doc, password))
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+    if dry_run:
+        report.imported = 0
+    return report
+
+
+def import_stream(binary_stream, fmt, default_role=None, chunk_size=ONBOARD_CHUNK_SIZE, dry_run=False):
+    """import_users over an uploaded or opened binary stream"""
+    text = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+    return import_users(parse(text, fmt), default_role, chunk_size, dry_run)
@@ -0,0 +1,164 @@
+"""
+Opt-in per-request profiling.
+
+A request is profiled when it carries the header `X-Profile: <PROFILE_TOKEN>`
+or is picked by PROFILE_SAMPLE_RATE (0.0-1.0). Two modes are available:
+
+- sample (default): a background thread samples the request thread's stack
+  every PROFILE_INTERVAL_MS and writes collapsed stacks
+  (`frame;frame;frame count`), ready for flamegraph.pl or speedscope.
+- cprofile: deterministic cProfile, written as a pstats `.prof` file.
+  Choose it per request with `X-Profile-Mode: cprofile`.
+
+Profiles land in PROFILE_DIR/<route>/ and only the newest
+PROFILE_MAX_PER_ROUTE files per route are kept.
+"""
+
+import cProfile
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sample")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+PROFILE_MAX_PER_ROUTE = int(os.getenv("PROFILE_MAX_PER_ROUTE", "20"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class CProfileRecorder:
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+
+def _route_dir(rule):
+    name = re.sub(r'[^A-Za-z0-9_.-]+', '_', rule).strip('_') or 'root'
+    return os.path.join(PROFILE_DIR, name)
+
+
+def _prune(directory, keep):
+    files = sorted(
+        (os.path.join(directory, f) for f in os.listdir(directory)),
+        key=os.path.getmtime
+    )
+    for path in files[:-keep] if keep > 0 else files:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def save_profile(rule, recorder, duration):
+    """Write a finished profile under its route directory and apply retention"""
+    directory = _route_dir(rule)
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    base = f"{stamp}-{int(duration * 1000)}ms-{os.getpid()}"
+
+    if isinstance(recorder, StackSampler):
+        path = os.path.join(directory, base + ".collapsed")
+        with open(path, 'w') as f:
+            f.write(recorder.collapsed())
+    else:
+        path = os.path.join(directory, base + ".prof")
+        recorder.profile.dump_stats(path)
+
+    _prune(directory, PROFILE_MAX_PER_ROUTE)
+    return path
+
+
+def _wants_profile(request):
+    header = request.headers.get('X-Profile')
+    if header and PROFILE_TOKEN and hmac.compare_digest(header, PROFILE_TOKEN):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def init_app(app):
+    """Install the profiling hooks; they cost nothing unless enabled"""
+    if not PROFILE_TOKEN and PROFILE_SAMPLE_RATE <= 0:
+        return
+
+    from flask import g, request
+
+    @app.before_request
+    def _start_profile():
+        if not _wants_profile(request):
+            return
+        mode = request.headers.get('X-Profile-Mode', PROFILE_MODE)
+        if mode == 'cprofile':
+            recorder = CProfileRecorder()
+        else:
+            recorder = StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+        g._profile = (recorder, time.perf_counter())
+        recorder.start()
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = g.pop('_profile', None)
+        if profile is None:
+            return response
+        recorder, started = profile
+        recorder.stop()
+        rule = request.url_rule.rule if request.url_rule else 'unmatched'
+        try:
+            path = save_profile(f"{request.method} {rule}", recorder, time.perf_counter() - started)
+            response.headers['X-Profile-Id'] = os.path.relpath(path, PROFILE_DIR)
+        except OSError as e:
+            logger.warning("Could not save profile: %s", e)
+        return response
+
+    @app.teardown_request
+    def _abandon_profile(exc):
+        # after_request does not run when the view raised
+        profile = g.pop('_profile', None)
+        if profile is not None:
+            profile[0].stop()
@@ -0,0 +1,286 @@
+"""
+Admission control for expensive endpoints.
+
+Every endpoint belongs to a route class (see ROUTE_CLASSES). A class can have
+
+- a per-client token bucket: `burst` requests, refilled at `burst / period`
+  per second. Exhausted buckets get 429 with Retry-After.
+- a global concurrency limit: at most `concurrency` requests of the class in
+  flight across all worker processes. Extra requests are shed with 503
+  instead of queueing, so cheap routes keep their workers.
+
+State is shared between gunicorn workers through a local SQLite file
+(token buckets) and per-slot lock files (concurrency), both under
+RATE_LIMIT_DIR. Lock files are released by the OS if a worker dies.
+Override limits with RATE_LIMIT_<CLASS>="burst/period_seconds" and
+CONCURRENCY_<CLASS>=N; 0 disables a limit.
+
+Clients are told apart by address. Behind a reverse proxy or platform
+router (Render, Railway, Heroku, nginx) every request arrives from the
+proxy, so set TRUST_PROXY to the number of proxies in front of the app
+(true means 1): the address is then taken from X-Forwarded-For through
+werkzeug's ProxyFix, counting that many hops from the right so clients
+cannot spoof it. Without it all clients share one bucket.
+"""
+
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from instrumentation import counter
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: fall back to per-process limits
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_DIR = os.getenv("RATE_LIMIT_DIR", os.path.join(tempfile.gettempdir(), "linkfluence-ratelimit"))
+
+def _proxy_hops(value):
+    """TRUST_PROXY as a number of proxies: false/0 none, true 1, or N"""
+    value = (value or '').strip().lower()
+    if value in ('true', 'yes'):
+        return 1
+    try:
+        return max(int(value), 0)
+    except ValueError:
+        return 0
+
+
+TRUST_PROXY = _proxy_hops(os.getenv("TRUST_PROXY", "false"))
+# Logins hash passwords on the CPU; allow a couple per core across workers
+AUTH_CONCURRENCY = max(8, 2 * (os.cpu_count() or 1))
+
+# class -> burst, period (seconds), concurrency
+ROUTE_CLASSES = {
+    'auth': {'burst': 10, 'period': 60, 'concurrency': AUTH_CONCURRENCY},
+    'search': {'burst': 30, 'period': 30, 'concurrency': 8},
+    'write': {'burst': 120, 'period': 60, 'concurrency': 0},
+    # Streaming exports hold a worker for the whole download
+    'export': {'burst': 10, 'period': 60, 'concurrency': 2},
+    # Bulk imports keep the hashing pool busy
+    'import': {'burst': 5, 'period': 60, 'concurrency': 1},
+    'default': {'burst': 0, 'period': 0, 'concurrency': 0},
+}
+
+# endpoint -> class; anything not listed is 'write' for mutating methods
+# and 'default' otherwise
+ENDPOINT_CLASSES = {
+    'auth.login': 'auth',
+    'auth.register': 'auth',
+    'creators.search_creators': 'search',
+    'businesses.search_businesses': 'search',
+    'businesses.get_recommendations': 'search',
+    'creators.get_similar_creators': 'search',
+    'applications.export_campaign_applications': 'export',
+    'messages.export_conversation': 'export',
+    'creators.export_creator_analytics': 'export',
+    'auth.bulk_import': 'import',
+}
+
+SHED = counter('linkfluence_shed_requests_total', 'Requests rejected by admission control',
+               ('route_class', 'reason'))
+
+
+def _load_overrides():
+    for name, limits in ROUTE_CLASSES.items():
+        rate = os.getenv(f"RATE_LIMIT_{name.upper()}")
+        if rate:
+            burst, _, period = rate.partition('/')
+            try:
+                burst, period = int(burst), float(period or 60)
+            except ValueError:
+                burst = period = -1
+            # The bucket refills at burst / period, so a limit needs a positive period
+            if burst == 0 or (burst > 0 and period > 0):
+                limits['burst'], limits['period'] = burst, period
+            else:
+                logger.warning("Ignoring RATE_LIMIT_%s=%r (expected burst/seconds with a positive period)",
+                               name.upper(), rate)
+        concurrency = os.getenv(f"CONCURRENCY_{name.upper()}")
+        if concurrency:
+            try:
+                limits['concurrency'] = int(concurrency)
+            except ValueError:
+                logger.warning("Ignoring CONCURRENCY_%s=%r (expected an integer)", name.upper(), concurrency)
+
+
+_load_overrides()
+
+
+def route_class(endpoint, method):
+    if endpoint in ENDPOINT_CLASSES:
+        return ENDPOINT_CLASSES[endpoint]
+    return 'write' if method in ('POST', 'PUT', 'PATCH', 'DELETE') else 'default'
+
+
+class TokenBucketStore:
+    """Token buckets kept in a SQLite file shared by all worker processes"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS buckets ("
+                     "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, burst, rate, now=None):
+        """
+        Try to take one token. Returns (allowed, retry_after_seconds).
+        """
+        now = now if now is not None else time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                         (key, tokens, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+    def purge(self, older_than):
+        """Drop buckets idle long enough to be full again"""
+        self._conn().execute("DELETE FROM buckets WHERE updated < ?", (older_than,))
+
+
+class ConcurrencyLimiter:
+    """
+    Cross-process semaphore: one lock file per slot, claimed with a
+    non-blocking flock. Falls back to a threading semaphore without fcntl.
+    """
+
+    def __init__(self, directory, name, slots):
+        self.slots = slots
+        self.paths = [os.path.join(directory, f"{name}.{i}.lock") for i in range(slots)]
+        self._fallback = threading.BoundedSemaphore(slots) if fcntl is None else None
+
+    def try_acquire(self):
+        if self._fallback is not None:
+            return self._fallback if self._fallback.acquire(blocking=False) else None
+        for path in self.paths:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except OSError:
+                os.close(fd)
+        return None
+
+    def release(self, slot):
+        if self._fallback is not None:
+            slot.release()
+            return
+        try:
+            fcntl.flock(slot, fcntl.LOCK_UN)
+        finally:
+            os.close(slot)
+
+
+class AdmissionController:
+    def __init__(self, directory=RATE_LIMIT_DIR, classes=None):
+        os.makedirs(directory, exist_ok=True)
+        self.classes = classes or ROUTE_CLASSES
+        self.buckets = TokenBucketStore(os.path.join(directory, "buckets.sqlite3"))
+        self.limiters = {
+            name: ConcurrencyLimiter(directory, name, limits['concurrency'])
+            for name, limits in self.classes.items() if limits.get('concurrency')
+        }
+        self._last_purge = 0.0
+
+    def check_rate(self, cls, client):
+        """Returns seconds to wait, or None if the request may proceed"""
+        limits = self.classes.get(cls, {})
+        if not limits.get('burst'):
+            return None
+        now = time.time()
+        if now - self._last_purge > 300:
+            self._last_purge = now
+            self.buckets.purge(now - max(l.get('period') or 0 for l in self.classes.values()) - 60)
+        allowed, retry_after = self.buckets.take(
+            f"{cls}:{client}", limits['burst'], limits['burst'] / limits['period'], now
+        )
+        return None if allowed else retry_after
+
+    def acquire_slot(self, cls):
+        """Returns (limiter, slot); slot is None when the class is saturated"""
+        limiter = self.limiters.get(cls)
+        if limiter is None:
+            return None, None
+        return limiter, limiter.try_acquire()
+
+
+def client_id(request):
+    # remote_addr already comes from X-Forwarded-For when TRUST_PROXY is set
+    return request.remote_addr or 'unknown'
+
+
+def init_app(app, controller=None):
+    """Reject over-limit requests before they reach the view"""
+    if TRUST_PROXY:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUST_PROXY)
+    if not RATE_LIMIT_ENABLED:
+        return
+    from flask import g, jsonify, request
+
+    controller = controller or AdmissionController()
+
+    @app.before_request
+    def _admit():
+        if request.endpoint is None or request.method == 'OPTIONS':
+            return None
+        cls = route_class(request.endpoint, request.method)
+
+        try:
+            retry_after = controller.check_rate(cls, client_id(request))
+        except sqlite3.Error as e:
+            # Never fail requests because the limiter store is unavailable
+            logger.warning("Rate limiter store error: %s", e)
+            retry_after = None
+        if retry_after is not None:
+            SHED.inc(route_class=cls, reason='rate_limited')
+            response = jsonify({"error": "Too many requests, please slow down"})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+            return response
+
+        limiter, slot = controller.acquire_slot(cls)
+        if limiter is None:
+            return None
+        if slot is None:
+            SHED.inc(route_class=cls, reason='overloaded')
+            response = jsonify({"error": "Server busy, please retry shortly"})
+            response.status_code = 503
+            response.headers['Retry-After'] = '1'
+            return response
+        g._admission_slot = (limiter, slot)
+        return None
+
+    @app.teardown_request
+    def _release(exc):
+        held = g.pop('_admission_slot', None)
+        if held is not None:
+            limiter, slot = held
+            limiter.release(slot)
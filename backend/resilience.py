@@ -0,0 +1,305 @@
+"""
+Query deadlines and a database circuit breaker.
+
+Every request runs under the deadline of its route class (the classes in
+ratelimit.ROUTE_CLASSES). The deadline is applied with pymongo.timeout(),
+so each Mongo operation in the request gets a maxTimeMS and socket
+timeout no later than the deadline, and fails with a timeout error instead
+of holding the worker. Override with DEADLINE_<CLASS>=seconds; 0 means no
+deadline (exports and imports stream for as long as they need).
+
+The circuit breaker watches the outcome of requests that have a deadline
+and called get_db(); requests answered without the database (from a
+cache) are not counted, and cannot close the breaker as its probe. A
+request fails when the database times out or cannot be reached, and is
+slow when its Mongo commands took longer than BREAKER_SLOW_SECONDS in
+total (time spent hashing passwords or rendering does not count; see
+instrumentation.RequestStats.db_seconds). Once at least
+BREAKER_MIN_CALLS of the last BREAKER_WINDOW requests were recorded and
+the share of failed or slow ones reaches BREAKER_FAILURE_RATE, the breaker
+opens for BREAKER_OPEN_SECONDS. While it is open, get_db() raises
+DatabaseUnavailable right away and the request gets 503 with Retry-After,
+unless the view can answer from a cache (see cached()). After that one
+request at a time is let through as a probe; it closes the breaker if it
+succeeds and reopens it if it fails. State is per worker process.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+import pymongo
+from pymongo.errors import ConnectionFailure, ExecutionTimeout, PyMongoError
+
+from instrumentation import REGISTRY, counter, current_stats, gauge
+from ratelimit import ROUTE_CLASSES, route_class
+
+logger = logging.getLogger(__name__)
+
+BREAKER_ENABLED = os.getenv("BREAKER_ENABLED", "true").lower() in ("1", "true", "yes")
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_SLOW_SECONDS = float(os.getenv("BREAKER_SLOW_SECONDS", "2"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "10"))
+
+# Route class -> seconds a request may spend on Mongo; 0 = no deadline
+DEFAULT_DEADLINES = {
+    'auth': 5,
+    'search': 3,
+    'write': 5,
+    'export': 0,
+    'import': 0,
+    'default': 5,
+}
+
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+DB_UNAVAILABLE = counter('linkfluence_db_unavailable_total',
+                         'Requests answered 503 because the database was unavailable',
+                         ('route_class', 'reason'))
+BREAKER_STATE = gauge('linkfluence_circuit_breaker_state', 'Circuit breaker state (0 closed, 1 half-open, 2 open)',
+                      ('breaker',))
+BREAKER_TRANSITIONS = counter('linkfluence_circuit_breaker_transitions_total', 'Circuit breaker state changes',
+                              ('breaker', 'state'))
+
+
+class DatabaseUnavailable(PyMongoError):
+    """Raised instead of touching the database while the breaker is open"""
+
+    def __init__(self, retry_after):
+        super().__init__("Database circuit breaker is open")
+        self.retry_after = retry_after
+
+
+# Errors that mean the database is slow or unreachable, as opposed to a
+# bad query or a duplicate key
+UNAVAILABLE_ERRORS = (ConnectionFailure, ExecutionTimeout)
+
+
+def _load_deadlines():
+    deadlines = dict(DEFAULT_DEADLINES)
+    for cls in ROUTE_CLASSES:
+        value = os.getenv(f"DEADLINE_{cls.upper()}")
+        if value:
+            try:
+                deadlines[cls] = float(value)
+            except ValueError:
+                logger.warning("Ignoring DEADLINE_%s=%r (expected seconds)", cls.upper(), value)
+    return deadlines
+
+
+DEADLINES = _load_deadlines()
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker over a window of recent outcomes"""
+
+    def __init__(self, name, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                 failure_rate=BREAKER_FAILURE_RATE, open_seconds=BREAKER_OPEN_SECONDS, clock=time.monotonic):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self._clock = clock
+        self._outcomes = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        # Caller holds the lock
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    def _transition(self, state):
+        # Caller holds the lock
+        self._state = state
+        if state == OPEN:
+            self._opened_at = self._clock()
+        self._probing = False
+        self._outcomes.clear()
+        BREAKER_TRANSITIONS.inc(breaker=self.name, state=state)
+        log = logger.warning if state == OPEN else logger.info
+        log("Circuit breaker %s is now %s", self.name, state)
+
+    def allow(self):
+        """
+        (allowed, probe). probe is True for the single request let through
+        while half-open; it must be finished with record() or release().
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True, False
+            if state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True, True
+            return False, False
+
+    def retry_after(self):
+        with self._lock:
+            if self._state != OPEN:
+                return 1
+            return max(1, int(self.open_seconds - (self._clock() - self._opened_at) + 0.999))
+
+    def record(self, ok, probe=False):
+        with self._lock:
+            if probe:
+                self._transition(CLOSED if ok else OPEN)
+                return
+            if self._state != CLOSED:
+                return
+            self._outcomes.append(ok)
+            calls = len(self._outcomes)
+            if calls >= self.min_calls:
+                failures = calls - sum(self._outcomes)
+                if failures / calls >= self.failure_rate:
+                    self._transition(OPEN)
+
+    def release(self, probe):
+        """Finish a call without an outcome, e.g. one that failed for other reasons"""
+        if probe:
+            with self._lock:
+                self._probing = False
+
+
+breaker = CircuitBreaker('mongo')
+_MISSING = object()
+# Set for requests the breaker turned away; get_db() checks it
+_refused = ContextVar('linkfluence_breaker_refused', default=None)
+# time.monotonic() at which the current request's deadline passes
+_deadline_at = ContextVar('linkfluence_deadline_at', default=None)
+
+
+def remaining():
+    """Seconds left before the current request's deadline, or None"""
+    deadline_at = _deadline_at.get()
+    return None if deadline_at is None else deadline_at - time.monotonic()
+
+
+def check_available():
+    """
+    Raise DatabaseUnavailable if this request must not touch the database;
+    otherwise note that it does, so the breaker counts its outcome.
+    """
+    retry_after = _refused.get()
+    if retry_after is not None:
+        raise DatabaseUnavailable(retry_after)
+    _mark_used()
+
+
+def cached(cache, key, compute):
+    """
+    cache.get_or_compute(key, compute), answering from an expired entry
+    (within the cache's stale_ttl) if the database is unavailable.
+    """
+    try:
+        return cache.get_or_compute(key, compute)
+    except (DatabaseUnavailable,) + UNAVAILABLE_ERRORS as e:
+        if not isinstance(e, DatabaseUnavailable):
+            _mark_failed()
+        stale = cache.get_stale(key, _MISSING)
+        if stale is _MISSING:
+            raise
+        return stale
+
+
+def _mark_failed():
+    from flask import g, has_request_context
+    if has_request_context():
+        g._db_failed = True
+
+
+def _mark_used():
+    from flask import g, has_request_context
+    if has_request_context():
+        g._db_used = True
+
+
+def collect_metrics():
+    BREAKER_STATE.set(STATE_VALUES[breaker.state], breaker=breaker.name)
+
+
+REGISTRY.add_collector(collect_metrics)
+
+
+def init_app(app):
+    """Run requests under their class deadline and behind the breaker"""
+    from flask import g, jsonify, request
+
+    def _unavailable(cls, reason, retry_after):
+        DB_UNAVAILABLE.inc(route_class=cls, reason=reason)
+        response = jsonify({"error": "Service temporarily unavailable, please retry shortly"})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+
+    @app.before_request
+    def _start_deadline():
+        if request.endpoint is None or request.method == 'OPTIONS':
+            return
+        cls = route_class(request.endpoint, request.method)
+        deadline = DEADLINES.get(cls, DEADLINES['default'])
+        g._route_class = cls
+        if not deadline:
+            return
+        timeout = pymongo.timeout(deadline)
+        timeout.__enter__()
+        g._deadline = (timeout, _deadline_at.set(time.monotonic() + deadline))
+
+        if BREAKER_ENABLED:
+            allowed, probe = breaker.allow()
+            if allowed:
+                g._breaker_call = (current_stats(), probe)
+            else:
+                g._breaker_refused = _refused.set(breaker.retry_after())
+
+    @app.errorhandler(DatabaseUnavailable)
+    def _circuit_open(e):
+        return _unavailable(g.get('_route_class', 'default'), 'circuit_open', e.retry_after)
+
+    def _database_error(e):
+        _mark_failed()
+        reason = 'timeout' if e.timeout else 'connection'
+        logger.warning("Database unavailable during %s %s: %s", request.method, request.path, e)
+        return _unavailable(g.get('_route_class', 'default'), reason, breaker.retry_after())
+
+    for error in UNAVAILABLE_ERRORS:
+        app.register_error_handler(error, _database_error)
+
+    @app.teardown_request
+    def _finish_deadline(exc):
+        call = g.pop('_breaker_call', None)
+        if call is not None:
+            stats, probe = call
+            if g.pop('_db_failed', False):
+                breaker.record(False, probe)
+            elif not g.pop('_db_used', False):
+                # Answered without the database (e.g. from a cache): says
+                # nothing about its health, and must not close the breaker
+                breaker.release(probe)
+            elif exc is None:
+                db_seconds = stats.db_seconds if stats is not None else 0.0
+                breaker.record(db_seconds < BREAKER_SLOW_SECONDS, probe)
+            else:
+                breaker.release(probe)
+        token = g.pop('_breaker_refused', None)
+        if token is not None:
+            _refused.reset(token)
+        held = g.pop('_deadline', None)
+        if held is not None:
+            timeout, token = held
+            _deadline_at.reset(token)
+            timeout.__exit__(None, None, None)
@@ -2,6 +2,8 @@ from flask import Blueprint, request, jsonify
 from models.application import Application
 from models.notification import Notification
 from models.campaign import Campaign
+from models.user import User
+from exports import EXPORT_BATCH_SIZE, export_response, projection, requested_format
 
 applications_bp = Blueprint('applications', __name__)
 
@@ -51,20 +53,66 @@ def get_campaign_applications(campaign_id):
     return jsonify(applications)
 
 
+APPLICATION_EXPORT_FIELDS = ['_id', 'campaign_id', 'creator_id', 'creator_name', 'status',
+                             'bid_amount', 'cover_letter', 'created_at', 'updated_at']
+
+
+@applications_bp.route('/campaign/<campaign_id>/export', methods=['GET'])
+def export_campaign_applications(campaign_id):
+    """Stream a campaign's applicants as CSV (default) or ?format=ndjson"""
+    fmt = requested_format()
+    if fmt is None:
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    
+    cursor = Application.iter_by_campaign(campaign_id, projection(APPLICATION_EXPORT_FIELDS), EXPORT_BATCH_SIZE)
+    return export_response(cursor, APPLICATION_EXPORT_FIELDS, fmt, f'applications-{campaign_id}')
+
+
 @applications_bp.route('/creator/<creator_id>', methods=['GET'])
 def get_creator_applications(creator_id):
-    """Get all applications by a creator"""
+    """Get all applications by a creator, with their campaign and business"""
     applications = Application.find_by_creator(creator_id)
+    
+    # Campaigns and businesses behind them in one query each, closed
+    # campaigns included so their conversations stay reachable
+    campaigns = Campaign.find_by_ids(app.get('campaign_id') for app in applications)
+    businesses = User.find_by_ids(c.get('business_id') for c in campaigns.values())
+    for app in applications:
+        campaign = campaigns.get(app.get('campaign_id'))
+        if not campaign:
+            continue
+        app['campaign_title'] = campaign.get('title')
+        app['campaign_status'] = campaign.get('status')
+        app['business_id'] = campaign.get('business_id')
+        biz = businesses.get(campaign.get('business_id'))
+        if biz:
+            app['business_name'] = biz.get('name', 'Business')
     return jsonify(applications)
 
 
+VALID_STATUSES = ['pending', 'accepted', 'rejected']
+MAX_BATCH_SIZE = 1000
+
+
+def _status_notification(app, campaign, status):
+    """Build the notification a creator receives when their application changes"""
+    status_msg = 'accepted' if status == 'accepted' else 'was reviewed'
+    return {
+        'user_id': app['creator_id'],
+        'type': 'application_update',
+        'title': f'Application {status.capitalize()}',
+        'message': f"Your application for '{campaign.get('title', 'Campaign')}' {status_msg}!",
+        'campaign_id': app['campaign_id']
+    }
+
+
 @applications_bp.route('/<app_id>/status', methods=['PATCH'])
 def update_application_status(app_id):
     """Update application status (accept/reject)"""
     data = request.json
     status = data.get('status')
     
-    if status not in ['pending', 'accepted', 'rejected']:
+    if status not in VALID_STATUSES:
         return jsonify({'error': 'Invalid status. Must be: pending, accepted, or rejected'}), 400
     
     success = Application.update_status(app_id, status)
@@ -75,15 +123,47 @@ def update_application_status(app_id):
         if app:
             campaign = Campaign.find_by_id(app['campaign_id'])
             if campaign:
-                status_msg = 'accepted' if status == 'accepted' else 'was reviewed'
-                Notification.create({
-                    'user_id': app['creator_id'],
-                    'type': 'application_update',
-                    'title': f'Application {status.capitalize()}',
-                    'message': f"Your application for '{campaign.get('title', 'Campaign')}' {status_msg}!",
-                    'campaign_id': app['campaign_id']
-                })
+                Notification.create(_status_notification(app, campaign, status))
         
         return jsonify({'message': f'Application {status}'}), 200
     
     return jsonify({'error': 'Application not found'}), 404
+
+
+@applications_bp.route('/status', methods=['PATCH'])
+def update_application_statuses():
+    """
+    Update many application statuses at once.
+    Body: {"updates": [{"application_id": "...", "status": "accepted"}, ...]}
+    """
+    data = request.json or {}
+    updates = data.get('updates')
+    
+    if not isinstance(updates, list) or not updates:
+        return jsonify({'error': 'updates must be a non-empty list'}), 400
+    if len(updates) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'At most {MAX_BATCH_SIZE} updates per request'}), 400
+    
+    pairs = []
+    for item in updates:
+        if not isinstance(item, dict) or not item.get('application_id'):
+            return jsonify({'error': 'Each update needs an application_id'}), 400
+        if item.get('status') not in VALID_STATUSES:
+            return jsonify({'error': 'Invalid status. Must be: pending, accepted, or rejected'}), 400
+        pairs.append((str(item['application_id']), item['status']))
+    
+    results, changed = Application.update_status_many(pairs)
+    
+    # One campaign lookup and one notification insert for the whole batch
+    campaigns = Campaign.find_by_ids([app['campaign_id'] for app in changed])
+    notifications = []
+    for app in changed:
+        campaign = campaigns.get(app['campaign_id'])
+        if campaign:
+            notifications.append(_status_notification(app, campaign, app['status']))
+    Notification.create_many(notifications)
+    
+    return jsonify({
+        'results': results,
+        'updated': len(changed)
+    }), 200
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
 from models.user import User
+from onboarding import FORMATS as IMPORT_FORMATS, import_stream
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -13,7 +14,9 @@ def register():
     
     if not email or not password or not role:
         return jsonify({"error": "Missing required fields"}), 400
-        
+    
+    # Cheap indexed lookup so known duplicates skip the password hash; the
+    # unique email index still settles concurrent registrations
     if User.find_by_email(email):
         return jsonify({"error": "User already exists"}), 409
         
@@ -32,9 +35,32 @@ def register():
     }
     
     user_id = User.create_user(user_data)
+    if user_id is None:
+        return jsonify({"error": "User already exists"}), 409
     
     return jsonify({"message": "User created", "user_id": user_id}), 201
 
+@auth_bp.route('/import', methods=['POST'])
+def bulk_import():
+    """
+    Onboard many users from an NDJSON (default) or CSV body.
+    Query: format=ndjson|csv, role=creator|business for rows without one,
+    dry_run=true to validate only. Returns a per-row error report.
+    """
+    fmt = request.args.get('format')
+    if not fmt:
+        fmt = 'csv' if 'csv' in (request.content_type or '') else 'ndjson'
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+    role = request.args.get('role')
+    if role and role not in ('creator', 'business'):
+        return jsonify({"error": "role must be creator or business"}), 400
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+    
+    # Parsed as it arrives; the body is never held in memory as a whole
+    report = import_stream(request.stream, fmt, role, dry_run=dry_run)
+    return jsonify(report.as_dict()), 200
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     data = request.json
@@ -1,51 +1,107 @@
 from flask import Blueprint, request, jsonify
+from datetime import datetime, timedelta
+import os
 from models.user import User
+from models.campaign import Campaign
+from models.rollup import Rollup, STATUSES
+from cache import TTLCache
+from resilience import cached
 
 businesses_bp = Blueprint('businesses', __name__)
 
+SEARCH_LIMIT = 100
+ANALYTICS_MAX_DAYS = 365
+
+# Facet counts for the unfiltered view are the same for everyone
+facet_cache = TTLCache(ttl=float(os.getenv("FACET_CACHE_SECONDS", "60")), max_entries=16, name='business_facets')
+# Expired results are kept SEARCH_CACHE_STALE_SECONDS longer to answer
+# from while the database is unavailable
+search_cache = TTLCache(ttl=float(os.getenv("SEARCH_CACHE_SECONDS", "10")),
+                        max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2048")), name='business_search',
+                        stale_ttl=float(os.getenv("SEARCH_CACHE_STALE_SECONDS", "300")))
+
+
 @businesses_bp.route('/search', methods=['GET'])
 def search_businesses():
-    """Search businesses with text search and category filter"""
-    from database import get_db
-    db = get_db()
-    
+    """
+    Search businesses with text search and category filter.
+    With ?facets=true the response is {"results": [...], "facets": {...}}
+    with per-business_type counts from the same aggregation.
+    Responses are cached for SEARCH_CACHE_SECONDS per normalised query, and
+    served stale while the database is unavailable.
+    """
     category = request.args.get('category')
     q = request.args.get('q')  # Text search query
+    wants_facets = request.args.get('facets', '').lower() in ('1', 'true', 'yes')
     
-    query = {'role': 'business'}
-    
-    and_conditions = []
-    
-    # Text search filter (name, description, business_type)
-    if q and q.strip():
-        search_regex = {'$regex': q.strip(), '$options': 'i'}
-        and_conditions.append({'$or': [
-            {'name': search_regex},
-            {'description': search_regex},
-            {'business_type': search_regex}
-        ]})
-    
-    if category and category != 'all':
-        and_conditions.append({'business_type': category})
-    
-    if and_conditions:
-        query['$and'] = and_conditions
-    
-    businesses = list(db.users.find(query).limit(100))
-    
-    results = []
-    for b in businesses:
-        results.append({
-            '_id': str(b['_id']),
-            'name': b.get('name', 'Business'),
-            'email': b.get('email', ''),
-            'description': b.get('description', ''),
-            'business_type': b.get('business_type', 'other'),
-            'logo_url': b.get('logo_url', ''),
-            'banner_url': b.get('banner_url', '')
-        })
+    def run():
+        from database import get_db
+        db = get_db()
+        
+        query = {'role': 'business'}
+        
+        # Text search filter (name, description, business_type)
+        if q and q.strip():
+            search_regex = {'$regex': q.strip(), '$options': 'i'}
+            query['$or'] = [
+                {'name': search_regex},
+                {'description': search_regex},
+                {'business_type': search_regex}
+            ]
+        
+        category_condition = None
+        if category and category != 'all':
+            category_condition = {'business_type': category}
+        
+        businesses = None
+        facets = None
+        if wants_facets:
+            unfiltered = category_condition is None and '$or' not in query
+            facets = facet_cache.get('businesses') if unfiltered else None
+            if facets is None:
+                results_stages = [{'$match': category_condition}] if category_condition else []
+                pipeline = [
+                    {'$match': query},
+                    {'$facet': {
+                        'results': results_stages + [{'$limit': SEARCH_LIMIT}],
+                        # Counts ignore the selected category so every option shows its total
+                        'business_type': [{'$group': {'_id': '$business_type', 'count': {'$sum': 1}}}]
+                    }}
+                ]
+                raw = next(db.users.aggregate(pipeline), {})
+                facets = {'business_type': {
+                    str(r['_id']) if r['_id'] is not None else 'none': r['count']
+                    for r in raw.get('business_type', [])
+                }}
+                if unfiltered:
+                    facet_cache.set('businesses', facets)
+                businesses = raw.get('results', [])
+        
+        if businesses is None:
+            full_query = dict(query)
+            if category_condition:
+                full_query.update(category_condition)
+            businesses = list(db.users.find(full_query).limit(SEARCH_LIMIT))
+        
+        results = []
+        for b in businesses:
+            results.append({
+                '_id': str(b['_id']),
+                'name': b.get('name', 'Business'),
+                'email': b.get('email', ''),
+                'description': b.get('description', ''),
+                'business_type': b.get('business_type', 'other'),
+                'logo_url': b.get('logo_url', ''),
+                'banner_url': b.get('banner_url', '')
+            })
+        
+        if facets is not None:
+            return {'results': results, 'facets': facets}
+        return results
     
-    return jsonify(results)
+    key = (category if category and category != 'all' else None,
+           q.strip() if q and q.strip() else None, wants_facets)
+    return jsonify(cached(search_cache, key, run))
 
 @businesses_bp.route('/<user_id>', methods=['GET'])
 def get_business_profile(user_id):
@@ -58,9 +114,6 @@ def get_business_profile(user_id):
 
 @businesses_bp.route('/<user_id>', methods=['PUT'])
 def update_business_profile(user_id):
-    from bson.objectid import ObjectId
-    from app import mongo
-    
     data = request.json
     user = User.find_by_id(user_id)
     if not user or user.get('role') != 'business':
@@ -73,10 +126,7 @@ def update_business_profile(user_id):
             update_fields[field] = data[field]
     
     if update_fields:
-        mongo.db.users.update_one(
-            {'_id': ObjectId(user_id)},
-            {'$set': update_fields}
-        )
+        User.update_user(user_id, update_fields)
     
     return jsonify({"message": "Profile updated"})
 
@@ -114,3 +164,75 @@ def get_recommendations(user_id):
     results.sort(key=lambda x: x['match_score'], reverse=True)
     
     return jsonify(results)
+
+def _budget(campaign):
+    try:
+        return float(campaign.get('budget') or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _metrics(rollup, budget, dates):
+    """Counters of one rollup plus the rates derived from them"""
+    rollup = rollup or {}
+    counts = {s: (rollup.get('status') or {}).get(s, 0) for s in STATUSES}
+    decided = counts['accepted'] + counts['rejected']
+    accepted_bids = rollup.get('accepted_bid_total', 0)
+    daily = rollup.get('daily') or {}
+    return {
+        'applications': rollup.get('applications', 0),
+        **counts,
+        'acceptance_rate': round(counts['accepted'] / decided, 4) if decided else None,
+        'bid_total': rollup.get('bid_total', 0),
+        'accepted_bid_total': accepted_bids,
+        'budget': budget,
+        'budget_remaining': budget - accepted_bids,
+        'budget_used': round(accepted_bids / budget, 4) if budget else None,
+        'daily': [{'date': d, 'applications': daily.get(d, 0)} for d in dates],
+    }
+
+
+@businesses_bp.route('/<business_id>/analytics', methods=['GET'])
+def get_business_analytics(business_id):
+    """
+    Per-campaign and overall application metrics from the rollups.
+    ?days= (default 30) sets how many days of daily application counts
+    are returned, ending today (UTC).
+    """
+    try:
+        days = max(1, min(int(request.args.get('days', 30)), ANALYTICS_MAX_DAYS))
+    except ValueError:
+        return jsonify({"error": "days must be an integer"}), 400
+    
+    today = datetime.utcnow().date()
+    dates = [(today - timedelta(days=n)).isoformat() for n in range(days - 1, -1, -1)]
+    
+    business_rollup, campaign_rollups = Rollup.for_business(business_id)
+    rollups = {r['_id']: r for r in campaign_rollups}
+    
+    campaigns = []
+    total_budget = 0
+    for c in Campaign.find_by_business(business_id):
+        campaign_id = str(c['_id'])
+        budget = _budget(c)
+        total_budget += budget
+        campaigns.append({
+            'campaign_id': campaign_id,
+            'title': c.get('title', ''),
+            'status': c.get('status', 'active'),
+            **_metrics(rollups.pop(campaign_id, None), budget, dates)
+        })
+    # Rollups outlive archived campaigns, which still count in the totals
+    for campaign_id, rollup in rollups.items():
+        campaigns.append({
+            'campaign_id': campaign_id,
+            'title': None,
+            'status': 'archived',
+            **_metrics(rollup, 0, dates)
+        })
+    
+    return jsonify({
+        'business_id': business_id,
+        'totals': _metrics(business_rollup, total_budget, dates),
+        'campaigns': campaigns
+    })
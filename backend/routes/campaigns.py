@@ -1,9 +1,30 @@
 from flask import Blueprint, request, jsonify
-from models.campaign import Campaign
+from datetime import datetime, timezone
+from models.campaign import Campaign, CAMPAIGN_STATUSES
 from models.user import User
+from feed import feeds, register_listeners
 
 campaigns_bp = Blueprint('campaigns', __name__)
 
+register_listeners()
+
+FEED_PAGE_SIZE = 20
+MAX_FEED_PAGE_SIZE = 100
+
+
+def _parse_date(value):
+    """Parse an ISO date/datetime string as naive UTC; raises ValueError on bad input"""
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _serialize_dates(c):
+    for field in ('created_at', 'deadline', 'closed_at'):
+        if isinstance(c.get(field), datetime):
+            c[field] = c[field].isoformat()
+
 @campaigns_bp.route('/', methods=['POST'])
 def create_campaign():
     data = request.json
@@ -11,6 +32,12 @@ def create_campaign():
     required = ['business_id', 'title', 'description', 'budget']
     if not all(k in data for k in required):
         return jsonify({"error": "Missing fields"}), 400
+    
+    if data.get('deadline'):
+        try:
+            data['deadline'] = _parse_date(data['deadline'])
+        except (ValueError, AttributeError):
+            return jsonify({"error": "Invalid deadline"}), 400
         
     campaign_id = Campaign.create(data)
     return jsonify({"message": "Campaign created", "campaign_id": campaign_id}), 201
@@ -18,39 +45,92 @@ def create_campaign():
 @campaigns_bp.route('/', methods=['GET'])
 def get_campaigns():
     business_id = request.args.get('business_id')
-    print(f"[DEBUG] GET /campaigns - business_id: {business_id}")
     
-    if business_id:
-        campaigns = Campaign.find_by_business(business_id)
-        print(f"[DEBUG] Found {len(campaigns)} campaigns for business {business_id}")
-    else:
-        campaigns = Campaign.find_all()
-        print(f"[DEBUG] Found {len(campaigns)} total campaigns")
+    # Optional lifecycle filters: status, min_budget/max_budget,
+    # created_after/created_before, deadline_after/deadline_before
+    status = request.args.get('status')
+    if status == 'all':
+        status = None
+    if status and status not in CAMPAIGN_STATUSES:
+        return jsonify({"error": f"Invalid status. Must be one of: {', '.join(CAMPAIGN_STATUSES)}"}), 400
+    
+    filters = {'business_id': business_id, 'status': status}
+    parsers = {
+        'min_budget': float,
+        'max_budget': float,
+        'created_after': _parse_date,
+        'created_before': _parse_date,
+        'deadline_after': _parse_date,
+        'deadline_before': _parse_date,
+    }
+    for name, parse in parsers.items():
+        value = request.args.get(name)
+        if value:
+            try:
+                filters[name] = parse(value)
+            except ValueError:
+                return jsonify({"error": f"Invalid value for {name}"}), 400
+    
+    campaigns = Campaign.find_all(Campaign.build_query(**filters))
     
-    # Cache for business info to avoid repeated lookups
-    business_cache = {}
+    # All businesses behind the page in one query
+    businesses = User.find_by_ids(c.get('business_id') for c in campaigns)
     
     for c in campaigns:
         c['_id'] = str(c['_id'])
-        if 'created_at' in c:
-            c['created_at'] = c['created_at'].isoformat()
+        _serialize_dates(c)
         
         # Add business info
-        biz_id = c.get('business_id')
-        if biz_id and biz_id not in business_cache:
-            biz = User.find_by_id(biz_id)
-            if biz:
-                business_cache[biz_id] = {
-                    'name': biz.get('name', 'Business'),
-                    'type': biz.get('business_type', 'Company')
-                }
-        
-        if biz_id and biz_id in business_cache:
-            c['business_name'] = business_cache[biz_id]['name']
-            c['business_type'] = business_cache[biz_id]['type']
+        biz = businesses.get(c.get('business_id'))
+        if biz:
+            c['business_name'] = biz.get('name', 'Business')
+            c['business_type'] = biz.get('business_type', 'Company')
         
     return jsonify(campaigns)
 
+@campaigns_bp.route('/feed/<creator_id>', methods=['GET'])
+def get_campaign_feed(creator_id):
+    """
+    Open campaigns ranked for a creator, excluding ones they applied to.
+    Paged with ?offset= and ?limit=; next_offset is null on the last page.
+    """
+    creator = User.find_by_id(creator_id)
+    if not creator or creator.get('role') != 'creator':
+        return jsonify({"error": "Creator not found"}), 404
+    
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', FEED_PAGE_SIZE)), 1), MAX_FEED_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "offset and limit must be numbers"}), 400
+    
+    ranked = feeds.ranked(creator)
+    page = ranked[offset:offset + limit]
+    
+    campaigns_by_id = Campaign.find_by_ids(cid for cid, _ in page)
+    businesses = User.find_by_ids(c.get('business_id') for c in campaigns_by_id.values())
+    
+    now = datetime.utcnow()
+    campaigns = []
+    for cid, score in page:
+        c = campaigns_by_id.get(cid)
+        # Ranked ids are cached; skip campaigns closed or deleted since
+        if not c or c.get('status') != 'active':
+            continue
+        if isinstance(c.get('deadline'), datetime) and c['deadline'] < now:
+            continue
+        c['_id'] = cid
+        c['score'] = score
+        _serialize_dates(c)
+        biz = businesses.get(c.get('business_id'))
+        if biz:
+            c['business_name'] = biz.get('name', 'Business')
+            c['business_type'] = biz.get('business_type', 'Company')
+        campaigns.append(c)
+    
+    next_offset = offset + limit if offset + limit < len(ranked) else None
+    return jsonify({"campaigns": campaigns, "total": len(ranked), "next_offset": next_offset})
+
 @campaigns_bp.route('/<campaign_id>', methods=['GET'])
 def get_campaign(campaign_id):
     campaign = Campaign.find_by_id(campaign_id)
@@ -58,7 +138,7 @@ def get_campaign(campaign_id):
          return jsonify({"error": "Not found"}), 404
          
     campaign['_id'] = str(campaign['_id'])
-    campaign['created_at'] = campaign['created_at'].isoformat()
+    _serialize_dates(campaign)
     return jsonify(campaign)
 
 # NOTE: Apply endpoint moved to /api/applications/ for better status tracking
@@ -70,10 +150,6 @@ def update_campaign(campaign_id):
     if not campaign:
         return jsonify({"error": "Campaign not found"}), 404
     
-    from database import get_db
-    from bson.objectid import ObjectId
-    db = get_db()
-    
     update_fields = {}
     if 'title' in data:
         update_fields['title'] = data['title']
@@ -81,25 +157,27 @@ def update_campaign(campaign_id):
         update_fields['description'] = data['description']
     if 'budget' in data:
         update_fields['budget'] = data['budget']
+    if 'deadline' in data:
+        try:
+            update_fields['deadline'] = _parse_date(data['deadline']) if data['deadline'] else None
+        except (ValueError, AttributeError):
+            return jsonify({"error": "Invalid deadline"}), 400
+    if 'status' in data:
+        if data['status'] not in CAMPAIGN_STATUSES:
+            return jsonify({"error": f"Invalid status. Must be one of: {', '.join(CAMPAIGN_STATUSES)}"}), 400
+        update_fields['status'] = data['status']
+        if data['status'] == 'closed' and campaign.get('status') != 'closed':
+            update_fields['closed_at'] = datetime.utcnow()
     
     if update_fields:
-        db.campaigns.update_one(
-            {'_id': ObjectId(campaign_id)},
-            {'$set': update_fields}
-        )
+        Campaign.update(campaign_id, update_fields)
     
     return jsonify({"message": "Campaign updated"})
 
 @campaigns_bp.route('/<campaign_id>', methods=['DELETE'])
 def delete_campaign(campaign_id):
-    campaign = Campaign.find_by_id(campaign_id)
-    if not campaign:
+    # Applications and messages for the campaign are removed with it
+    if not Campaign.delete(campaign_id):
         return jsonify({"error": "Campaign not found"}), 404
     
-    from database import get_db
-    from bson.objectid import ObjectId
-    db = get_db()
-    
-    db.campaigns.delete_one({'_id': ObjectId(campaign_id)})
-    
     return jsonify({"message": "Campaign deleted"}), 200
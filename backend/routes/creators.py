@@ -1,16 +1,141 @@
 from flask import Blueprint, request, jsonify
+import os
 from models.user import User
 from models.analytics import Analytics
-from bson.objectid import ObjectId
+from models.leaderboard import Leaderboard, LEADERBOARD_METRICS, LEADERBOARD_SIZE, OVERALL
+from cache import TTLCache
+from resilience import cached
+from exports import EXPORT_BATCH_SIZE, export_response, projection, requested_format
+from creator_index import creator_index, available as creator_index_available, register_listeners
+from similar import similar_creators, register_listeners as register_similar_listeners
 
 creators_bp = Blueprint('creators', __name__)
 
+register_listeners()
+register_similar_listeners()
+
+PLATFORMS = ['instagram', 'tiktok', 'youtube', 'twitter']
+TIER_QUERIES = {
+    'nano': {'$lt': 10000},
+    'micro': {'$gte': 10000, '$lt': 100000},
+    'macro': {'$gte': 100000},
+}
+# (label, lower bound inclusive, upper bound exclusive)
+PRICE_BANDS = [
+    ('under_100', 0, 100),
+    ('100_500', 100, 500),
+    ('500_1000', 500, 1000),
+    ('1000_5000', 1000, 5000),
+    ('5000_plus', 5000, None),
+]
+SEARCH_LIMIT = 200
+# ?sort= options, all descending
+SORT_FIELDS = {'followers': 'followers', 'rating': 'average_rating'}
+MAX_SIMILAR = 50
+SIMILAR_FIELDS = ('name', 'category', 'followers', 'average_rating')
+
+# Facet counts for the unfiltered view are the same for everyone
+facet_cache = TTLCache(ttl=float(os.getenv("FACET_CACHE_SECONDS", "60")), max_entries=16, name='creator_facets')
+# Expired results are kept SEARCH_CACHE_STALE_SECONDS longer to answer
+# from while the database is unavailable
+search_cache = TTLCache(ttl=float(os.getenv("SEARCH_CACHE_SECONDS", "10")),
+                        max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2048")), name='creator_search',
+                        stale_ttl=float(os.getenv("SEARCH_CACHE_STALE_SECONDS", "300")))
+
+
+def _wants_facets():
+    return request.args.get('facets', '').lower() in ('1', 'true', 'yes')
+
+
+def _price_expr(min_p, max_p, inclusive_max=True):
+    """Aggregation expression: some service package price is within range"""
+    price = {'$convert': {'input': '$$pkg.price', 'to': 'double', 'onError': None, 'onNull': 0}}
+    bounds = [{'$ne': ['$$price', None]}, {'$gte': ['$$price', min_p]}]
+    if max_p is not None:
+        bounds.append({'$lte' if inclusive_max else '$lt': ['$$price', max_p]})
+    return {'$anyElementTrue': [{'$map': {
+        'input': {'$ifNull': ['$service_packages', []]},
+        'as': 'pkg',
+        'in': {'$let': {'vars': {'price': price}, 'in': {'$and': bounds}}}
+    }}]}
+
+
+def _facet_stages(filter_conditions, price_range, sort=None, offset=0, limit=SEARCH_LIMIT):
+    """
+    One $facet sub-pipeline per facet. Each facet applies every active
+    filter except its own, so counts show what selecting an option would
+    return alongside the current filters.
+    """
+    def others(skip):
+        stages = []
+        conditions = [c for name, c in filter_conditions.items() if name != skip]
+        if conditions:
+            stages.append({'$match': {'$and': conditions}})
+        if price_range and skip != 'price_band':
+            stages.append({'$match': {'$expr': _price_expr(*price_range)}})
+        return stages
+
+    tier = {'$switch': {
+        'branches': [
+            {'case': {'$not': [{'$isNumber': '$followers'}]}, 'then': 'unknown'},
+            {'case': {'$lt': ['$followers', 10000]}, 'then': 'nano'},
+            {'case': {'$lt': ['$followers', 100000]}, 'then': 'micro'},
+        ],
+        'default': 'macro'
+    }}
+    platform_flags = {
+        p: {'$sum': {'$cond': [{'$gt': [{'$ifNull': [f'$social_links.{p}', '']}, '']}, 1, 0]}}
+        for p in PLATFORMS
+    }
+    price_flags = {
+        label: {'$sum': {'$cond': [_price_expr(lo, hi, inclusive_max=False), 1, 0]}}
+        for label, lo, hi in PRICE_BANDS
+    }
+
+    results = [{'$match': {'$and': list(filter_conditions.values())}}] if filter_conditions else []
+    if price_range:
+        results.append({'$match': {'$expr': _price_expr(*price_range)}})
+    if sort:
+        results.append({'$sort': {SORT_FIELDS[sort]: -1, '_id': 1}})
+    if offset:
+        results.append({'$skip': offset})
+    return {
+        'results': results + [{'$limit': limit}],
+        'category': others('category') + [{'$group': {'_id': '$category', 'count': {'$sum': 1}}}],
+        'follower_tier': others('follower_tier') + [{'$group': {'_id': tier, 'count': {'$sum': 1}}}],
+        'platform': others('platform') + [{'$group': dict({'_id': None}, **platform_flags)}],
+        'price_band': others('price_band') + [{'$group': dict({'_id': None}, **price_flags)}],
+    }
+
+
+def _format_facets(raw):
+    def counts(rows):
+        return {str(r['_id']) if r['_id'] is not None else 'none': r['count'] for r in rows}
+
+    def flags(rows, names):
+        row = rows[0] if rows else {}
+        return {name: row.get(name, 0) for name in names}
+
+    return {
+        'category': counts(raw.get('category', [])),
+        'follower_tier': counts(raw.get('follower_tier', [])),
+        'platform': flags(raw.get('platform', []), PLATFORMS),
+        'price_band': flags(raw.get('price_band', []), [b[0] for b in PRICE_BANDS]),
+    }
+
+
 @creators_bp.route('/search', methods=['GET'])
 def search_creators():
-    """Search creators with advanced filters"""
-    from database import get_db
-    db = get_db()
-    
+    """
+    Search creators with advanced filters.
+    With ?facets=true the response is {"results": [...], "facets": {...}}
+    and per-option counts come from the same aggregation as the results.
+    Optional ?sort=followers|rating, ?offset= and ?limit= page the results.
+    Without a text query or facets, and with CREATOR_INDEX enabled, the
+    filters run against the in-memory columnar index instead of Mongo.
+    Responses are cached for SEARCH_CACHE_SECONDS per normalised query, and
+    served stale while the database is unavailable.
+    """
     # Get filter parameters
     category = request.args.get('category')
     follower_tier = request.args.get('follower_tier')
@@ -18,91 +143,158 @@ def search_creators():
     min_price = request.args.get('min_price')
     max_price = request.args.get('max_price')
     q = request.args.get('q')  # Text search query
+    sort = request.args.get('sort')
+    if sort and sort not in SORT_FIELDS:
+        return jsonify({'error': f"sort must be one of: {', '.join(SORT_FIELDS)}"}), 400
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', SEARCH_LIMIT)), 1), SEARCH_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be numbers'}), 400
     
     # Base query
     query = {'role': 'creator'}
     
-    # Collect $or conditions separately
-    and_conditions = []
-    
     # Text search filter (name, bio, category)
     if q and q.strip():
         search_regex = {'$regex': q.strip(), '$options': 'i'}
-        and_conditions.append({'$or': [
+        query['$or'] = [
             {'name': search_regex},
             {'bio': search_regex},
             {'category': search_regex}
-        ]})
+        ]
+    
+    # Filters that also drive facets, keyed by facet name
+    filter_conditions = {}
     
     # Category filter
     if category and category != 'all':
-        query['category'] = category
+        filter_conditions['category'] = {'category': category}
     
     # Follower tier filter
-    if follower_tier and follower_tier != 'all':
-        if follower_tier == 'nano':
-            query['followers'] = {'$lt': 10000}
-        elif follower_tier == 'micro':
-            query['followers'] = {'$gte': 10000, '$lt': 100000}
-        elif follower_tier == 'macro':
-            query['followers'] = {'$gte': 100000}
+    if follower_tier in TIER_QUERIES:
+        filter_conditions['follower_tier'] = {'followers': TIER_QUERIES[follower_tier]}
     
     # Platform filter (creators must have at least one of the selected platforms)
+    platform_list = []
     if platforms and platforms != 'all':
         platform_list = [p.strip() for p in platforms.split(',') if p.strip()]
         if platform_list:
-            platform_conditions = []
-            for platform in platform_list:
-                platform_conditions.append({
-                    f'social_links.{platform}': {'$exists': True, '$ne': ''}
-                })
-            and_conditions.append({'$or': platform_conditions})
-    
-    # Combine all $and conditions
-    if and_conditions:
-        query['$and'] = and_conditions
-    
-    # Fetch creators
-    creators = list(db.users.find(query).limit(200))
-    
-    # Client-side price filtering (since we need to check service_packages array)
-    if min_price or max_price:
-        min_p = float(min_price) if min_price else 0
-        max_p = float(max_price) if max_price else float('inf')
+            filter_conditions['platform'] = {'$or': [
+                {f'social_links.{platform}': {'$exists': True, '$ne': ''}}
+                for platform in platform_list
+            ]}
+    
+    try:
+        price_range = None
+        if min_price or max_price:
+            price_range = (float(min_price) if min_price else 0, float(max_price) if max_price else None)
+    except ValueError:
+        return jsonify({'error': 'min_price and max_price must be numbers'}), 400
+    
+    wants_facets = _wants_facets()
+    
+    def run():
+        from database import get_db
+        db = get_db()
+        creators = None
+        facets = None
+        if creator_index_available() and not (q and q.strip()) and not wants_facets:
+            # Vectorized filters in memory; only the page's documents are fetched
+            ids = creator_index.search(
+                category=category if category and category != 'all' else None,
+                follower_tier=follower_tier if follower_tier in TIER_QUERIES else None,
+                platforms=platform_list,
+                price_range=price_range,
+                sort=sort, offset=offset, limit=limit
+            )
+            docs = User.find_by_ids(ids)
+            creators = [docs[i] for i in ids if i in docs]
+        elif wants_facets:
+            unfiltered = not filter_conditions and not price_range and '$or' not in query
+            facets = facet_cache.get('creators') if unfiltered else None
+            if facets is None:
+                pipeline = [
+                    {'$match': query},
+                    {'$facet': _facet_stages(filter_conditions, price_range, sort, offset, limit)}
+                ]
+                raw = next(db.users.aggregate(pipeline), {})
+                facets = _format_facets(raw)
+                if unfiltered:
+                    facet_cache.set('creators', facets)
+                creators = raw.get('results', [])
         
-        filtered_creators = []
+        if creators is None:
+            # Fetch creators
+            full_query = dict(query)
+            conditions = list(filter_conditions.values())
+            if price_range:
+                # Filtered before skip/limit, like the index path
+                conditions.append({'$expr': _price_expr(*price_range)})
+            if conditions:
+                full_query['$and'] = conditions
+            cursor = db.users.find(full_query)
+            if sort:
+                cursor = cursor.sort([(SORT_FIELDS[sort], -1), ('_id', 1)])
+            creators = list(cursor.skip(offset).limit(limit))
+        
+        # Format results
+        results = []
         for c in creators:
-            packages = c.get('service_packages', [])
-            if packages:
-                # Check if any package falls within the price range
-                for pkg in packages:
-                    try:
-                        price = float(pkg.get('price', 0))
-                        if min_p <= price <= max_p:
-                            filtered_creators.append(c)
-                            break
-                    except (ValueError, TypeError):
-                        continue
-        creators = filtered_creators
-    
-    # Format results
-    results = []
-    for c in creators:
-        results.append({
-            '_id': str(c['_id']),
-            'name': c.get('name', 'Creator'),
-            'email': c.get('email', ''),
-            'bio': c.get('bio', ''),
-            'category': c.get('category', 'Other'),
-            'followers': c.get('followers', 0),
-            'social_links': c.get('social_links', {}),
-            'service_packages': c.get('service_packages', []),
-            'portfolio': c.get('portfolio', []),
-            'average_rating': c.get('average_rating', 0),
-            'review_count': c.get('review_count', 0)
-        })
-    
-    return jsonify(results)
+            results.append({
+                '_id': str(c['_id']),
+                'name': c.get('name', 'Creator'),
+                'email': c.get('email', ''),
+                'bio': c.get('bio', ''),
+                'category': c.get('category', 'Other'),
+                'followers': c.get('followers', 0),
+                'social_links': c.get('social_links', {}),
+                'service_packages': c.get('service_packages', []),
+                'portfolio': c.get('portfolio', []),
+                'average_rating': c.get('average_rating', 0),
+                'review_count': c.get('review_count', 0)
+            })
+        
+        if facets is not None:
+            return {'results': results, 'facets': facets}
+        return results
+    
+    # Identical searches share one query: cached briefly, and concurrent
+    # misses wait for the first one instead of querying again
+    key = (
+        category if category and category != 'all' else None,
+        follower_tier if follower_tier in TIER_QUERIES else None,
+        tuple(sorted(set(platform_list))),
+        price_range,
+        q.strip() if q and q.strip() else None,
+        sort, offset, limit, wants_facets
+    )
+    return jsonify(cached(search_cache, key, run))
+
+@creators_bp.route('/leaderboard', methods=['GET'])
+def get_leaderboard():
+    """
+    Top creators from the materialised leaderboards (refreshed by
+    `python jobs.py refresh-leaderboards` or LEADERBOARD_REFRESH_INTERVAL).
+    Query: category (default all), by=rating|reviews|followers, limit.
+    """
+    category = request.args.get('category') or OVERALL
+    metric = request.args.get('by', 'rating')
+    if metric not in LEADERBOARD_METRICS:
+        return jsonify({'error': f"by must be one of: {', '.join(LEADERBOARD_METRICS)}"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), LEADERBOARD_SIZE)
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+    
+    board = Leaderboard.get(category, metric)
+    refreshed_at = board['refreshed_at'].isoformat() if board else None
+    return jsonify({
+        'category': category,
+        'by': metric,
+        'refreshed_at': refreshed_at,
+        'creators': board['entries'][:limit] if board else []
+    })
 
 @creators_bp.route('/<user_id>', methods=['GET'])
 def get_creator_profile(user_id):
@@ -120,6 +312,41 @@ def get_creator_profile(user_id):
     user['_id'] = str(user['_id'])
     return jsonify({"profile": user, "analytics": history})
 
+@creators_bp.route('/<user_id>/similar', methods=['GET'])
+def get_similar_creators(user_id):
+    """Creators most like this one by bio, packages, category, platforms and size"""
+    user = User.find_by_id(user_id)
+    if not user or user.get('role') != 'creator':
+        return jsonify({"error": "Creator not found"}), 404
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), MAX_SIMILAR)
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+
+    ranked = similar_creators.similar(user, limit)
+    found = User.find_by_ids([creator_id for creator_id, _ in ranked])
+    creators = []
+    for creator_id, score in ranked:
+        creator = found.get(creator_id)
+        if creator and creator.get('role') == 'creator':
+            entry = {'_id': creator_id, 'score': score}
+            entry.update({f: creator.get(f) for f in SIMILAR_FIELDS if f in creator})
+            creators.append(entry)
+    return jsonify({'creator_id': user_id, 'creators': creators})
+
+ANALYTICS_EXPORT_FIELDS = ['date', 'timestamp'] + [f'stats.{p}' for p in PLATFORMS]
+
+
+@creators_bp.route('/<user_id>/analytics/export', methods=['GET'])
+def export_creator_analytics(user_id):
+    """Stream a creator's analytics history as CSV (default) or ?format=ndjson"""
+    fmt = requested_format()
+    if fmt is None:
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+    
+    cursor = Analytics.iter_history(user_id, projection(ANALYTICS_EXPORT_FIELDS), EXPORT_BATCH_SIZE)
+    return export_response(cursor, ANALYTICS_EXPORT_FIELDS, fmt, f'analytics-{user_id}')
+
 @creators_bp.route('/<user_id>', methods=['PUT'])
 def update_creator_profile(user_id):
     data = request.json
@@ -143,12 +370,7 @@ def update_creator_profile(user_id):
         update_fields['portfolio'] = data['portfolio']
     
     if update_fields:
-        from database import get_db
-        db = get_db()
-        db.users.update_one(
-            {'_id': ObjectId(user_id)},
-            {'$set': update_fields}
-        )
+        User.update_user(user_id, update_fields)
     
     return jsonify({"message": "Profile updated"})
 
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
-from models.message import Message
+from models.message import Message, encode_cursor, decode_cursor
 from models.user import User
+from exports import EXPORT_BATCH_SIZE, export_response, projection, requested_format
 
 messages_bp = Blueprint('messages', __name__)
 
@@ -23,10 +24,49 @@ def get_conversation():
     
     if not all([campaign_id, creator_id, business_id]):
         return jsonify({"error": "Missing params"}), 400
+    
+    # Optional: only the newest `limit` messages, clamped to 1..MAX_CONVERSATION_MESSAGES
+    try:
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+    except ValueError:
+        return jsonify({"error": "limit must be a number"}), 400
+    
+    # Optional: the page older than a previous response's X-Next-Before
+    before = None
+    if request.args.get('before'):
+        before = decode_cursor(request.args['before'])
+        if before is None:
+            return jsonify({"error": "Invalid cursor"}), 400
         
-    msgs = Message.get_conversation(campaign_id, creator_id, business_id)
+    msgs, has_more = Message.get_conversation(campaign_id, creator_id, business_id, limit, before)
+    next_before = encode_cursor(msgs[0]) if has_more else None
     for m in msgs:
         m['_id'] = str(m['_id'])
         m['timestamp'] = m['timestamp'].isoformat()
-        
-    return jsonify(msgs)
+    
+    # The body stays a plain list; paging details travel in headers
+    response = jsonify(msgs)
+    response.headers['X-Has-More'] = 'true' if has_more else 'false'
+    if next_before:
+        response.headers['X-Next-Before'] = next_before
+    return response
+
+MESSAGE_EXPORT_FIELDS = ['_id', 'campaign_id', 'sender_id', 'receiver_id', 'content', 'timestamp']
+
+
+@messages_bp.route('/conversation/export', methods=['GET'])
+def export_conversation():
+    """Stream a whole conversation as CSV (default) or ?format=ndjson"""
+    campaign_id = request.args.get('campaign_id')
+    creator_id = request.args.get('creator_id')
+    business_id = request.args.get('business_id')
+    
+    if not all([campaign_id, creator_id, business_id]):
+        return jsonify({"error": "Missing params"}), 400
+    fmt = requested_format()
+    if fmt is None:
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+    
+    messages = Message.iter_conversation(campaign_id, creator_id, business_id,
+                                         projection(MESSAGE_EXPORT_FIELDS), EXPORT_BATCH_SIZE)
+    return export_response(messages, MESSAGE_EXPORT_FIELDS, fmt, f'conversation-{campaign_id}')
@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-from models.notification import Notification
+from models.notification import Notification, encode_cursor, decode_cursor
 
 notifications_bp = Blueprint('notifications', __name__)
 
@@ -9,15 +9,28 @@ def get_notifications():
     if not user_id:
         return jsonify({"error": "user_id required"}), 400
     
-    notifications = Notification.find_for_user(user_id)
+    # Paging: pass back next_cursor as ?cursor= for older notifications
+    limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+    cursor = request.args.get('cursor')
+    before = None
+    if cursor:
+        before = decode_cursor(cursor)
+        if before is None:
+            return jsonify({"error": "Invalid cursor"}), 400
+    
+    notifications = Notification.find_for_user(user_id, limit=limit, before=before)
+    next_cursor = encode_cursor(notifications[-1]) if len(notifications) == limit else None
     
     for n in notifications:
         n['_id'] = str(n['_id'])
         n['created_at'] = n['created_at'].isoformat()
+        if 'read_at' in n:
+            n['read_at'] = n['read_at'].isoformat()
     
     return jsonify({
         "notifications": notifications,
-        "unread_count": Notification.count_unread(user_id)
+        "unread_count": Notification.count_unread(user_id),
+        "next_cursor": next_cursor
     })
 
 @notifications_bp.route('/<notification_id>/read', methods=['POST'])
@@ -0,0 +1,25 @@
+from flask import Blueprint, request, jsonify
+from suggest import suggestions, register_listeners
+
+search_bp = Blueprint('search', __name__)
+
+register_listeners()
+
+MAX_SUGGESTIONS = 25
+
+
+@search_bp.route('/suggest', methods=['GET'])
+def suggest():
+    """Typeahead: top creator/business names and categories for a prefix"""
+    q = request.args.get('q', '')
+    kind = request.args.get('type', 'all')
+    if kind not in ('creator', 'business', 'all'):
+        return jsonify({'error': 'type must be creator, business or all'}), 400
+    
+    try:
+        limit = min(int(request.args.get('limit', 10)), MAX_SUGGESTIONS)
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+    
+    results = suggestions.suggest(q, None if kind == 'all' else kind, max(limit, 1))
+    return jsonify(results)
@@ -5,39 +5,24 @@ Run: python seed_db.py
 This script seeds the database with sample data for testing.
 """
 
-import os
-from pymongo import MongoClient
-from pymongo.server_api import ServerApi
 from werkzeug.security import generate_password_hash
 from datetime import datetime
-import certifi
 from dotenv import load_dotenv
 import sys
 
 load_dotenv()
 
+from database import get_db
+
 def get_db_connection():
-    MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/linkfluence")
-    
+    # Same connection (and DB_BACKEND choice) as the app
     try:
-        if "mongodb+srv" in MONGO_URI:
-            print("🔌 Connecting to Atlas (Secure Mode)...")
-            client = MongoClient(MONGO_URI, 
-                               tlsCAFile=certifi.where(),
-                               server_api=ServerApi('1'))
-        else:
-            print("🔌 Connecting to Local DB...")
-            client = MongoClient(MONGO_URI)
-            
-        client.admin.command('ping')
-        print("✅ Connected to MongoDB!")
-        
-        db = client.get_database('Linkfluence')
+        db = get_db()
+        print("✅ Connected to the database!")
         return db
-        
     except Exception as e:
         print(f"❌ Connection Failed: {e}")
-        sys.exit(1)
+        raise
 
 def seed_data():
     print("🚀 Starting Database Seeding...")
@@ -49,6 +34,7 @@ def seed_data():
         {
             "name": "Demo Creator",
             "email": "creator@demo.com",
+            "email_normalized": "creator@demo.com",
             "password": generate_password_hash("demo123"),
             "role": "creator",
             "bio": "I create amazing content for brands!",
@@ -59,6 +45,7 @@ def seed_data():
         {
             "name": "Demo Business",
             "email": "business@demo.com",
+            "email_normalized": "business@demo.com",
             "password": generate_password_hash("demo123"),
             "role": "business",
             "business_type": "retail",
@@ -101,4 +88,7 @@ def seed_data():
     print("  Business: business@demo.com / demo123")
 
 if __name__ == "__main__":
-    seed_data()
+    try:
+        seed_data()
+    except Exception:
+        sys.exit(1)
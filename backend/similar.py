@@ -0,0 +1,336 @@
+"""
+In-memory nearest-neighbour index for "similar creators".
+
+Each creator is a sparse TF-IDF vector over the words of their bio and
+service packages, plus category and platform tokens, alongside three
+numeric features: log followers, average rating and log cheapest package
+price. Similarity is TEXT_WEIGHT * cosine(TF-IDF) + NUMERIC_WEIGHT * the
+mean closeness of the numeric features.
+
+Term frequencies are stored per creator and in per-term posting dicts,
+so adding or updating a creator only touches that creator's postings and
+never forces a rebuild. IDF comes from the current posting sizes; each
+creator's vector length is computed when the creator is indexed and may
+drift slightly from current IDF until the next full build. A lookup
+gathers at most SIMILAR_CANDIDATES creators from the postings of the
+query's rarest terms (at most SCAN_LIMIT per term) and scores only those
+exactly, so its cost does not grow with the number of creators. Results
+are approximate: in very common terms only the first SCAN_LIMIT postings
+are considered.
+
+Like the suggestion index the index is built on first use, and kept
+current by a delta query on `updated_at` every SIMILAR_REFRESH_SECONDS;
+User change listeners make this process's own writes visible on the next
+lookup. Deleted creators are only dropped from results, since result ids
+are resolved against Mongo.
+"""
+
+import heapq
+import logging
+import math
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+from itertools import islice
+
+from instrumentation import gauge, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SIMILAR_MAX_DOCS = int(os.getenv("SIMILAR_MAX_DOCS", "2000000"))
+SIMILAR_REFRESH_SECONDS = float(os.getenv("SIMILAR_REFRESH_SECONDS", "30"))
+SIMILAR_CANDIDATES = int(os.getenv("SIMILAR_CANDIDATES", "500"))
+# Postings read per query term
+SCAN_LIMIT = 500
+# Highest-weighted terms kept per creator
+MAX_TERMS = 32
+MAX_TERM_LENGTH = 30
+
+TEXT_WEIGHT = 0.7
+NUMERIC_WEIGHT = 0.3
+# Category and platform tokens count as this many occurrences
+CATEGORY_WEIGHT = 3
+PLATFORM_WEIGHT = 1
+# Feature difference at which closeness falls to 1/e
+NUMERIC_SCALES = (1.0, 1.0, 0.5)  # log10 followers, rating, log10 price
+
+PLATFORMS = ['instagram', 'tiktok', 'youtube', 'twitter']
+PROJECTION = {'role': 1, 'bio': 1, 'category': 1, 'service_packages': 1,
+              'social_links': 1, 'followers': 1, 'average_rating': 1}
+# User fields that change a creator's vector
+FEATURE_FIELDS = ('bio', 'category', 'service_packages', 'social_links', 'followers', 'average_rating')
+
+_WORD = re.compile(r'[^\W\d_]{2,}', re.UNICODE)
+STOPWORDS = frozenset("""
+    a an and are as at be but by for from has have i in is it its my of on or our
+    so that the their this to we with you your will can all about more
+""".split())
+
+INDEX_DOCS = gauge('linkfluence_similar_docs', 'Creators held in the similar-creators index')
+INDEX_TERMS = gauge('linkfluence_similar_terms', 'Distinct terms in the similar-creators index')
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value != value:
+        return None
+    return float(value)
+
+
+def _min_price(packages):
+    prices = []
+    for pkg in packages or []:
+        if isinstance(pkg, dict):
+            price = _number(pkg.get('price'))
+            if price is not None and price >= 0:
+                prices.append(price)
+    return min(prices) if prices else None
+
+
+def features(user):
+    """(term weights, numeric features) for a creator document"""
+    counts = {}
+    texts = [user.get('bio')]
+    for pkg in user.get('service_packages') or []:
+        if isinstance(pkg, dict):
+            texts.extend((pkg.get('name'), pkg.get('description')))
+    for text in texts:
+        if not isinstance(text, str):
+            continue
+        for word in _WORD.findall(text.lower()):
+            if word not in STOPWORDS:
+                word = word[:MAX_TERM_LENGTH]
+                counts[word] = counts.get(word, 0) + 1
+    weights = {term: 1 + math.log(n) for term, n in counts.items()}
+
+    category = user.get('category')
+    if isinstance(category, str) and category.strip():
+        weights['category:' + category.strip().lower()] = CATEGORY_WEIGHT
+    links = user.get('social_links')
+    if isinstance(links, dict):
+        for platform in PLATFORMS:
+            if links.get(platform):
+                weights['platform:' + platform] = PLATFORM_WEIGHT
+
+    if len(weights) > MAX_TERMS:
+        weights = dict(heapq.nlargest(MAX_TERMS, weights.items(), key=lambda item: item[1]))
+    terms = {sys.intern(term): w for term, w in weights.items()}
+
+    followers = _number(user.get('followers'))
+    rating = _number(user.get('average_rating'))
+    price = _min_price(user.get('service_packages'))
+    numeric = (
+        math.log10(followers + 1) if followers is not None and followers >= 0 else None,
+        rating if rating else None,  # 0 means "no reviews yet"
+        math.log10(price + 1) if price is not None else None,
+    )
+    return terms, numeric
+
+
+def _closeness(a, b):
+    total = n = 0
+    for x, y, scale in zip(a, b, NUMERIC_SCALES):
+        if x is not None and y is not None:
+            total += math.exp(-abs(x - y) / scale)
+            n += 1
+    return total / n if n else 0.0
+
+
+class SimilarityIndex:
+    """Per-creator term weights with per-term postings"""
+
+    def __init__(self, max_docs=SIMILAR_MAX_DOCS):
+        self.max_docs = max_docs
+        # id -> (terms {term: tf}, numeric features, TF-IDF vector length)
+        self._docs = {}
+        # term -> {id: tf}
+        self._postings = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    @property
+    def term_count(self):
+        return len(self._postings)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._docs
+
+    def _idf(self, term, n_docs):
+        return math.log((n_docs + 1) / (len(self._postings.get(term, ())) + 1)) + 1
+
+    def _norm(self, terms, n_docs):
+        return math.sqrt(sum((tf * self._idf(term, n_docs)) ** 2 for term, tf in terms.items()))
+
+    def upsert(self, doc_id, terms, numeric):
+        with self._lock:
+            old = self._docs.get(doc_id)
+            if old is None and len(self._docs) >= self.max_docs:
+                return False
+            if old is not None:
+                self._remove_postings(doc_id, old[0])
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            n_docs = len(self._docs) + (old is None)
+            self._docs[doc_id] = (terms, numeric, self._norm(terms, n_docs))
+        return True
+
+    def remove(self, doc_id):
+        with self._lock:
+            old = self._docs.pop(doc_id, None)
+            if old is not None:
+                self._remove_postings(doc_id, old[0])
+
+    def _remove_postings(self, doc_id, terms):
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[term]
+
+    def load(self, rows):
+        """Replace the contents with rows of (id, terms, numeric)"""
+        docs = {}
+        postings = {}
+        for doc_id, terms, numeric in rows:
+            if len(docs) >= self.max_docs:
+                logger.warning("Similar-creators index full at %d creators; the rest are not indexed", self.max_docs)
+                break
+            docs[doc_id] = (terms, numeric, 0.0)
+            for term, tf in terms.items():
+                postings.setdefault(term, {})[doc_id] = tf
+        n_docs = len(docs)
+        idf = {term: math.log((n_docs + 1) / (len(posting) + 1)) + 1 for term, posting in postings.items()}
+        for doc_id, (terms, numeric, _) in docs.items():
+            norm = math.sqrt(sum((tf * idf[term]) ** 2 for term, tf in terms.items()))
+            docs[doc_id] = (terms, numeric, norm)
+        with self._lock:
+            self._docs = docs
+            self._postings = postings
+
+    def similar(self, doc_id, limit=10):
+        """[(id, score)] of the creators most like doc_id, best first"""
+        with self._lock:
+            doc = self._docs.get(doc_id)
+            if doc is None:
+                return []
+            terms, numeric, _ = doc
+            postings = self._postings
+            n_docs = len(self._docs)
+            # Query weights carry both IDF factors of the dot product
+            query = []
+            query_norm = 0.0
+            for term, tf in terms.items():
+                idf = self._idf(term, n_docs)
+                query.append((term, tf * idf * idf))
+                query_norm += (tf * idf) ** 2
+            query_norm = math.sqrt(query_norm)
+            if not query_norm:
+                return []
+
+            # Rarest terms first: they say the most about the creator
+            candidates = set()
+            for term, _ in sorted(query, key=lambda item: len(postings.get(item[0], ()))):
+                room = SIMILAR_CANDIDATES - len(candidates)
+                if room <= 0:
+                    break
+                candidates.update(islice(postings.get(term, ()), min(room, SCAN_LIMIT) + 1))
+            candidates.discard(doc_id)
+
+            docs = self._docs
+            scored = []
+            for other_id in candidates:
+                other_terms, other_numeric, norm = docs[other_id]
+                dot = 0.0
+                for term, weight in query:
+                    tf = other_terms.get(term)
+                    if tf is not None:
+                        dot += weight * tf
+                cosine = dot / (query_norm * norm) if norm else 0.0
+                score = TEXT_WEIGHT * cosine + NUMERIC_WEIGHT * _closeness(numeric, other_numeric)
+                scored.append((score, other_id))
+        top = heapq.nlargest(limit, scored)
+        return [(other_id, round(score, 4)) for score, other_id in top]
+
+
+def _row(user):
+    terms, numeric = features(user)
+    return str(user['_id']), terms, numeric
+
+
+class SimilarService:
+    """Owns the process-wide index: lazy build, delta sync, write hooks"""
+
+    def __init__(self):
+        self.index = SimilarityIndex()
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self._last_sync = None
+        self._last_check = 0.0
+
+    def _ensure_fresh(self):
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._full_load()
+            return
+        if time.monotonic() - self._last_check >= SIMILAR_REFRESH_SECONDS:
+            with self._load_lock:
+                if time.monotonic() - self._last_check >= SIMILAR_REFRESH_SECONDS:
+                    self._delta_sync()
+
+    def _full_load(self):
+        from database import get_db
+        db = get_db()
+        started = time.perf_counter()
+        sync_from = datetime.utcnow()
+        cursor = db.users.find({'role': 'creator'}, PROJECTION, batch_size=5000)
+        self.index.load(_row(u) for u in cursor)
+        self._last_sync = sync_from
+        self._last_check = time.monotonic()
+        self._loaded = True
+        logger.info("Similar-creators index built: %d creators, %d terms in %.2fs",
+                    len(self.index), self.index.term_count, time.perf_counter() - started)
+
+    def _delta_sync(self):
+        from database import get_db
+        db = get_db()
+        sync_from = datetime.utcnow()
+        for user in db.users.find({'updated_at': {'$gte': self._last_sync}}, PROJECTION):
+            if user.get('role') == 'creator':
+                self.index.upsert(*_row(user))
+            else:
+                self.index.remove(str(user['_id']))
+        self._last_sync = sync_from
+        self._last_check = time.monotonic()
+
+    def on_user_change(self, user_id, fields):
+        """User change listener: pick up this process's writes on the next lookup"""
+        if self._loaded and any(f in fields for f in FEATURE_FIELDS + ('role',)):
+            self._last_check = 0.0
+
+    def similar(self, creator, limit=10):
+        """[(id, score)] of creators most like the given creator document"""
+        self._ensure_fresh()
+        creator_id = str(creator['_id'])
+        if creator_id not in self.index:
+            # Written by another process since the last sync
+            self.index.upsert(*_row(creator))
+        return self.index.similar(creator_id, limit)
+
+    def collect_metrics(self):
+        INDEX_DOCS.set(len(self.index))
+        INDEX_TERMS.set(self.index.term_count)
+
+
+similar_creators = SimilarService()
+REGISTRY.add_collector(similar_creators.collect_metrics)
+
+
+def register_listeners():
+    from models.user import User
+    User.add_change_listener(similar_creators.on_user_change)
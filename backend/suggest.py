@@ -0,0 +1,422 @@
+"""
+In-memory prefix index for typeahead suggestions.
+
+Creator and business names (each word and the full name) and their
+category are kept as lowercase entries (term, -score, id) in sorted
+order, stored in chunks of CHUNK_SIZE. Writes find their chunk and
+position with bisects, so an update costs a few binary searches and a
+small insert however many users share a term.
+
+A lookup bisects to the start of the prefix's range. Narrow ranges (at
+most SCAN_LIMIT entries) are scanned in full. Broad ones, the usual typeahead case, are
+answered from a top-TOP_K list of the best-scored users under that prefix.
+The list is built by one scan on first use and then kept current by every
+write, and it is only rebuilt when removals leave it too short. Exact term
+matches rank above longer completions either way. Lookups never touch Mongo.
+
+The index is built from Mongo on first use, kept current in this process
+through User change listeners, and picks up writes made by other worker
+processes with a periodic delta query on `updated_at`. It holds at most
+SUGGEST_MAX_DOCS users and keeps only names, categories and a score.
+"""
+
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+
+from instrumentation import gauge, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SUGGEST_MAX_DOCS = int(os.getenv("SUGGEST_MAX_DOCS", "2000000"))
+SUGGEST_REFRESH_SECONDS = float(os.getenv("SUGGEST_REFRESH_SECONDS", "30"))
+MAX_TERM_LENGTH = 40
+# Prefix ranges up to this many entries are scanned; broader ones use top lists
+SCAN_LIMIT = 500
+# Entries per chunk of the sorted arrays (chunks split at twice this)
+CHUNK_SIZE = 1024
+# Users kept per broad prefix (and per prefix and kind)
+TOP_K = 100
+# Broad prefixes with a top list; the oldest list is dropped beyond this
+MAX_TOP_PREFIXES = 2000
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+INDEX_DOCS = gauge('linkfluence_suggest_docs', 'Users held in the suggestion index')
+INDEX_TERMS = gauge('linkfluence_suggest_terms', 'Terms held in the suggestion index')
+
+
+def _terms(name, category):
+    name = (name or '').strip().lower()
+    terms = set(_WORD.findall(name))
+    if name:
+        terms.add(name)
+    if category:
+        terms.add(str(category).strip().lower())
+    return tuple(sorted(t[:MAX_TERM_LENGTH] for t in terms if t))
+
+
+def _score(value):
+    try:
+        score = float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+    return score if score == score else 0.0
+
+
+class _Top:
+    """
+    Best users under one prefix: `ranked` holds (-score, id) keys best
+    first. `cut` is the best key left out when the list was cut short (None
+    if it never was); every user under the prefix ordered before it is in
+    `ranked`.
+    """
+    __slots__ = ('ranked', 'cut', 'size')
+
+    def __init__(self, ranked, cut, size):
+        self.ranked = ranked
+        self.cut = cut
+        self.size = size
+
+    def add(self, doc_id, score):
+        key = (-score, doc_id)
+        if self.cut is not None and key > self.cut:
+            return
+        insort(self.ranked, key)
+        if len(self.ranked) > self.size:
+            self.cut = self.ranked.pop()
+
+    def discard(self, doc_id, score):
+        i = bisect_left(self.ranked, (-score, doc_id))
+        if i < len(self.ranked) and self.ranked[i][1] == doc_id:
+            del self.ranked[i]
+
+
+class PrefixIndex:
+    """
+    Entries (term, -score, id) in sorted order, held as chunks of parallel
+    arrays so a write only shifts one chunk. `_maxes` holds each chunk's
+    last entry; a bisect on it finds the chunk for a key.
+    """
+
+    def __init__(self, max_docs=SUGGEST_MAX_DOCS):
+        self.max_docs = max_docs
+        # [terms, negated scores, ids] per chunk
+        self._chunks = []
+        self._maxes = []
+        self._size = 0
+        # id -> (kind, name, category, score, terms)
+        self._docs = {}
+        # (kind or None, prefix, exact term only) -> _Top
+        self._tops = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    @property
+    def term_count(self):
+        return self._size
+
+    def get(self, doc_id):
+        return self._docs.get(doc_id)
+
+    @staticmethod
+    def _lower(chunk, key):
+        """Index of the first entry in chunk not before key, (term,) or a full entry"""
+        terms, scores, ids = chunk
+        lo = bisect_left(terms, key[0])
+        if len(key) == 1:
+            return lo
+        hi = bisect_right(terms, key[0], lo)
+        lo = bisect_left(scores, key[1], lo, hi)
+        hi = bisect_right(scores, key[1], lo, hi)
+        return bisect_left(ids, key[2], lo, hi)
+
+    def _scan(self, key):
+        """Entries from the first one not before key, in order"""
+        c = bisect_left(self._maxes, key)
+        if c == len(self._chunks):
+            return
+        j = self._lower(self._chunks[c], key)
+        for terms, scores, ids in self._chunks[c:]:
+            for k in range(j, len(terms)):
+                yield terms[k], scores[k], ids[k]
+            j = 0
+
+    def _insert(self, entry):
+        if not self._chunks:
+            self._chunks.append([[], array('d'), []])
+            self._maxes.append(entry)
+        c = min(bisect_left(self._maxes, entry), len(self._chunks) - 1)
+        chunk = self._chunks[c]
+        j = self._lower(chunk, entry)
+        for column, value in zip(chunk, entry):
+            column.insert(j, value)
+        self._size += 1
+        if len(chunk[0]) > 2 * CHUNK_SIZE:
+            half = len(chunk[0]) // 2
+            tail = [column[half:] for column in chunk]
+            for column in chunk:
+                del column[half:]
+            self._chunks.insert(c + 1, tail)
+            self._maxes.insert(c + 1, (tail[0][-1], tail[1][-1], tail[2][-1]))
+        self._maxes[c] = (chunk[0][-1], chunk[1][-1], chunk[2][-1])
+
+    def _delete(self, entry):
+        c = bisect_left(self._maxes, entry)
+        if c == len(self._chunks):
+            return
+        chunk = self._chunks[c]
+        j = self._lower(chunk, entry)
+        if j == len(chunk[0]) or (chunk[0][j], chunk[1][j], chunk[2][j]) != entry:
+            return
+        for column in chunk:
+            del column[j]
+        self._size -= 1
+        if chunk[0]:
+            self._maxes[c] = (chunk[0][-1], chunk[1][-1], chunk[2][-1])
+        else:
+            del self._chunks[c]
+            del self._maxes[c]
+
+    def _top_keys(self, kind, terms):
+        """Keys of the existing top lists a user with these terms belongs to"""
+        keys = set()
+        if self._tops:
+            for term in terms:
+                candidates = [(None, term, True), (kind, term, True)]
+                for n in range(1, len(term) + 1):
+                    candidates += [(None, term[:n], False), (kind, term[:n], False)]
+                keys.update(key for key in candidates if key in self._tops)
+        return keys
+
+    def upsert(self, doc_id, kind, name, category, score=0):
+        terms = _terms(name, category)
+        score = _score(score)
+        with self._lock:
+            old = self._docs.get(doc_id)
+            if old is None and len(self._docs) >= self.max_docs:
+                return False
+            if old is not None:
+                self._remove(doc_id, old)
+            self._docs[doc_id] = (kind, name, category, score, terms)
+            for term in terms:
+                self._insert((term, -score, doc_id))
+            for key in self._top_keys(kind, terms):
+                self._tops[key].add(doc_id, score)
+        return True
+
+    def remove(self, doc_id):
+        with self._lock:
+            old = self._docs.pop(doc_id, None)
+            if old is not None:
+                self._remove(doc_id, old)
+
+    def _remove(self, doc_id, old):
+        kind, _, _, score, terms = old
+        for term in terms:
+            self._delete((term, -score, doc_id))
+        for key in self._top_keys(kind, terms):
+            self._tops[key].discard(doc_id, score)
+
+    def load(self, rows):
+        """Replace the contents with rows of (id, kind, name, category, score)"""
+        entries = []
+        docs = {}
+        for doc_id, kind, name, category, score in rows:
+            if len(docs) >= self.max_docs:
+                logger.warning("Suggestion index full at %d users; the rest are not indexed", self.max_docs)
+                break
+            score = _score(score)
+            terms = _terms(name, category)
+            docs[doc_id] = (kind, name, category, score, terms)
+            entries.extend((term, -score, doc_id) for term in terms)
+        entries.sort()
+        chunks = []
+        for start in range(0, len(entries), CHUNK_SIZE):
+            part = entries[start:start + CHUNK_SIZE]
+            chunks.append([[e[0] for e in part], array('d', (e[1] for e in part)), [e[2] for e in part]])
+        with self._lock:
+            self._chunks = chunks
+            self._maxes = [(c[0][-1], c[1][-1], c[2][-1]) for c in chunks]
+            self._size = len(entries)
+            self._docs = docs
+            self._tops = {}
+
+    def _best(self, kind, prefix, exact, wanted):
+        """
+        Ids of the best-scored users under prefix (with exactly that term if
+        exact), best first; at least `wanted` of them when that many exist.
+        Caller holds the lock.
+        """
+        key = (kind, prefix, exact)
+        top = self._tops.get(key)
+        # A list that was never cut short already holds everyone
+        if top is None or (top.cut is not None and len(top.ranked) < wanted):
+            best = {}
+            docs = self._docs
+            for term, neg_score, doc_id in self._scan((prefix,)):
+                if not term.startswith(prefix) or (exact and term != prefix):
+                    break
+                if doc_id not in best and (kind is None or docs[doc_id][0] == kind):
+                    best[doc_id] = neg_score
+            size = max(TOP_K, wanted)
+            ranked = heapq.nsmallest(size + 1, ((s, d) for d, s in best.items()))
+            cut = ranked.pop() if len(ranked) > size else None
+            self._tops.pop(key, None)
+            if len(self._tops) >= MAX_TOP_PREFIXES:
+                del self._tops[next(iter(self._tops))]
+            top = self._tops[key] = _Top(ranked, cut, size)
+        return [doc_id for _, doc_id in top.ranked]
+
+    def suggest(self, prefix, kind=None, limit=10):
+        prefix = (prefix or '').strip().lower()[:MAX_TERM_LENGTH]
+        if not prefix:
+            return []
+        with self._lock:
+            docs = self._docs
+            window = []
+            for entry in self._scan((prefix,)):
+                if not entry[0].startswith(prefix) or len(window) > SCAN_LIMIT:
+                    break
+                window.append(entry)
+            if len(window) <= SCAN_LIMIT:
+                best = {}
+                for term, _, doc_id in window:
+                    doc = docs[doc_id]
+                    if kind is None or doc[0] == kind:
+                        # Exact term matches rank above longer completions;
+                        # then higher scores, then ids, as in the top lists
+                        rank = (term != prefix, -doc[3], doc_id)
+                        if rank < best.get(doc_id, (True, float('inf'), doc_id)):
+                            best[doc_id] = rank
+                top = [rank[2] for rank in heapq.nsmallest(limit, best.values())]
+            else:
+                top = self._suggest_broad(prefix, kind, limit)
+            return [
+                {'_id': doc_id, 'name': docs[doc_id][1], 'type': docs[doc_id][0], 'category': docs[doc_id][2]}
+                for doc_id in top
+            ]
+
+    def _suggest_broad(self, prefix, kind, limit):
+        # Caller holds the lock. Exact term matches first; without a kind
+        # filter they are simply the leading entries of the term
+        exact = []
+        scanned = 0
+        for term, _, doc_id in self._scan((prefix,)):
+            if term != prefix:
+                break
+            scanned += 1
+            if scanned > SCAN_LIMIT:
+                exact = self._best(kind, prefix, True, limit)[:limit]
+                break
+            if kind is None or self._docs[doc_id][0] == kind:
+                exact.append(doc_id)
+                if len(exact) >= limit:
+                    break
+        if len(exact) >= limit:
+            return exact
+        seen = set(exact)
+        for doc_id in self._best(kind, prefix, False, limit + len(exact)):
+            if len(exact) >= limit:
+                break
+            if doc_id not in seen:
+                exact.append(doc_id)
+        return exact
+
+
+def _row(user):
+    role = user.get('role')
+    if role == 'creator':
+        return (str(user['_id']), 'creator', user.get('name', ''), user.get('category'),
+                user.get('followers', 0) or 0)
+    return (str(user['_id']), 'business', user.get('name', ''), user.get('business_type'), 0)
+
+
+PROJECTION = {'name': 1, 'role': 1, 'category': 1, 'business_type': 1, 'followers': 1}
+
+
+class SuggestService:
+    """Owns the process-wide index: lazy build, delta sync, write hooks"""
+
+    def __init__(self):
+        self.index = PrefixIndex()
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self._last_sync = None
+        self._last_check = 0.0
+
+    def _ensure_fresh(self):
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._full_load()
+            return
+        if time.monotonic() - self._last_check >= SUGGEST_REFRESH_SECONDS:
+            with self._load_lock:
+                if time.monotonic() - self._last_check >= SUGGEST_REFRESH_SECONDS:
+                    self._delta_sync()
+
+    def _full_load(self):
+        from database import get_db
+        db = get_db()
+        started = time.perf_counter()
+        sync_from = datetime.utcnow()
+        cursor = db.users.find({'role': {'$in': ['creator', 'business']}}, PROJECTION, batch_size=5000)
+        self.index.load(_row(u) for u in cursor)
+        self._last_sync = sync_from
+        self._last_check = time.monotonic()
+        self._loaded = True
+        logger.info("Suggestion index built: %d users in %.2fs", len(self.index), time.perf_counter() - started)
+
+    def _delta_sync(self):
+        from database import get_db
+        db = get_db()
+        sync_from = datetime.utcnow()
+        query = {'role': {'$in': ['creator', 'business']}, 'updated_at': {'$gte': self._last_sync}}
+        for user in db.users.find(query, PROJECTION):
+            self.index.upsert(*_row(user))
+        self._last_sync = sync_from
+        self._last_check = time.monotonic()
+
+    def on_user_change(self, user_id, fields):
+        """User change listener: apply a write made in this process"""
+        if not self._loaded:
+            return
+        current = self.index.get(user_id)
+        if current is None:
+            if fields.get('role') in ('creator', 'business'):
+                self.index.upsert(*_row(dict(fields, _id=user_id)))
+            return
+        kind, name, category, score, _ = current
+        name = fields.get('name', name)
+        if kind == 'creator':
+            category = fields.get('category', category)
+            score = fields.get('followers', score)
+        else:
+            category = fields.get('business_type', category)
+        self.index.upsert(user_id, kind, name, category, score)
+
+    def suggest(self, prefix, kind=None, limit=10):
+        self._ensure_fresh()
+        return self.index.suggest(prefix, kind, limit)
+
+    def collect_metrics(self):
+        INDEX_DOCS.set(len(self.index))
+        INDEX_TERMS.set(self.index.term_count)
+
+
+suggestions = SuggestService()
+REGISTRY.add_collector(suggestions.collect_metrics)
+
+
+def register_listeners():
+    from models.user import User
+    User.add_change_listener(suggestions.on_user_change)
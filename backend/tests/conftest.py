@@ -0,0 +1,82 @@
+"""
+Route tests run against the in-memory engine (DB_BACKEND=memory), so the
+suite needs no mongod. Every test gets an empty database and cold caches.
+Run from backend/: python -m pytest -q
+"""
+
+import os
+import sys
+
+os.environ['DB_BACKEND'] = 'memory'
+os.environ['RATE_LIMIT_ENABLED'] = 'false'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import cache
+import database
+import memorydb
+import resilience
+import similar
+import suggest
+from app import app as flask_app
+from feed import feeds
+
+
+@pytest.fixture
+def db():
+    db = memorydb.connect('memory://tests/linkfluence')
+    database.ensure_indexes(db)
+    database.set_db(db)
+    # Process-wide caches and indexes must not leak between tests
+    for named in cache._named:
+        named.clear()
+    feeds.cache.clear()
+    feeds.business_cache.clear()
+    suggest.suggestions.__init__()
+    similar.similar_creators.__init__()
+    resilience.breaker = resilience.CircuitBreaker('mongo')
+    yield db
+    database.set_db(None)
+
+
+@pytest.fixture
+def client(db):
+    flask_app.config['TESTING'] = True
+    return flask_app.test_client()
+
+
+def register(client, role, email, name='', **fields):
+    response = client.post('/api/auth/register', json=dict(
+        email=email, password='secret123', role=role, name=name, **fields))
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['user_id']
+
+
+@pytest.fixture
+def creator(client):
+    creator_id = register(client, 'creator', 'creator@test.com', 'Alice')
+    response = client.put(f'/api/creators/{creator_id}', json={
+        'category': 'tech',
+        'bio': 'Gadget reviews and unboxing videos',
+        'service_packages': [{'name': 'Review video', 'price': 300}],
+        'social_links': {'youtube': '@alice'},
+    })
+    assert response.status_code == 200
+    return creator_id
+
+
+@pytest.fixture
+def business(client):
+    return register(client, 'business', 'business@test.com', 'Bob Co')
+
+
+@pytest.fixture
+def campaign(client, business):
+    response = client.post('/api/campaigns/', json={
+        'business_id': business, 'title': 'Launch', 'description': 'New phone', 'budget': 5000,
+        'category': 'tech', 'deadline': '2030-01-01T00:00:00',
+    })
+    assert response.status_code == 201
+    return response.get_json()['campaign_id']
@@ -0,0 +1,135 @@
+import json
+
+
+def _apply(client, campaign, creator, bid=300):
+    return client.post('/api/applications/', json={
+        'campaign_id': campaign, 'creator_id': creator, 'creator_name': 'Alice', 'bid_amount': bid})
+
+
+def test_apply_once(client, creator, campaign):
+    assert _apply(client, campaign, creator).status_code == 201
+    assert _apply(client, campaign, creator).status_code == 409
+    assert client.post('/api/applications/', json={'campaign_id': campaign}).status_code == 400
+
+    listed = client.get(f'/api/applications/campaign/{campaign}').get_json()
+    assert [a['creator_id'] for a in listed] == [creator]
+    assert len(client.get(f'/api/applications/creator/{creator}').get_json()) == 1
+
+
+def test_concurrent_applications_create_one(client, db, creator, campaign):
+    from concurrent.futures import ThreadPoolExecutor
+    from app import app
+
+    def attempt(_):
+        return _apply(app.test_client(), campaign, creator).status_code
+
+    with ThreadPoolExecutor(16) as pool:
+        statuses = list(pool.map(attempt, range(32)))
+
+    assert statuses.count(201) == 1
+    assert statuses.count(409) == 31
+    assert db.applications.count_documents({'campaign_id': campaign, 'creator_id': creator}) == 1
+
+
+def test_apply_notifies_business(client, business, creator, campaign):
+    _apply(client, campaign, creator)
+    notifications = client.get(f'/api/notifications/?user_id={business}').get_json()
+    assert notifications['unread_count'] == 1
+    assert notifications['notifications'][0]['type'] == 'new_application'
+
+
+def test_status_updates(client, creator, campaign):
+    app_id = _apply(client, campaign, creator).get_json()['application_id']
+
+    response = client.patch(f'/api/applications/{app_id}/status', json={'status': 'accepted'})
+    assert response.status_code == 200
+    assert client.patch(f'/api/applications/{app_id}/status', json={'status': 'maybe'}).status_code == 400
+    assert client.patch('/api/applications/000000000000000000000000/status',
+                        json={'status': 'accepted'}).status_code == 404
+
+    response = client.patch('/api/applications/status', json={'updates': [
+        {'application_id': app_id, 'status': 'rejected'},
+        {'application_id': '000000000000000000000000', 'status': 'rejected'},
+    ]})
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body['updated'] == 1
+    assert [r['result'] for r in body['results']] == ['updated', 'not_found']
+    assert client.get(f'/api/applications/creator/{creator}').get_json()[0]['status'] == 'rejected'
+
+
+def test_status_changes_feed_business_analytics(client, business, creator, campaign):
+    app_id = _apply(client, campaign, creator, bid=400).get_json()['application_id']
+    client.patch(f'/api/applications/{app_id}/status', json={'status': 'accepted'})
+
+    totals = client.get(f'/api/businesses/{business}/analytics?days=7').get_json()['totals']
+    assert totals['applications'] == 1
+    assert totals['accepted'] == 1
+    assert totals['pending'] == 0
+    assert totals['accepted_bid_total'] == 400
+
+
+def test_export_ndjson(client, creator, campaign):
+    _apply(client, campaign, creator)
+    response = client.get(f'/api/applications/campaign/{campaign}/export?format=ndjson')
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [r['creator_id'] for r in rows] == [creator]
+    assert client.get(f'/api/applications/campaign/{campaign}/export?format=xml').status_code == 400
+
+
+def test_bulk_status_accepts_uppercase_ids(client, creator, campaign):
+    app_id = _apply(client, campaign, creator).get_json()['application_id']
+    response = client.patch('/api/applications/status', json={'updates': [
+        {'application_id': app_id.upper(), 'status': 'accepted'}]})
+    assert [r['result'] for r in response.get_json()['results']] == ['updated']
+
+
+def test_bulk_status_reports_concurrent_change_as_conflict(client, db, business, creator, campaign, monkeypatch):
+    from bson import ObjectId
+    from conftest import register
+    app_id = _apply(client, campaign, creator, bid=400).get_json()['application_id']
+    other_creator = register(client, 'creator', 'other@test.com', 'Carol')
+    other_id = _apply(client, campaign, other_creator, bid=100).get_json()['application_id']
+    find = db.applications.find
+
+    def reject_after_read(*args, **kwargs):
+        docs = list(find(*args, **kwargs))
+        monkeypatch.undo()
+        db.applications.update_one({'_id': ObjectId(app_id)}, {'$set': {'status': 'rejected'}})
+        return docs
+    monkeypatch.setattr(db.applications, 'find', reject_after_read)
+
+    response = client.patch('/api/applications/status', json={'updates': [
+        {'application_id': app_id, 'status': 'accepted'},
+        {'application_id': other_id, 'status': 'accepted'}]})
+    body = response.get_json()
+    assert [r['result'] for r in body['results']] == ['conflict', 'updated']
+    assert body['updated'] == 1
+    assert db.applications.find_one({'_id': ObjectId(app_id)})['status'] == 'rejected'
+    totals = client.get(f'/api/businesses/{business}/analytics?days=7').get_json()['totals']
+    assert totals['accepted'] == 1
+    assert totals['accepted_bid_total'] == 100
+
+
+def test_bulk_status_set_back_in_one_batch_is_unchanged(client, db, creator, campaign):
+    from bson import ObjectId
+    app_id = _apply(client, campaign, creator).get_json()['application_id']
+    response = client.patch('/api/applications/status', json={'updates': [
+        {'application_id': app_id, 'status': 'accepted'},
+        {'application_id': app_id, 'status': 'pending'}]})
+    body = response.get_json()
+    assert [r['result'] for r in body['results']] == ['unchanged', 'unchanged']
+    assert body['updated'] == 0
+    assert db.applications.find_one({'_id': ObjectId(app_id)})['status'] == 'pending'
+
+
+def test_creator_applications_carry_campaign_even_when_closed(client, db, business, creator, campaign):
+    from bson import ObjectId
+    _apply(client, campaign, creator)
+    db.campaigns.update_one({'_id': ObjectId(campaign)}, {'$set': {'status': 'closed'}})
+    [app] = client.get(f'/api/applications/creator/{creator}').get_json()
+    assert app['campaign_title']
+    assert app['campaign_status'] == 'closed'
+    assert app['business_id'] == business
+    assert app['business_name'] == 'Bob Co'
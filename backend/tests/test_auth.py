@@ -0,0 +1,46 @@
+from conftest import register
+
+
+def test_register_and_login(client):
+    user_id = register(client, 'creator', 'Alice@Example.com', 'Alice')
+
+    response = client.post('/api/auth/login', json={'email': 'alice@example.com ', 'password': 'secret123'})
+    assert response.status_code == 200
+    assert response.get_json()['user_id'] == user_id
+    assert response.get_json()['role'] == 'creator'
+
+
+def test_login_rejects_wrong_password(client):
+    register(client, 'business', 'bob@example.com')
+    response = client.post('/api/auth/login', json={'email': 'bob@example.com', 'password': 'nope'})
+    assert response.status_code == 401
+
+
+def test_register_requires_fields(client):
+    response = client.post('/api/auth/register', json={'email': 'x@example.com'})
+    assert response.status_code == 400
+
+
+def test_register_duplicate_email_conflicts(client):
+    register(client, 'creator', 'dup@example.com')
+    response = client.post('/api/auth/register', json={
+        'email': ' DUP@example.com', 'password': 'secret123', 'role': 'creator'})
+    assert response.status_code == 409
+
+
+
+def test_concurrent_registrations_create_one_account(client, db, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from app import app
+
+    def attempt(i):
+        return app.test_client().post('/api/auth/register', json={
+            'email': 'race@example.com' if i % 2 else 'RACE@example.com ',
+            'password': 'secret123', 'role': 'creator', 'name': f'racer {i}'}).status_code
+
+    with ThreadPoolExecutor(16) as pool:
+        statuses = list(pool.map(attempt, range(64)))
+
+    assert statuses.count(201) == 1
+    assert statuses.count(409) == 63
+    assert db.users.count_documents({'email_normalized': 'race@example.com'}) == 1
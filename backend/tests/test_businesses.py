@@ -0,0 +1,13 @@
+def test_search_and_profile(client, business):
+    results = client.get('/api/businesses/search?q=bob').get_json()
+    assert [b['_id'] for b in results] == [business]
+    assert client.get(f'/api/businesses/{business}').status_code == 200
+
+
+def test_analytics_empty_business(client, business):
+    response = client.get(f'/api/businesses/{business}/analytics?days=3')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['totals']['applications'] == 0
+    assert len(body['totals']['daily']) == 3
+    assert client.get(f'/api/businesses/{business}/analytics?days=x').status_code == 400
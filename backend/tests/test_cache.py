@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+
+import cache
+from cache import TTLCache
+
+THREADS = 8
+
+
+def _race(ttl_cache, compute):
+    """Call get_or_compute from THREADS threads at once; compute is held until all are waiting"""
+    barrier = threading.Barrier(THREADS)
+    release = threading.Event()
+    calls = []
+    outcomes = [None] * THREADS
+
+    def held():
+        calls.append(1)
+        assert release.wait(5)
+        return compute()
+
+    def worker(i):
+        barrier.wait()
+        try:
+            outcomes[i] = ('value', ttl_cache.get_or_compute('key', held))
+        except Exception as e:
+            outcomes[i] = ('error', e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    for t in threads:
+        t.start()
+    deadline = time.monotonic() + 5
+    while ttl_cache.coalesced < THREADS - 1 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join(5)
+    return calls, outcomes
+
+
+def test_concurrent_misses_compute_once():
+    ttl_cache = TTLCache(ttl=60)
+    result = object()
+    calls, outcomes = _race(ttl_cache, lambda: result)
+
+    assert len(calls) == 1
+    assert outcomes == [('value', result)] * THREADS
+    assert (ttl_cache.misses, ttl_cache.coalesced, ttl_cache.hits) == (1, THREADS - 1, 0)
+    assert ttl_cache.get_or_compute('key', lambda: pytest.fail('cached value not used')) is result
+    assert ttl_cache.hits == 1
+
+
+def test_followers_get_the_leaders_exception():
+    ttl_cache = TTLCache(ttl=60)
+    error = ValueError('boom')
+
+    def fail():
+        raise error
+    calls, outcomes = _race(ttl_cache, fail)
+
+    assert len(calls) == 1
+    assert outcomes == [('error', error)] * THREADS
+    # Failures are not cached: the next call computes again
+    assert ttl_cache.get_or_compute('key', lambda: 'ok') == 'ok'
+    assert ttl_cache.misses == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    ttl_cache = TTLCache(ttl=10, stale_ttl=5)
+    ttl_cache.set('a', 1)
+    ttl_cache.set('b', 2, ttl=30)
+
+    now[0] += 9
+    assert ttl_cache.get('a') == 1
+    now[0] += 2
+    assert ttl_cache.get('a') is None
+    assert ttl_cache.get('b') == 2
+    # Expired but within stale_ttl
+    assert ttl_cache.get_stale('a') == 1
+    now[0] += 5
+    assert ttl_cache.get_stale('a') is None
+
+    # Entries past stale_ttl are dropped by the next lookup of their key
+    assert ttl_cache.get('a') is None
+    assert ttl_cache.stats() == {
+        'entries': 1, 'hits': 2, 'misses': 2, 'coalesced': 0, 'stale': 1, 'hit_ratio': 0.5}
+
+
+def test_least_recently_used_entry_is_evicted():
+    ttl_cache = TTLCache(ttl=60, max_entries=2)
+    ttl_cache.set('a', 1)
+    ttl_cache.set('b', 2)
+    ttl_cache.get('a')
+    ttl_cache.set('c', 3)
+    assert (ttl_cache.get('a'), ttl_cache.get('b'), ttl_cache.get('c')) == (1, None, 3)
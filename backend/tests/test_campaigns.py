@@ -0,0 +1,95 @@
+def test_create_get_and_list(client, business, campaign):
+    response = client.get(f'/api/campaigns/{campaign}')
+    assert response.status_code == 200
+    assert response.get_json()['title'] == 'Launch'
+    assert response.get_json()['status'] == 'active'
+
+    listed = client.get(f'/api/campaigns/?business_id={business}').get_json()
+    assert [c['_id'] for c in listed] == [campaign]
+    assert listed[0]['business_name'] == 'Bob Co'
+
+
+def test_list_filters(client, campaign):
+    assert len(client.get('/api/campaigns/?status=active&min_budget=1000').get_json()) == 1
+    assert client.get('/api/campaigns/?min_budget=10000').get_json() == []
+    assert client.get('/api/campaigns/?deadline_before=2029-01-01').get_json() == []
+    assert client.get('/api/campaigns/?status=bogus').status_code == 400
+    assert client.get('/api/campaigns/?created_after=yesterday').status_code == 400
+
+
+def test_update_and_close(client, campaign):
+    response = client.patch(f'/api/campaigns/{campaign}', json={'status': 'closed', 'budget': 6000})
+    assert response.status_code == 200
+    updated = client.get(f'/api/campaigns/{campaign}').get_json()
+    assert updated['status'] == 'closed'
+    assert updated['budget'] == 6000
+    assert updated['closed_at']
+    assert client.patch(f'/api/campaigns/{campaign}', json={'status': 'done'}).status_code == 400
+
+
+def test_delete(client, campaign):
+    assert client.delete(f'/api/campaigns/{campaign}').status_code == 200
+    assert client.get(f'/api/campaigns/{campaign}').status_code == 404
+    assert client.delete(f'/api/campaigns/{campaign}').status_code == 404
+
+
+def test_feed_ranks_open_campaigns_and_drops_applied(client, creator, campaign):
+    feed = client.get(f'/api/campaigns/feed/{creator}').get_json()
+    assert [c['_id'] for c in feed['campaigns']] == [campaign]
+    assert feed['next_offset'] is None
+
+    client.post('/api/applications/', json={'campaign_id': campaign, 'creator_id': creator, 'creator_name': 'Alice'})
+    assert client.get(f'/api/campaigns/feed/{creator}').get_json()['campaigns'] == []
+
+
+def test_feed_invalidation_is_scoped_to_the_campaign_category(client, business, creator, campaign):
+    def feed_ids():
+        return [c['_id'] for c in client.get(f'/api/campaigns/feed/{creator}').get_json()['campaigns']]
+
+    def create(category):
+        return client.post('/api/campaigns/', json={
+            'business_id': business, 'title': category, 'description': 'x', 'budget': 500,
+            'category': category}).get_json()['campaign_id']
+
+    assert feed_ids() == [campaign]
+    other = create('food')
+    assert feed_ids() == [campaign]  # cached until it expires
+    matching = create('tech')
+    assert set(feed_ids()) == {campaign, other, matching}
+
+    client.patch(f'/api/campaigns/{campaign}', json={'status': 'closed'})
+    client.delete(f'/api/campaigns/{matching}')
+    assert feed_ids() == [other]
+
+
+def test_feed_unknown_creator(client):
+    assert client.get('/api/campaigns/feed/000000000000000000000000').status_code == 404
+
+
+def test_deadline_offsets_are_stored_as_utc(client, business):
+    response = client.post('/api/campaigns/', json={
+        'business_id': business, 'title': 'Offset', 'description': 'x', 'budget': 100, 'deadline': '2030-01-01T02:00:00+02:00'})
+    campaign = client.get(f"/api/campaigns/{response.get_json()['campaign_id']}").get_json()
+    assert campaign['deadline'] == '2030-01-01T00:00:00'
+
+
+def test_archive_keeps_campaign_reopened_mid_run(client, db, creator, campaign, monkeypatch):
+    from datetime import datetime, timedelta
+    from bson import ObjectId
+    from models.campaign import Campaign
+
+    client.post('/api/applications/', json={'campaign_id': campaign, 'creator_id': creator, 'creator_name': 'Alice'})
+    client.patch(f'/api/campaigns/{campaign}', json={'status': 'closed'})
+    copy = db.campaigns_archive.bulk_write
+
+    def reopen_after_copy(requests, **kwargs):
+        result = copy(requests, **kwargs)
+        db.campaigns.update_one({'_id': ObjectId(campaign)}, {'$set': {'status': 'active'}})
+        return result
+    monkeypatch.setattr(db.campaigns_archive, 'bulk_write', reopen_after_copy)
+
+    assert Campaign.archive_closed(datetime.utcnow() + timedelta(days=1)) == (0, 0)
+    assert client.get(f'/api/campaigns/{campaign}').get_json()['status'] == 'active'
+    assert db.applications.count_documents({'campaign_id': campaign}) == 1
+    assert db.campaigns_archive.count_documents({}) == 0
+    assert db.applications_archive.count_documents({}) == 0
@@ -0,0 +1,69 @@
+import pytest
+
+from conftest import register
+
+
+def test_profile(client, creator):
+    response = client.get(f'/api/creators/{creator}')
+    assert response.status_code == 200
+    assert response.get_json()['profile']['category'] == 'tech'
+    assert client.get('/api/creators/000000000000000000000000').status_code == 404
+
+
+def test_search_filters_and_facets(client, creator):
+    other = register(client, 'creator', 'other@test.com', 'Olga')
+    client.put(f'/api/creators/{other}', json={'category': 'food'})
+
+    results = client.get('/api/creators/search?category=tech').get_json()
+    assert [c['_id'] for c in results] == [creator]
+    assert [c['_id'] for c in client.get('/api/creators/search?min_price=100&max_price=500').get_json()] == [creator]
+    assert client.get('/api/creators/search?platforms=instagram').get_json() == []
+
+    faceted = client.get('/api/creators/search?facets=true').get_json()
+    assert faceted['facets']['category'] == {'food': 1, 'tech': 1}
+    assert len(faceted['results']) == 2
+
+
+@pytest.mark.parametrize('use_index', [False, True])
+def test_price_filter_applies_before_limit(client, creator, monkeypatch, use_index):
+    import creator_index
+    import routes.creators
+    if use_index:
+        pytest.importorskip('numpy')
+        monkeypatch.setattr(creator_index, 'CREATOR_INDEX', True)
+        monkeypatch.setattr(routes.creators, 'creator_index', creator_index.CreatorIndexService())
+    pricey = register(client, 'creator', 'pricey@test.com', 'Petra')
+    client.put(f'/api/creators/{pricey}', json={'service_packages': [{'name': 'Film', 'price': 900}]})
+
+    # The cheaper creator comes first, so limiting first would return nothing
+    page = client.get('/api/creators/search?min_price=800&limit=1').get_json()
+    assert [c['_id'] for c in page] == [pricey]
+    if not use_index:
+        faceted = client.get('/api/creators/search?min_price=800&limit=1&facets=true').get_json()
+        assert [c['_id'] for c in faceted['results']] == [pricey]
+
+
+def test_leaderboard_after_review(client, creator, business):
+    from jobs import refresh_leaderboards
+    client.post('/api/reviews/', json={'creator_id': creator, 'reviewer_id': business,
+                                       'reviewer_name': 'Bob', 'rating': 4})
+    refresh_leaderboards()
+    board = client.get('/api/creators/leaderboard?by=rating').get_json()
+    assert [c['_id'] for c in board['creators']] == [creator]
+    assert client.get('/api/creators/leaderboard?by=likes').status_code == 400
+
+
+def test_similar_creators(client, creator):
+    twin = register(client, 'creator', 'twin@test.com', 'Tom')
+    client.put(f'/api/creators/{twin}', json={'category': 'tech', 'bio': 'Gadget unboxing videos'})
+    stranger = register(client, 'creator', 'stranger@test.com', 'Sue')
+    client.put(f'/api/creators/{stranger}', json={'category': 'food', 'bio': 'Vegan baking'})
+
+    similar = client.get(f'/api/creators/{creator}/similar').get_json()['creators']
+    assert similar[0]['_id'] == twin
+    assert creator not in [c['_id'] for c in similar]
+
+
+def test_suggest(client, creator):
+    results = client.get('/api/search/suggest?q=ali').get_json()
+    assert [r['_id'] for r in results] == [creator]
@@ -0,0 +1,11 @@
+import pytest
+
+import database
+import memorydb
+
+
+def test_unique_index_failure_is_fatal():
+    db = memorydb.connect('memory://tests/duplicates')
+    db.users.insert_many([{'email': 'same@example.com'}, {'email': 'Same@Example.com'}])
+    with pytest.raises(database.UniqueIndexError, match='uniq_email_normalized'):
+        database.ensure_indexes(db)
@@ -0,0 +1,79 @@
+def _conversation(client, campaign, creator, business, **params):
+    query = '&'.join(f'{k}={v}' for k, v in dict(
+        campaign_id=campaign, creator_id=creator, business_id=business, **params).items())
+    return client.get(f'/api/messages/conversation?{query}')
+
+
+def test_send_and_read_conversation(client, creator, business, campaign):
+    for i in range(3):
+        sender, receiver = (creator, business) if i % 2 == 0 else (business, creator)
+        response = client.post('/api/messages/', json={
+            'campaign_id': campaign, 'sender_id': sender, 'receiver_id': receiver, 'content': f'm{i}'})
+        assert response.status_code == 201
+
+    messages = _conversation(client, campaign, creator, business).get_json()
+    assert [m['content'] for m in messages] == ['m0', 'm1', 'm2']
+    latest = _conversation(client, campaign, creator, business, limit=2).get_json()
+    assert [m['content'] for m in latest] == ['m1', 'm2']
+    assert client.get('/api/messages/conversation').status_code == 400
+
+
+def test_conversation_limit_is_clamped(client, creator, business, campaign, monkeypatch):
+    import models.message
+    monkeypatch.setattr(models.message, 'MAX_CONVERSATION_MESSAGES', 2)
+    for i in range(3):
+        client.post('/api/messages/', json={
+            'campaign_id': campaign, 'sender_id': creator, 'receiver_id': business, 'content': f'm{i}'})
+
+    def contents(**params):
+        return [m['content'] for m in _conversation(client, campaign, creator, business, **params).get_json()]
+
+    assert contents() == ['m1', 'm2']
+    assert contents(limit=1000) == ['m1', 'm2']
+    assert contents(limit=-1) == ['m2']
+    assert contents(limit=0) == ['m2']
+    assert _conversation(client, campaign, creator, business, limit='all').status_code == 400
+
+
+def test_export_csv(client, creator, business, campaign):
+    client.post('/api/messages/', json={
+        'campaign_id': campaign, 'sender_id': creator, 'receiver_id': business, 'content': 'hello'})
+    response = client.get(f'/api/messages/conversation/export?campaign_id={campaign}'
+                          f'&creator_id={creator}&business_id={business}')
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0].startswith('_id,campaign_id')
+    assert lines[1].endswith(tuple('0123456789')) and 'hello' in lines[1]
+
+
+def test_conversation_pages_back_with_before(client, creator, business, campaign, monkeypatch):
+    from urllib.parse import quote
+    import models.message
+    monkeypatch.setattr(models.message, 'MAX_CONVERSATION_MESSAGES', 2)
+    for i in range(5):
+        client.post('/api/messages/', json={
+            'campaign_id': campaign, 'sender_id': creator, 'receiver_id': business, 'content': f'm{i}'})
+
+    pages = []
+    response = _conversation(client, campaign, creator, business)
+    while True:
+        pages.append([m['content'] for m in response.get_json()])
+        if response.headers['X-Has-More'] != 'true':
+            assert 'X-Next-Before' not in response.headers
+            break
+        before = quote(response.headers['X-Next-Before'])
+        response = _conversation(client, campaign, creator, business, before=before)
+    assert pages == [['m3', 'm4'], ['m1', 'm2'], ['m0']]
+    assert _conversation(client, campaign, creator, business, before='x|zzz').status_code == 400
+
+
+def test_export_csv_escapes_formulas(client, creator, business, campaign):
+    import csv
+    import io
+    for content in ['=HYPERLINK("http://evil")', '+1', '-2+3', '@SUM(A1)', 'fine = ok']:
+        client.post('/api/messages/', json={
+            'campaign_id': campaign, 'sender_id': creator, 'receiver_id': business, 'content': content})
+    response = client.get(f'/api/messages/conversation/export?campaign_id={campaign}'
+                          f'&creator_id={creator}&business_id={business}')
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [r['content'] for r in rows] == [
+        '\'=HYPERLINK("http://evil")', "'+1", "'-2+3", "'@SUM(A1)", 'fine = ok']
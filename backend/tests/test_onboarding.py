@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash
+
+import onboarding
+
+
+def test_hash_pool_from_a_request_thread(monkeypatch):
+    monkeypatch.setattr(onboarding, 'ONBOARD_HASH_WORKERS', 2)
+    try:
+        with ThreadPoolExecutor(1) as threads:
+            hashes = threads.submit(onboarding.hash_passwords, ['first', 'second']).result(timeout=60)
+        assert onboarding._pool._mp_context.get_start_method() != 'fork'
+    finally:
+        onboarding.shutdown_pool()
+    assert check_password_hash(hashes[0], 'first')
+    assert check_password_hash(hashes[1], 'second')
+
+
+def _import(client, body, **params):
+    query = '&'.join(f'{k}={v}' for k, v in params.items())
+    content_type = 'text/csv' if params.get('format') == 'csv' else 'application/x-ndjson'
+    response = client.post(f'/api/auth/import?{query}', data=body, content_type=content_type)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def _ndjson(*records):
+    import json
+    return '\n'.join(json.dumps(r) for r in records)
+
+
+def _creator(email, **fields):
+    return dict({'email': email, 'password': 'secret123', 'role': 'creator', 'name': 'Jane Doe',
+                 'category': 'Tech'}, **fields)
+
+
+def test_import_normalises_rows(client, db, monkeypatch):
+    monkeypatch.setattr(onboarding, 'ONBOARD_HASH_WORKERS', 1)
+    report = _import(client, _ndjson(_creator(
+        'jane@example.com', followers='12,500',
+        social_links={'instagram': 'https://www.instagram.com/jane.doe/', 'tiktok': 'jane'},
+        service_packages='Reel:$1,200|Story:99.5')))
+    assert (report['received'], report['imported'], report['invalid']) == (1, 1, 0)
+
+    user = db.users.find_one({'email': 'jane@example.com'})
+    assert user['category'] == 'tech'
+    assert user['followers'] == 12500
+    assert user['social_links'] == {'instagram': '@jane.doe', 'tiktok': '@jane'}
+    assert [(p['name'], p['price']) for p in user['service_packages']] == [('Reel', 1200), ('Story', 99.5)]
+    assert check_password_hash(user['password'], 'secret123')
+
+
+def test_import_csv_with_default_role(client, db, monkeypatch):
+    monkeypatch.setattr(onboarding, 'ONBOARD_HASH_WORKERS', 1)
+    body = ('email,password,name,business_type,social_links.instagram\n'
+            'shop@example.com,secret123,Shop,Fashion,\n')
+    report = _import(client, body, format='csv', role='business')
+    assert report['imported'] == 1
+    assert db.users.find_one({'email': 'shop@example.com'})['business_type'] == 'fashion'
+
+
+def test_import_reports_invalid_and_duplicate_rows(client, db, creator, monkeypatch):
+    monkeypatch.setattr(onboarding, 'ONBOARD_HASH_WORKERS', 1)
+    report = _import(client, _ndjson(
+        _creator('new@example.com'),
+        _creator('bad-email'),
+        _creator('cheap@example.com', service_packages=[{'name': 'Post', 'price': -5}]),
+        _creator('handle@example.com', social_links={'youtube': 'not a handle!'}),
+        _creator('new@example.com', name='Again'),
+        _creator('creator@test.com'),
+    ) + '\n{not json', role='creator')
+
+    assert report['received'] == 7
+    assert report['imported'] == 1
+    assert report['invalid'] == 4
+    assert report['duplicates'] == 2
+    by_line = {e['line']: e['errors'] for e in report['errors']}
+    assert by_line[2] == ['invalid email']
+    assert by_line[3] == ['service_packages: invalid price']
+    assert by_line[4] == ['invalid youtube handle']
+    assert by_line[5] == by_line[6] == ['email already registered']
+    assert by_line[7][0].startswith('invalid JSON')
+    assert db.users.count_documents({'email': 'new@example.com'}) == 1
+    assert db.users.find_one({'email': 'new@example.com'})['name'] == 'Jane Doe'
+
+
+def test_import_dry_run_writes_nothing(client, db, monkeypatch):
+    monkeypatch.setattr(onboarding, 'ONBOARD_HASH_WORKERS', 1)
+    report = _import(client, _ndjson(_creator('dry@example.com'), _creator('nope')), dry_run='true')
+    assert (report['received'], report['valid'], report['invalid'], report['imported']) == (2, 1, 1, 0)
+    assert db.users.count_documents({}) == 0
+
+
+def test_import_rejects_bad_parameters(client):
+    assert client.post('/api/auth/import?format=xml', data='').status_code == 400
+    assert client.post('/api/auth/import?role=admin', data='').status_code == 400
@@ -0,0 +1,50 @@
+import copy
+
+import ratelimit
+
+
+def _overrides(monkeypatch, **env):
+    classes = copy.deepcopy(ratelimit.ROUTE_CLASSES)
+    monkeypatch.setattr(ratelimit, 'ROUTE_CLASSES', classes)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    ratelimit._load_overrides()
+    return classes
+
+
+def test_rate_overrides(monkeypatch):
+    classes = _overrides(monkeypatch, RATE_LIMIT_AUTH='20/30', RATE_LIMIT_SEARCH='0', CONCURRENCY_EXPORT='5')
+    assert (classes['auth']['burst'], classes['auth']['period']) == (20, 30)
+    assert classes['search']['burst'] == 0
+    assert classes['export']['concurrency'] == 5
+
+
+def test_invalid_rate_overrides_are_ignored(monkeypatch):
+    defaults = ratelimit.ROUTE_CLASSES
+    classes = _overrides(monkeypatch, RATE_LIMIT_AUTH='10/0', RATE_LIMIT_SEARCH='5/-1',
+                         RATE_LIMIT_WRITE='-3/60', RATE_LIMIT_EXPORT='lots', CONCURRENCY_IMPORT='two')
+    assert classes == defaults
+
+
+def test_proxy_hops():
+    assert [ratelimit._proxy_hops(v) for v in ('false', 'true', '2', '0', 'lots', '')] == [0, 1, 2, 0, 0, 0]
+
+
+def test_trusted_proxy_sets_client_address(monkeypatch, tmp_path):
+    from flask import Flask, request
+    monkeypatch.setattr(ratelimit, 'TRUST_PROXY', 1)
+    monkeypatch.setattr(ratelimit, 'RATE_LIMIT_ENABLED', True)
+    app = Flask(__name__)
+    ratelimit.init_app(app, ratelimit.AdmissionController(str(tmp_path), {'default': {'burst': 0, 'period': 0}}))
+
+    @app.route('/who')
+    def who():
+        return ratelimit.client_id(request)
+
+    client = app.test_client()
+    # Only the hop added by the trusted proxy counts; the client's own
+    # X-Forwarded-For entries are ignored
+    response = client.get('/who', headers={'X-Forwarded-For': '6.6.6.6, 203.0.113.9'},
+                          environ_base={'REMOTE_ADDR': '10.0.0.1'})
+    assert response.get_data(as_text=True) == '203.0.113.9'
+    assert client.get('/who', environ_base={'REMOTE_ADDR': '10.0.0.1'}).get_data(as_text=True) == '10.0.0.1'
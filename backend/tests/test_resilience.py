@@ -0,0 +1,86 @@
+"""
+Fault injection on the in-memory engine, as bench.faults does at scale:
+slow every database call past the deadline and check the breaker opens,
+cache hits are still served and not counted, and a real probe closes it.
+"""
+
+import time
+
+import pytest
+
+import database
+import resilience
+from bench.faults import SlowDatabase
+
+SEARCH = '/api/creators/search?category=tech'
+
+
+@pytest.fixture
+def faults(db, monkeypatch):
+    for cls in list(resilience.DEADLINES):
+        monkeypatch.setitem(resilience.DEADLINES, cls, 0.2)
+    monkeypatch.setattr(resilience, 'breaker', resilience.CircuitBreaker(
+        'mongo', window=4, min_calls=2, failure_rate=0.5, open_seconds=0.5))
+    slow = SlowDatabase(db)
+    database.set_db(slow)
+    return slow
+
+
+def test_breaker_opens_on_timeouts_and_ignores_cache_hits(client, creator, faults):
+    breaker = resilience.breaker
+    assert client.get(SEARCH).status_code == 200
+    assert len(breaker._outcomes) == 1
+
+    # Cache hits never touch the database and are not counted
+    for _ in range(5):
+        assert client.get(SEARCH).status_code == 200
+    assert len(breaker._outcomes) == 1
+
+    faults.delay = 1.0
+    for _ in range(2):
+        started = time.monotonic()
+        response = client.get(f'/api/creators/{creator}')
+        assert response.status_code == 503
+        assert time.monotonic() - started < faults.delay
+    assert breaker.state == resilience.OPEN
+
+    # Open: uncached requests fail fast, cached ones are still answered
+    response = client.get(f'/api/creators/{creator}')
+    assert response.status_code == 503 and response.headers['Retry-After']
+    assert client.get(SEARCH).status_code == 200
+
+    faults.delay = 0.0
+    time.sleep(breaker.open_seconds)
+    # A probe answered from the cache must not close the breaker
+    assert client.get(SEARCH).status_code == 200
+    assert breaker.state == resilience.HALF_OPEN
+
+    assert client.get(f'/api/creators/{creator}').status_code == 200
+    assert breaker.state == resilience.CLOSED
+
+
+def test_only_database_time_makes_a_request_slow(client, db, creator, monkeypatch):
+    import instrumentation
+    import routes.auth
+    monkeypatch.setattr(resilience, 'BREAKER_SLOW_SECONDS', 0.05)
+    monkeypatch.setattr(resilience, 'breaker', resilience.CircuitBreaker('mongo', window=4, min_calls=4))
+    breaker = resilience.breaker
+    check_password_hash = routes.auth.check_password_hash
+
+    def slow_hash(*args):
+        time.sleep(0.1)
+        return check_password_hash(*args)
+    monkeypatch.setattr(routes.auth, 'check_password_hash', slow_hash)
+    login = {'email': 'creator@test.com', 'password': 'secret123'}
+    assert client.post('/api/auth/login', json=login).status_code == 200
+    assert list(breaker._outcomes) == [True]
+
+    # What the command listener reports for a slow Mongo query
+    find_one = db.users.find_one
+
+    def slow_find_one(*args, **kwargs):
+        instrumentation.current_stats().db_seconds += 0.1
+        return find_one(*args, **kwargs)
+    monkeypatch.setattr(db.users, 'find_one', slow_find_one)
+    assert client.post('/api/auth/login', json=login).status_code == 200
+    assert list(breaker._outcomes) == [True, False]
@@ -0,0 +1,96 @@
+def test_review_once(client, creator, business):
+    review = {'creator_id': creator, 'reviewer_id': business, 'reviewer_name': 'Bob', 'rating': 5}
+    assert client.post('/api/reviews/', json=review).status_code == 201
+    assert client.post('/api/reviews/', json=review).status_code == 409
+    assert client.post('/api/reviews/', json=dict(review, rating=9)).status_code == 400
+
+    reviews = client.get(f'/api/reviews/creator/{creator}').get_json()
+    assert len(reviews['reviews']) == 1
+    assert reviews['average_rating'] == 5
+    profile = client.get(f'/api/creators/{creator}').get_json()['profile']
+    assert profile['average_rating'] == 5
+    assert profile['review_count'] == 1
+
+
+def test_concurrent_reviews_create_one(client, db, creator, business):
+    from concurrent.futures import ThreadPoolExecutor
+    from app import app
+    review = {'creator_id': creator, 'reviewer_id': business, 'reviewer_name': 'Bob', 'rating': 4}
+
+    def attempt(_):
+        return app.test_client().post('/api/reviews/', json=review).status_code
+
+    with ThreadPoolExecutor(16) as pool:
+        statuses = list(pool.map(attempt, range(32)))
+
+    assert statuses.count(201) == 1
+    assert statuses.count(409) == 31
+    assert db.reviews.count_documents({'creator_id': creator, 'reviewer_id': business}) == 1
+
+
+def test_notifications_paging_and_read(client, business, campaign):
+    from models.notification import Notification
+    for i in range(3):
+        Notification.create({'user_id': business, 'type': 'test', 'title': f'n{i}', 'message': ''})
+
+    first = client.get(f'/api/notifications/?user_id={business}&limit=2').get_json()
+    assert [n['title'] for n in first['notifications']] == ['n2', 'n1']
+    assert first['unread_count'] == 3
+    rest = client.get(f"/api/notifications/?user_id={business}&limit=2&cursor={first['next_cursor']}").get_json()
+    assert [n['title'] for n in rest['notifications']] == ['n0']
+    assert rest['next_cursor'] is None
+
+    client.post(f"/api/notifications/{first['notifications'][0]['_id']}/read")
+    assert client.get(f'/api/notifications/?user_id={business}').get_json()['unread_count'] == 2
+    assert client.get('/api/notifications/').status_code == 400
+
+
+def test_trim_keep_zero_deletes_everything(db, business):
+    from models.notification import Notification
+    for i in range(3):
+        Notification.create({'user_id': business, 'type': 'test', 'title': f'n{i}', 'message': ''})
+    assert Notification.trim_user(business, keep=2) == 1
+    assert Notification.trim_user(business, keep=0) == 2
+    assert db.notifications.count_documents({'user_id': business}) == 0
+
+
+def test_malformed_cursor_is_rejected(client, business):
+    for cursor in ['nope', '2024-01-01T00:00:00|zzz', '2024-01-01T00:00:00|']:
+        res = client.get(f"/api/notifications/?user_id={business}&cursor={cursor}")
+        assert res.status_code == 400
+        assert res.get_json()['error'] == 'Invalid cursor'
+
+
+def test_compaction_keeps_notifications_read_meanwhile(db, business, campaign, monkeypatch):
+    from models.notification import Notification
+    ids = Notification.create_many([
+        {'user_id': business, 'type': 'new_application', 'campaign_id': campaign, 'title': 'New', 'message': 'm'}
+        for _ in range(3)])
+    insert_many = db.notifications.insert_many
+
+    def read_one_first(docs, **kwargs):
+        Notification.mark_as_read(ids[0])
+        return insert_many(docs, **kwargs)
+    monkeypatch.setattr(db.notifications, 'insert_many', read_one_first)
+
+    assert Notification.compact() == 1
+    left = list(db.notifications.find({'user_id': business}))
+    assert sorted(n['read'] for n in left) == [False, True]
+    summary = next(n for n in left if n.get('compacted'))
+    # Only the two that were actually removed are counted
+    assert summary['count'] == 2
+    assert summary['title'] == '2 New Applications'
+    assert summary['message'] == 'm (+1 more)'
+
+
+def test_read_at_backfill(db):
+    from datetime import datetime
+    import database
+    created = datetime(2024, 1, 1)
+    db.notifications.insert_many([
+        {'user_id': 'u', 'read': True, 'created_at': created},
+        {'user_id': 'u', 'read': False, 'created_at': created},
+    ])
+    database.ensure_indexes(db)
+    assert db.notifications.find_one({'read': True})['read_at'] == created
+    assert 'read_at' not in db.notifications.find_one({'read': False})
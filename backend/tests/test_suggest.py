@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+import suggest
+from suggest import PrefixIndex
+
+
+def _brute_force(rows, prefix, kind, limit):
+    best = {}
+    for doc_id, doc_kind, name, category, score in rows.values():
+        if kind is not None and doc_kind != kind:
+            continue
+        for term in suggest._terms(name, category):
+            if term.startswith(prefix):
+                rank = (term == prefix, float(score))
+                best[doc_id] = max(best.get(doc_id, rank), rank)
+    ranked = sorted(best, key=lambda doc_id: (not best[doc_id][0], -best[doc_id][1], doc_id))
+    return ranked[:limit]
+
+
+def test_short_prefix_returns_best_scored_not_alphabetical():
+    index = PrefixIndex()
+    index.load([(f'id{i:04}', 'creator', f'a{i:04}', 'tech', i) for i in range(1000)])
+    index.upsert('star', 'creator', 'alex star', 'tech', 10_000_000)
+    assert [r['_id'] for r in index.suggest('a', limit=3)] == ['star', 'id0999', 'id0998']
+    # Exact term matches still come first
+    assert index.suggest('tech', limit=1)[0]['_id'] == 'star'
+
+
+def test_updates_keep_lookups_exact(monkeypatch):
+    monkeypatch.setattr(suggest, 'SCAN_LIMIT', 20)
+    monkeypatch.setattr(suggest, 'TOP_K', 8)
+    # Small chunks so updates split and empty them
+    monkeypatch.setattr(suggest, 'CHUNK_SIZE', 4)
+    rng = random.Random(0)
+    words = ['al', 'alex', 'alba', 'bob', 'bea', 'tech', 'food']
+
+    def row(doc_id):
+        name = ' '.join(rng.sample(words, 2))
+        return (doc_id, rng.choice(['creator', 'business']), name, rng.choice(['tech', 'food']), rng.randrange(50))
+
+    rows = {f'u{i:03}': row(f'u{i:03}') for i in range(200)}
+    index = PrefixIndex()
+    index.load(rows.values())
+    prefixes = ['a', 'al', 'alex', 'b', 't', 'tech', 'f']
+    for step in range(600):
+        doc_id = f'u{rng.randrange(260):03}'
+        if rng.random() < 0.2:
+            rows.pop(doc_id, None)
+            index.remove(doc_id)
+        else:
+            rows[doc_id] = row(doc_id)
+            index.upsert(*rows[doc_id])
+        if step % 20 == 0:
+            for prefix in prefixes:
+                for kind in (None, 'creator', 'business'):
+                    got = [r['_id'] for r in index.suggest(prefix, kind, limit=5)]
+                    assert got == _brute_force(rows, prefix, kind, 5), (step, prefix, kind)
+    assert index.term_count == sum(len(suggest._terms(r[2], r[3])) for r in rows.values())
+
+
+@pytest.mark.parametrize('score', [None, 'lots', float('nan')])
+def test_odd_scores_count_as_zero(score):
+    index = PrefixIndex()
+    index.upsert('x', 'creator', 'xena', 'tech', score)
+    index.upsert('y', 'creator', 'xavier', 'tech', 5)
+    assert [r['_id'] for r in index.suggest('x')] == ['y', 'x']
@@ -33,6 +33,7 @@ const BusinessDashboard = () => {
 
     // Messages state
     const [messages, setMessages] = useState([]);
+    const [olderBefore, setOlderBefore] = useState(null); // Cursor for the page before the loaded messages
     const [selectedChat, setSelectedChat] = useState(null);
     const [newMessage, setNewMessage] = useState('');
 
@@ -188,15 +189,18 @@ const BusinessDashboard = () => {
         }
     };
 
-    // Load messages for a chat
-    const loadMessages = async (campaignId, creatorId) => {
+    // Load messages for a chat; with `before`, prepend the page older than it
+    const loadMessages = async (campaignId, creatorId, before = null) => {
         try {
             const user = JSON.parse(localStorage.getItem('user'));
-            const res = await fetch(`${API_BASE}/api/messages/conversation?campaign_id=${campaignId}&creator_id=${creatorId}&business_id=${user.user_id}`);
+            const older = before ? `&before=${encodeURIComponent(before)}` : '';
+            const res = await fetch(`${API_BASE}/api/messages/conversation?campaign_id=${campaignId}&creator_id=${creatorId}&business_id=${user.user_id}${older}`);
             const data = await res.json();
             if (Array.isArray(data)) {
                 // Map timestamp to created_at for consistency
-                setMessages(data.map(m => ({ ...m, created_at: m.timestamp || m.created_at })));
+                const page = data.map(m => ({ ...m, created_at: m.timestamp || m.created_at }));
+                setMessages(prev => before ? [...page, ...prev] : page);
+                setOlderBefore(res.headers.get('X-Has-More') === 'true' ? res.headers.get('X-Next-Before') : null);
             }
         } catch (err) {
             console.error('Failed to load messages:', err);
@@ -742,6 +746,14 @@ const BusinessDashboard = () => {
                                         </div>
                                     ) : (
                                         <div className="space-y-3">
+                                            {olderBefore && (
+                                                <button
+                                                    onClick={() => loadMessages(selectedChat.campaign_id, selectedChat.creator_id, olderBefore)}
+                                                    className="w-full text-sm text-blue-600 hover:underline"
+                                                >
+                                                    Load earlier messages
+                                                </button>
+                                            )}
                                             {messages.map((msg, idx) => {
                                                 const user = JSON.parse(localStorage.getItem('user') || '{}');
                                                 const isMe = msg.sender_id === user.user_id;
@@ -19,7 +19,7 @@ const getFriendlyError = (error) => {
 const CreatorDashboard = () => {
     const navigate = useNavigate();
     const [profile, setProfile] = useState(null);
-    const [campaigns, setCampaigns] = useState([]);
+    const [campaigns, setCampaigns] = useState([]); // Ranked feed; excludes applied campaigns
     const [prediction, setPrediction] = useState(null);
     const [loading, setLoading] = useState(true);
     const [applying, setApplying] = useState(null);
@@ -44,19 +44,23 @@ const CreatorDashboard = () => {
     // Messages state
     const [activeTab, setActiveTab] = useState('campaigns');
     const [messages, setMessages] = useState([]);
+    const [olderBefore, setOlderBefore] = useState(null); // Cursor for the page before the loaded messages
     const [conversations, setConversations] = useState([]);
     const [selectedChat, setSelectedChat] = useState(null);
     const [newMessage, setNewMessage] = useState('');
     const [businessNames, setBusinessNames] = useState({});
 
-    // Load messages for a chat
-    const loadMessages = async (campaignId, businessId) => {
+    // Load messages for a chat; with `before`, prepend the page older than it
+    const loadMessages = async (campaignId, businessId, before = null) => {
         try {
             const user = JSON.parse(localStorage.getItem('user'));
-            const res = await fetch(`${API_BASE}/api/messages/conversation?campaign_id=${campaignId}&creator_id=${user.user_id}&business_id=${businessId}`);
+            const older = before ? `&before=${encodeURIComponent(before)}` : '';
+            const res = await fetch(`${API_BASE}/api/messages/conversation?campaign_id=${campaignId}&creator_id=${user.user_id}&business_id=${businessId}${older}`);
             const data = await res.json();
             if (Array.isArray(data)) {
-                setMessages(data.map(m => ({ ...m, created_at: m.timestamp || m.created_at })));
+                const page = data.map(m => ({ ...m, created_at: m.timestamp || m.created_at }));
+                setMessages(prev => before ? [...page, ...prev] : page);
+                setOlderBefore(res.headers.get('X-Has-More') === 'true' ? res.headers.get('X-Next-Before') : null);
             }
         } catch (err) {
             console.error('Failed to load messages:', err);
@@ -137,10 +141,10 @@ const CreatorDashboard = () => {
             })
             .catch(() => { });
 
-        fetch(`${API_BASE}/api/campaigns/`)
+        fetch(`${API_BASE}/api/campaigns/feed/${user.user_id}?limit=100`)
             .then(r => r.json())
             .then(data => {
-                if (Array.isArray(data)) setCampaigns(data);
+                if (Array.isArray(data.campaigns)) setCampaigns(data.campaigns);
             })
             .catch(() => { });
 
@@ -189,6 +193,18 @@ const CreatorDashboard = () => {
 
             if (response.ok) {
                 setAppliedCampaigns([...appliedCampaigns, campaignId]);
+                // Open its conversation right away, from the feed entry
+                const camp = campaigns.find(c => c._id === campaignId);
+                if (camp) {
+                    setMyApplications([{
+                        _id: data.application_id,
+                        campaign_id: campaignId,
+                        status: 'pending',
+                        campaign_title: camp.title,
+                        business_id: camp.business_id,
+                        business_name: camp.business_name
+                    }, ...myApplications]);
+                }
                 showNotification('success', '🎉 Application sent! The business will contact you soon.');
             } else {
                 showNotification('error', getFriendlyError(data.error));
@@ -695,11 +711,20 @@ const CreatorDashboard = () => {
                         <div className="divide-y">
                             {(() => {
                                 const user = JSON.parse(localStorage.getItem('user') || '{}');
-                                // Get campaigns where this creator has applied (from myApplications)
-                                const appliedCampaignIds = myApplications.map(app => app.campaign_id);
-                                const myConversations = campaigns.filter(c =>
-                                    appliedCampaignIds.includes(c._id) || appliedCampaigns.includes(c._id)
-                                );
+                                // One conversation per campaign this creator applied to,
+                                // closed campaigns included (applications carry the campaign)
+                                const seen = new Set();
+                                const myConversations = [];
+                                myApplications.forEach(app => {
+                                    if (!app.campaign_title || seen.has(app.campaign_id)) return;
+                                    seen.add(app.campaign_id);
+                                    myConversations.push({
+                                        _id: app.campaign_id,
+                                        title: app.campaign_title,
+                                        business_id: app.business_id,
+                                        business_name: app.business_name
+                                    });
+                                });
 
                                 if (myConversations.length === 0) {
                                     return (
@@ -751,7 +776,16 @@ const CreatorDashboard = () => {
                                             <p>No messages yet. Start the conversation!</p>
                                         </div>
                                     ) : (
-                                        messages.map((msg, idx) => {
+                                        <>
+                                        {olderBefore && (
+                                            <button
+                                                onClick={() => loadMessages(selectedChat.campaign_id, selectedChat.business_id, olderBefore)}
+                                                className="w-full text-sm text-blue-600 hover:underline"
+                                            >
+                                                Load earlier messages
+                                            </button>
+                                        )}
+                                        {messages.map((msg, idx) => {
                                             const user = JSON.parse(localStorage.getItem('user') || '{}');
                                             const isMine = msg.sender_id === user.user_id;
                                             return (
@@ -764,7 +798,8 @@ const CreatorDashboard = () => {
                                                     </div>
                                                 </div>
                                             );
-                                        })
+                                        })}
+                                        </>
                                     )}
                                 </div>
 